@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""
+pyCliConf benchmark suite.
+
+Runs against the bundled stand-in device (pyCliConf/fakedevice.py), so no
+switch is needed, and writes machine-readable JSON:
+
+    python benchmarks/bench.py -o bench.json
+    python benchmarks/bench.py -o new.json --compare bench.json --tolerance 0.15
+
+With --compare the run exits non-zero when any metric is worse than the
+baseline by more than the tolerance. Metric names end in their unit:
+"_per_second" is better when higher; "_seconds" and "_kb" are better
+when lower.
+
+Benchmarks:
+    rpc            RPCs per second through rpc() and rpc_pipeline()
+    load_rss       peak RSS loading 10k/100k/500k-line set configs via load_config() (without local
+                   validation, which load_config_stream() does not do either) and load_config_stream()
+    template       load_config_template() render time for a large variable set
+    logging        cost of log() per message
+    startup        "import pyCliConf" and CliConf() start/close time
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pyCliConf
+from pyCliConf import CliConf
+from pyCliConf.template import JINJA_SUPPORT
+from pyCliConf.transport import FakeDeviceTransport
+
+LOAD_SIZES = [10000, 100000, 500000]
+GET_CONFIG = '<rpc><get-configuration format="set" database="candidate"/></rpc>]]>]]>'
+COMMIT = '<rpc><commit/></rpc>]]>]]>'
+
+
+def logfile():
+    handle, path = tempfile.mkstemp(prefix="pycliconf-bench-", suffix=".log")
+    os.close(handle)
+    return path
+
+
+def session(**kwargs):
+    path = logfile()
+    return CliConf(logfile=path, transport=FakeDeviceTransport(**kwargs)), path
+
+
+def finish(dev, path):
+    dev.close()
+    os.remove(path)
+
+
+def set_lines(count):
+    for index in range(count):
+        yield "set interfaces xe-0/0/%d unit %d family ethernet-switching vlan members v%d" % (index % 48, index, index % 4000)
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux and FreeBSD.
+    return rss / 1024 if sys.platform == "darwin" else rss
+
+
+def bench_rpc(count=2000):
+    dev, path = session()
+    try:
+        dev.rpc(COMMIT)
+        started = time.time()
+        for _ in range(count):
+            dev.rpc(COMMIT)
+        sequential = time.time() - started
+
+        started = time.time()
+        dev.rpc_pipeline([COMMIT] * count)
+        pipelined = time.time() - started
+    finally:
+        finish(dev, path)
+    return {
+        "rpc_count": count,
+        "sequential_rpcs_per_second": count / sequential,
+        "pipelined_rpcs_per_second": count / pipelined,
+    }
+
+
+def bench_load_rss():
+    results = {}
+    for lines in LOAD_SIZES:
+        for mode in ("load_config", "load_config_stream"):
+            output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", mode, str(lines)])
+            child = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+            if not child["ok"]:
+                raise RuntimeError("%s of %d lines failed on the stand-in device" % (mode, lines))
+            results["%s_%d_lines_peak_rss_kb" % (mode, lines)] = child["peak_rss_kb"]
+            results["%s_%d_lines_seconds" % (mode, lines)] = child["seconds"]
+    return results
+
+
+def child_load(mode, lines):
+    """
+    Loads a config of the given size in this process and prints peak RSS as JSON.
+    """
+    dev, path = session()
+    try:
+        baseline = peak_rss_kb()
+        started = time.time()
+        if mode == "load_config":
+            reply = dev.load_config(cfg_string="\n".join(set_lines(lines)), action="set", validate=False)
+        else:
+            reply = dev.load_config_stream(set_lines(lines), action="set")
+        seconds = time.time() - started
+    finally:
+        finish(dev, path)
+    print(json.dumps({"ok": reply is not None and reply.ok, "seconds": seconds,
+                      "peak_rss_kb": peak_rss_kb(), "baseline_rss_kb": baseline}))
+
+
+def bench_template(interfaces=5000, rounds=5):
+    if not JINJA_SUPPORT:
+        return {"skipped": "jinja2 not installed"}
+    template = (
+        "{% for name, unit in interfaces %}"
+        "set interfaces {{ name }} unit {{ unit.id }} description \"{{ unit.description }}\"\n"
+        "set interfaces {{ name }} unit {{ unit.id }} family inet address {{ unit.address }}\n"
+        "{% endfor %}"
+    )
+    template_vars = {"interfaces": [
+        ("xe-0/0/%d" % (index % 48), {"id": index, "description": "uplink %d" % index, "address": "10.%d.%d.1/24" % (index // 256, index % 256)})
+        for index in range(interfaces)]}
+
+    dev, path = session()
+    try:
+        started = time.time()
+        dev.render_template(template, template_vars)
+        first = time.time() - started
+
+        started = time.time()
+        for _ in range(rounds):
+            dev.render_template(template, template_vars)
+        cached = (time.time() - started) / rounds
+
+        started = time.time()
+        dev.load_config_template(template, template_vars, cfg_format="set")
+        full = time.time() - started
+    finally:
+        finish(dev, path)
+    return {
+        "interfaces": interfaces,
+        "first_render_seconds": first,
+        "cached_render_seconds": cached,
+        "load_config_template_seconds": full,
+    }
+
+
+def bench_logging(count=100000, payload=200):
+    dev, path = session()
+    message = "x" * payload
+    try:
+        started = time.time()
+        for _ in range(count):
+            dev.log(message)
+        logged = time.time() - started
+        started = time.time()
+        dev.logfile.flush()
+        flushed = time.time() - started
+    finally:
+        finish(dev, path)
+    return {
+        "messages": count,
+        "log_call_seconds": logged / count,
+        "log_messages_per_second": count / logged,
+        "flush_seconds": flushed,
+    }
+
+
+def bench_startup(rounds=5):
+    imports = []
+    for _ in range(rounds):
+        started = time.time()
+        subprocess.check_call([sys.executable, "-c", "import pyCliConf"], cwd=ROOT)
+        imports.append(time.time() - started)
+
+    sessions = []
+    for _ in range(rounds):
+        started = time.time()
+        dev, path = session()
+        dev.rpc(COMMIT)
+        finish(dev, path)
+        sessions.append(time.time() - started)
+    return {
+        "import_seconds": sorted(imports)[len(imports) // 2],
+        "session_start_close_seconds": sorted(sessions)[len(sessions) // 2],
+    }
+
+
+BENCHMARKS = [
+    ("rpc", bench_rpc),
+    ("load_rss", bench_load_rss),
+    ("template", bench_template),
+    ("logging", bench_logging),
+    ("startup", bench_startup),
+]
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of regression descriptions, comparing results with a baseline run.
+    """
+    regressions = []
+    for name, metrics in results["results"].items():
+        previous = baseline.get("results", {}).get(name, {})
+        for metric, value in metrics.items():
+            old = previous.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if metric.endswith("_per_second"):
+                change = (old - value) / float(old)
+            elif metric.endswith("_seconds") or metric.endswith("_kb"):
+                change = (value - old) / float(old)
+            else:
+                continue
+            if change > tolerance:
+                regressions.append("%s.%s: %.4g -> %.4g (%.0f%% worse)" % (name, metric, old, value, change * 100))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pyCliConf benchmarks")
+    parser.add_argument("-o", "--output", help="write JSON results to this file (default: stdout)")
+    parser.add_argument("-b", "--bench", action="append", choices=[name for name, _ in BENCHMARKS],
+                        help="benchmark to run, may be repeated (default: all)")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed fractional regression (default: 0.10)")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "LINES"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child_load(args.child[0], int(args.child[1]))
+        return 0
+
+    # Keep the template bytecode cache out of the shared /var/tmp location.
+    if not os.environ.get("PYCLICONF_CACHE_DIR"):
+        os.environ["PYCLICONF_CACHE_DIR"] = tempfile.mkdtemp(prefix="pycliconf-bench-cache-")
+        atexit.register(shutil.rmtree, os.environ["PYCLICONF_CACHE_DIR"], True)
+
+    results = {
+        "version": pyCliConf.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "results": {},
+    }
+    for name, bench in BENCHMARKS:
+        if args.bench and name not in args.bench:
+            continue
+        sys.stderr.write("running %s...\n" % name)
+        results["results"][name] = bench()
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for regression in regressions:
+            sys.stderr.write("REGRESSION %s\n" % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,4 +8,20 @@ __version__ = version.VERSION
 __date__ = version.DATE
 __all__ = ["CliConf"]
 
-from pyCliConf import CliConf
\ No newline at end of file
+import sys
+
+from .pyCliConf import CliConf
+
+# AsyncCliConf needs Python 3.5 or later. It pulls in asyncio, which most
+# on-box scripts never use, so from 3.7 on it is imported on first access.
+if sys.version_info >= (3, 7):
+    __all__.append("AsyncCliConf")
+
+    def __getattr__(name):
+        if name == "AsyncCliConf":
+            from .aio import AsyncCliConf
+            return AsyncCliConf
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+elif sys.version_info >= (3, 5):
+    from .aio import AsyncCliConf
+    __all__.append("AsyncCliConf")
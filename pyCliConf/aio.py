@@ -0,0 +1,315 @@
+"""
+asyncio version of CliConf, for driving many sessions from one process.
+
+CliConf blocks on its subprocess pipes, so a controller needs a thread
+per session. AsyncCliConf runs the same NETCONF dialect over asyncio
+subprocess pipes and exposes load_config, load_config_template, commit,
+discard_changes, install_package, reboot and close as coroutines, so one
+event loop can keep hundreds of sessions in flight.
+
+RPC envelopes, reply parsing, templates, logging and metrics are shared
+with CliConf. Requires Python 3.5 or later.
+
+.. code-block:: python
+
+    import asyncio
+    from pyCliConf.aio import AsyncCliConf
+
+    async def provision(host):
+        command = ["ssh", "root@" + host, "cli", "xml-mode", "netconf"]
+        async with AsyncCliConf(logfile="/var/tmp/%s.log" % host, command=command) as dev:
+            await dev.load_config(cfg_string="set system host-name %s" % host, action="set")
+            return await dev.commit()
+
+    loop = asyncio.get_event_loop()
+    replies = loop.run_until_complete(asyncio.gather(*[provision(host) for host in hosts]))
+"""
+import asyncio
+import subprocess
+import time
+
+from .logwriter import FLUSH_INTERVAL, LogWriter
+from .metrics import Metrics, rpc_name
+from .netconf import READ_SIZE, NetconfReader, string_types, to_bytes, to_text
+from .packagecache import PackageCache
+from .pyCliConf import WRITE_SIZE, CliConf
+from .transport import CLI_COMMAND
+
+RPC_CLOSE = """
+        <rpc>
+            <close-session/>
+        </rpc>
+        ]]>]]>
+        """
+
+RPC_COMMIT = """
+        <rpc>
+            <commit/>
+        </rpc>
+        ]]>]]>
+        """
+
+RPC_DISCARD = """
+        <rpc>
+            <discard-changes/>
+        </rpc>
+        ]]>]]>
+        """
+
+RPC_REBOOT = """
+        <rpc>
+            <request-reboot>
+            </request-reboot>
+        </rpc>
+        ]]>]]>
+        """
+
+
+class AsyncCliConf(object):
+    """
+    AsyncCliConf
+
+    Coroutine counterpart of CliConf. Calls on one session are serialized,
+    so several tasks may share it safely; use one AsyncCliConf per device
+    for concurrency.
+
+    Args:
+        :command: command list giving a NETCONF session on stdin/stdout. Defaults to "cli xml-mode netconf". For the bundled stand-in use FakeDeviceTransport(...).command.
+        :logfile: Destination logfile for log(). Defaults to "/var/root/ztp-log.txt".
+        :Debug: Also print log() output. Defaults to False.
+        :template_path: Directory, or list of directories, for Jinja2 {% include %} / {% import %}. Defaults to none.
+        :log_flush_interval: Maximum seconds log() output is buffered in memory. Defaults to 1.0.
+        :metrics_file: File that receives one JSON line per RPC. Defaults to None, no export.
+
+    The session is started by open(), or by "async with".
+    """
+    def __init__(self, command=None, logfile="/var/root/ztp-log.txt", Debug=False, template_path=None, log_flush_interval=FLUSH_INTERVAL, metrics_file=None):
+        self.command = list(command or CLI_COMMAND)
+        self.logfile = LogWriter(logfile, flush_interval=log_flush_interval)
+        self._metrics = Metrics(export=LogWriter(metrics_file, flush_interval=log_flush_interval) if metrics_file else None)
+        self.debug = Debug
+        self.template_path = template_path
+        self._templates = None
+        self.reader = NetconfReader()
+        self.process = None
+        self._lock = None
+        self._unread = 0
+
+    log_format = "text"
+    check_reply = CliConf.check_reply
+    log = CliConf.log
+    metrics = CliConf.metrics
+    render_template = CliConf.render_template
+    templates = CliConf.templates
+    time = CliConf.time
+    _load_envelope = CliConf._load_envelope
+    _load_rpc = CliConf._load_rpc
+    _package_rpc = CliConf._package_rpc
+    _validate = CliConf._validate
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    async def close(self):
+        """
+        Close the NETCONF session and wait for the process to exit.
+        """
+        if self.process is not None:
+            try:
+                await self.rpc(RPC_CLOSE)
+            except Exception as err:
+                errmsg = "RPC Close Error: %r" % err
+                self.log(errmsg, level="error")
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), 5)
+            except Exception as err:
+                errmsg = "RPC Session Close Error: %r" % err
+                self.log(errmsg, level="error")
+                if self.process.returncode is None:
+                    self.process.kill()
+                    await self.process.wait()
+            self.process = None
+        try:
+            if self._metrics.export is not None:
+                self._metrics.export.close()
+            self.logfile.close()
+        except Exception as err:
+            errmsg = "Error closing logfile: %r" % err
+            self.log(errmsg, level="error")
+
+    async def commit(self):
+        """
+        Commit current candidate configuration.
+        """
+        return await self._call(RPC_COMMIT, "RPC Commit Error")
+
+    async def discard_changes(self):
+        """
+        Discard uncommitted changes.
+        """
+        return await self._call(RPC_DISCARD, "RPC Discard Error")
+
+    async def install_package(self, url, no_copy=True, no_validate=True, unlink=True, reboot=False, sha256=None, md5=None, cache=False):
+        """
+        Install a Junos package, as CliConf.install_package().
+
+        Staging through the package cache runs in the default executor,
+        so a long download does not stall other sessions.
+        """
+        if cache or sha256 or md5:
+            try:
+                self.log("Staging package %s in local cache" % url)
+                loop = asyncio.get_event_loop()
+                url = await loop.run_in_executor(None, lambda: PackageCache().fetch(url, sha256=sha256, md5=md5))
+                self.log("Package staged at %s" % url)
+            except Exception as err:
+                errmsg = "Install Package Error: %r" % err
+                self.log(errmsg, level="error")
+                return None
+        return await self._call(self._package_rpc(url, no_copy, no_validate, unlink, reboot), "Install Package Error")
+
+    async def load_config(self, cfg_string=False, url=False, cfg_format="text", action="merge", validate=True):
+        """
+        Loads Junos configuration from a string or URL, as CliConf.load_config().
+        """
+        if validate and cfg_string and not url and not self._validate(cfg_string, cfg_format, action):
+            return None
+        try:
+            rpc_send = self._load_rpc(cfg_string, url, cfg_format, action)
+        except Exception as err:
+            errmsg = "RPC Load Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+        return await self._call(rpc_send, "RPC Load Error")
+
+    async def load_config_template(self, template, template_vars, cfg_format="text", action="merge"):
+        """
+        Renders a Jinja2 template and loads the result, as CliConf.load_config_template().
+        """
+        final_template = self.render_template(template, template_vars)
+        if final_template is None:
+            return None
+        return await self.load_config(cfg_string=final_template, cfg_format=cfg_format, action=action)
+
+    async def open(self):
+        """
+        Start the session process.
+        """
+        self._lock = asyncio.Lock()
+        self._unread = 0
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.logfile.file)
+        except Exception as err:
+            errmsg = "RPC Session Error: %r" % err
+            self.log(errmsg, level="error")
+
+    async def read_reply(self):
+        """
+        Reads the next reply from the session.
+
+        Returns an RpcReply, or None once the session has closed.
+        """
+        try:
+            while True:
+                message = self.reader.next_message()
+                if message is None:
+                    data = await self.process.stdout.read(READ_SIZE)
+                    if not data:
+                        self.log("RPC Reply Error: session closed before reply was received", level="error")
+                        return None
+                    self.reader.feed(data)
+                    continue
+                reply = self.reader.reply(message)
+                if reply is not None:
+                    self.log("RPC Reply from host:\n %s" % reply.raw)
+                    return reply
+        except Exception as err:
+            errmsg = "RPC Reply Read Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+
+    async def reboot(self):
+        """
+        Reboot the device.
+        """
+        return await self._call(RPC_REBOOT, "RPC Reboot Error")
+
+    async def rpc(self, rpc, reply=True):
+        """
+        Sends an RPC and waits for its reply, as CliConf.rpc().
+
+        Args:
+            :rpc: string containing a NETCONF RPC, or a list of strings that together make one.
+            :reply: Wait for and return the device reply. Defaults to True. Otherwise the reply is read and dropped before the next one.
+        """
+        if self.process is None:
+            self.log("RPC Communication Error: session is not open", level="error")
+            return None
+        async with self._lock:
+            started = time.time()
+            sent = await self._send(rpc)
+            if sent is None:
+                return None
+            if not reply:
+                self._unread += 1
+                return None
+
+            # Replies arrive in the order the RPCs were sent: skip those nobody waits for.
+            while self._unread:
+                self._unread -= 1
+                if await self.read_reply() is None:
+                    return None
+            bytes_read = self.reader.bytes_read
+            rpc_reply = await self.read_reply()
+            self._metrics.record_rpc(sent[0], time.time() - started, sent[1], self.reader.bytes_read - bytes_read,
+                                     rpc_reply is not None and rpc_reply.ok)
+            return rpc_reply
+
+    async def _call(self, rpc, errmsg):
+        try:
+            reply = await self.rpc(rpc)
+        except Exception as err:
+            self.log("%s: %r" % (errmsg, err), level="error")
+            return None
+        self.check_reply(reply, errmsg)
+        return reply
+
+    async def _send(self, rpc):
+        """
+        Writes and logs an RPC, waiting for the pipe to drain.
+
+        Returns (rpc type, bytes written), or None if it could not be sent.
+        """
+        if isinstance(rpc, string_types):
+            self.log("RPC Data Sent to host:\n %r" % rpc)
+            parts = [rpc]
+        else:
+            parts = rpc
+        name = None
+        written = 0
+        try:
+            for part in parts:
+                if name is None:
+                    name = rpc_name(part)
+                if parts is rpc:
+                    self.log("RPC Data Sent to host:\n %r" % to_text(part))
+                for start in range(0, len(part), WRITE_SIZE):
+                    chunk = to_bytes(part[start:start + WRITE_SIZE])
+                    self.process.stdin.write(chunk)
+                    written += len(chunk)
+                    await self.process.stdin.drain()
+        except Exception as err:
+            errmsg = "RPC Communication Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+        if not isinstance(rpc, string_types):
+            self.log("RPC Data Sent to host: %d bytes streamed" % written)
+        self._metrics.add("bytes_written", written)
+        return name, written
@@ -0,0 +1,251 @@
+"""
+Render one configuration template for many devices.
+
+Pre-staging configs on a ZTP HTTP server means rendering the same
+load_config_template() template for thousands of devices. build() renders
+them across a process pool into an artifact directory and keeps a
+manifest of input hashes, so later runs only re-render the devices whose
+variables, template or included templates changed.
+
+.. code-block:: python
+
+    from pyCliConf.build import build
+
+    inventory = {"leaf1": {"hostname": "leaf1"}, "leaf2": {"hostname": "leaf2"}}
+    result = build(open("leaf.j2").read(), inventory, "/var/www/ztp/configs", template_path="/srv/templates")
+    print(result.report())
+
+Or from a shell:
+
+    python -m pyCliConf.build leaf.j2 inventory.json /var/www/ztp/configs --template-path /srv/templates
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .netconf import string_types, to_bytes
+from .template import TemplateCache
+
+MANIFEST = "manifest.json"
+
+
+def fingerprint(template, template_path=None):
+    """
+    Returns a hash of the template source and every file in template_path,
+    so editing an included template invalidates every device.
+    """
+    digest = hashlib.sha1(to_bytes(template))
+    if isinstance(template_path, string_types):
+        template_path = [template_path]
+    for directory in template_path or []:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(to_bytes(path))
+                with open(path, "rb") as handle:
+                    digest.update(handle.read())
+    return digest.hexdigest()
+
+
+def vars_hash(template_hash, template_vars):
+    """
+    Returns the input hash for one device: the template fingerprint plus its variables.
+    """
+    data = json.dumps(template_vars, sort_keys=True, default=str)
+    return hashlib.sha1(to_bytes(template_hash + data)).hexdigest()
+
+
+def load_inventory(inventory):
+    """
+    Returns a list of (name, vars) from a dict of name to vars, a list of {"name", "vars"} dicts, or a JSON file holding either.
+    """
+    if isinstance(inventory, string_types):
+        with open(inventory) as handle:
+            inventory = json.load(handle)
+    if isinstance(inventory, dict):
+        return sorted(inventory.items())
+    return [(device["name"], device.get("vars", {})) for device in inventory]
+
+
+class BuildResult(object):
+    """
+    Outcome of a build() run.
+
+    Attributes:
+        :rendered: names of devices rendered in this run.
+        :unchanged: names of devices skipped because their inputs had not changed.
+        :removed: names of devices whose artifacts were deleted because they left the inventory.
+        :failed: dict of device name to error message. Their artifacts from earlier runs are deleted, so a stale config is never served.
+        :seconds: wall time of the run.
+    """
+    def __init__(self):
+        self.rendered = []
+        self.unchanged = []
+        self.removed = []
+        self.failed = {}
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def report(self):
+        lines = ["%d rendered, %d unchanged, %d removed, %d failed in %.2fs" % (
+            len(self.rendered), len(self.unchanged), len(self.removed), len(self.failed), self.seconds)]
+        for name, error in sorted(self.failed.items()):
+            lines.append("FAILED %s: %s" % (name, error))
+        return "\n".join(lines)
+
+
+_worker = {}
+
+
+def _remove(path):
+    for stale in (path, path + ".tmp"):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+
+def _init_worker(template, template_path, outdir):
+    # A Pool initializer that raises makes the pool replace the worker forever, so never raise here.
+    _worker["outdir"] = outdir
+    try:
+        _worker["template"] = TemplateCache(search_path=template_path).get(template)
+        _worker["error"] = None
+    except Exception as err:
+        _worker["template"] = None
+        _worker["error"] = "template failed to compile: %r" % err
+
+
+def _render(job):
+    name, filename, template_vars = job
+    if _worker["template"] is None:
+        return name, _worker["error"]
+    try:
+        output = _worker["template"].render(template_vars)
+        path = os.path.join(_worker["outdir"], filename)
+        partial = path + ".tmp"
+        with open(partial, "wb") as handle:
+            handle.write(to_bytes(output))
+        os.rename(partial, path)
+        return name, None
+    except Exception as err:
+        return name, "%r" % err
+
+
+def build(template, inventory, outdir, processes=None, template_path=None, suffix=".conf", force=False):
+    """
+    Renders template for every device in inventory into outdir.
+
+    Args:
+        :template: Jinja2 template source.
+        :inventory: dict of device name to template vars, a list of {"name", "vars"} dicts, or a path to a JSON file holding either.
+        :outdir: artifact directory. Each device is written to "<name><suffix>" and the manifest to "manifest.json".
+        :processes: size of the render process pool. Defaults to the number of CPUs; 1 renders in this process.
+        :template_path: directory, or list of directories, for {% include %} and {% import %}.
+        :suffix: artifact file name suffix. Defaults to ".conf".
+        :force: re-render every device, ignoring the manifest hashes. Devices that left the inventory are still removed. Defaults to False.
+
+    Returns a BuildResult.
+    """
+    started = time.time()
+    result = BuildResult()
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    manifest_path = os.path.join(outdir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+
+    template_hash = fingerprint(template, template_path)
+    devices = load_inventory(inventory)
+    current = {}
+    jobs = []
+    for name, template_vars in devices:
+        filename = name + suffix
+        digest = vars_hash(template_hash, template_vars)
+        current[name] = {"hash": digest, "output": filename}
+        previous = None if force else manifest.get(name)
+        if previous and previous.get("hash") == digest and os.path.exists(os.path.join(outdir, filename)):
+            result.unchanged.append(name)
+        else:
+            jobs.append((name, filename, template_vars))
+
+    for name, entry in manifest.items():
+        if name not in current:
+            _remove(os.path.join(outdir, entry["output"]))
+            result.removed.append(name)
+
+    if jobs:
+        # Compile once here, so a broken template fails the build instead of every worker.
+        try:
+            TemplateCache(search_path=template_path).get(template)
+        except Exception as err:
+            for name, filename, template_vars in jobs:
+                result.failed[name] = "template failed to compile: %r" % err
+                _remove(os.path.join(outdir, filename))
+                del current[name]
+            jobs = []
+
+    processes = processes or multiprocessing.cpu_count()
+    pool = None
+    if jobs:
+        if processes == 1 or len(jobs) == 1:
+            _init_worker(template, template_path, outdir)
+            outcomes = map(_render, jobs)
+        else:
+            pool = multiprocessing.Pool(processes, _init_worker, (template, template_path, outdir))
+            chunksize = max(1, len(jobs) // (processes * 4))
+            outcomes = pool.imap_unordered(_render, jobs, chunksize)
+        try:
+            for name, error in outcomes:
+                if error is None:
+                    result.rendered.append(name)
+                else:
+                    result.failed[name] = error
+                    _remove(os.path.join(outdir, current[name]["output"]))
+                    del current[name]
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    partial = manifest_path + ".tmp"
+    with open(partial, "w") as handle:
+        json.dump(current, handle, indent=1, sort_keys=True)
+    os.rename(partial, manifest_path)
+
+    result.seconds = time.time() - started
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a pyCliConf template for every device in an inventory.")
+    parser.add_argument("template", help="Jinja2 template file")
+    parser.add_argument("inventory", help="JSON inventory: {name: vars} or [{\"name\": ..., \"vars\": {...}}]")
+    parser.add_argument("outdir", help="artifact directory")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--template-path", action="append", default=None, help="directory for included templates")
+    parser.add_argument("--suffix", default=".conf", help="artifact file name suffix (default: .conf)")
+    parser.add_argument("--force", action="store_true", help="re-render every device")
+    args = parser.parse_args(argv)
+
+    with open(args.template) as handle:
+        template = handle.read()
+    result = build(template, args.inventory, args.outdir, processes=args.processes,
+                   template_path=args.template_path, suffix=args.suffix, force=args.force)
+    print(result.report())
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Private cache directories.
+
+The template, package and fragment caches live under /var/tmp, which
+every local user can write to. A directory someone else created there
+first could hold planted bytecode, packages or configuration, and ZTP
+runs as root. So each cache uses a directory named after the current
+uid, created with mode 0700, and is refused unless it is a real
+directory owned by this user that nobody else can write to (the same
+checks Jinja2's FileSystemBytecodeCache makes for its default).
+
+The PYCLICONF_CACHE_DIR environment variable moves every cache from
+/var/tmp to another directory, eg a tempdir for tests and benchmarks.
+"""
+import errno
+import os
+import stat
+
+from .exceptions import CacheDirectoryError
+
+CACHE_ROOT = "/var/tmp"
+
+
+def cache_directory(name):
+    """
+    Returns the default location of a cache: "<root>/pycliconf-<name>-<uid>".
+
+    root is $PYCLICONF_CACHE_DIR, or /var/tmp.
+    """
+    root = os.environ.get("PYCLICONF_CACHE_DIR") or CACHE_ROOT
+    return os.path.join(root, "pycliconf-%s-%d" % (name, os.getuid()))
+
+
+def private_directory(path):
+    """
+    Creates path with mode 0700 if it is missing and returns it.
+
+    Raises CacheDirectoryError if path is a symlink or not a directory,
+    is owned by another user, or is writable by group or others.
+    """
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise CacheDirectoryError("Cache directory %s is not a directory" % path)
+    if info.st_uid != os.getuid():
+        raise CacheDirectoryError("Cache directory %s is owned by uid %d, not %d" % (path, info.st_uid, os.getuid()))
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise CacheDirectoryError("Cache directory %s is writable by other users (mode %o)" % (path, stat.S_IMODE(info.st_mode)))
+    return path
@@ -0,0 +1,71 @@
+"""
+Adaptive chunk sizing for CliConf.load_config_chunked().
+
+Loading a whole fabric configuration in one <load-configuration> RPC
+makes mgd hold and parse it all at once. load_config_chunked() sends the
+set lines in several loads into the same candidate instead, and
+ChunkSizer picks the size of each chunk from how long the device took to
+answer the previous one: chunks grow while replies come back quickly and
+shrink as soon as the device slows down.
+"""
+
+
+class ChunkSizer(object):
+    """
+    Picks the number of lines for the next chunk.
+
+    Each reply latency gives a lines-per-second rate; the next chunk is
+    sized to take about target seconds at that rate, changing by at most
+    a factor of two per step and staying between minimum and maximum.
+
+    Args:
+        :initial: lines in the first chunk. Defaults to 1000.
+        :minimum: smallest chunk. Defaults to 100.
+        :maximum: largest chunk. Defaults to 20000.
+        :target: reply latency to aim for, in seconds. Defaults to 1.0.
+    """
+    def __init__(self, initial=1000, minimum=100, maximum=20000, target=1.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.size = max(minimum, min(maximum, initial))
+
+    def update(self, lines, seconds):
+        """
+        Records that a chunk of lines took seconds and returns the next chunk size.
+        """
+        if seconds > 0:
+            wanted = lines * self.target / seconds
+        else:
+            wanted = self.size * 2
+        wanted = max(self.size / 2.0, min(self.size * 2.0, wanted))
+        self.size = int(max(self.minimum, min(self.maximum, wanted)))
+        return self.size
+
+
+class ChunkedLoad(object):
+    """
+    Outcome of CliConf.load_config_chunked().
+
+    Attributes:
+        :lines: number of set/delete lines to load.
+        :sent: number of lines loaded so far.
+        :chunks: list of (lines, seconds) for every chunk sent.
+        :replies: RpcReply objects for every load, and the commit if one was sent.
+        :seconds: wall time of the whole load, including the commit.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.sent = 0
+        self.chunks = []
+        self.replies = []
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        # An empty configuration sends nothing, and nothing failed.
+        return all(reply is not None and reply.ok for reply in self.replies)
+
+    def __repr__(self):
+        return "<ChunkedLoad %d/%d lines in %d chunks, %s>" % (
+            self.sent, self.lines, len(self.chunks), "ok" if self.ok else "failed")
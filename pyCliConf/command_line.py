@@ -1,7 +1,258 @@
-import pyCliConf
-import inspect
+"""
+Run a JSON manifest of operations over one NETCONF session.
 
-def main():
-    print inspect.getsourcelines(pyCliConf.CliConf)
+Every CliConf() starts its own "cli xml-mode netconf" process, which is
+most of the run time of a short ZTP script that creates one per step.
+The cliconf command opens a single session, runs every step of the
+manifest on it, sends consecutive loads back to back with
+rpc_pipeline() and prints how long each step took.
 
-main()
+A manifest is a list of steps, or a dict with a "steps" list:
+
+.. code-block:: json
+
+    {"steps": [
+        {"op": "load", "url": "http://172.32.32.254/base.conf"},
+        {"op": "load", "config": "set system host-name leaf1", "format": "set"},
+        {"op": "load", "template_file": "/var/tmp/leaf.j2", "vars": {"hostname": "leaf1"}},
+        {"op": "commit"},
+        {"op": "install_package", "url": "http://172.32.32.254/jinstall-X.Y.tgz", "sha256": "9f86d0...", "reboot": true}
+    ]}
+
+Steps:
+    - "load": one of "url", "config", "config_file", "template" or "template_file" (with "vars"), plus optional "format" (default "text"), "action" (default "merge") and "force"
+    - "commit": optional "force"
+    - "discard_changes"
+    - "install_package": "url" plus any install_package() argument
+    - "reboot"
+
+Run it with:
+
+    cliconf manifest.json --logfile /var/root/ztp-log.txt
+
+The run stops at the first step that fails and exits with status 1.
+"""
+import argparse
+import json
+import shlex
+import sys
+import time
+
+from .pyCliConf import CliConf
+from .transport import ProcessTransport
+
+LOAD_SOURCES = ["url", "config", "config_file", "template", "template_file"]
+PACKAGE_ARGS = ["url", "no_copy", "no_validate", "unlink", "reboot", "sha256", "md5", "cache"]
+OPERATIONS = ["load", "commit", "discard_changes", "install_package", "reboot"]
+
+
+def load_manifest(path):
+    """
+    Reads a manifest file and returns its list of steps, raising ValueError if a step is malformed.
+    """
+    with open(path) as handle:
+        manifest = json.load(handle)
+    steps = manifest.get("steps", []) if isinstance(manifest, dict) else manifest
+    for index, step in enumerate(steps):
+        op = step.get("op")
+        if op not in OPERATIONS:
+            raise ValueError("Step %d: unknown op %r, expected one of %s" % (index + 1, op, ", ".join(OPERATIONS)))
+        if op == "load" and len([key for key in LOAD_SOURCES if key in step]) != 1:
+            raise ValueError("Step %d: load needs exactly one of %s" % (index + 1, ", ".join(LOAD_SOURCES)))
+        if op == "install_package" and "url" not in step:
+            raise ValueError("Step %d: install_package needs a url" % (index + 1))
+    return steps
+
+
+class StepTiming(object):
+    """
+    Timing of one manifest step, or of a batch of pipelined loads.
+    """
+    def __init__(self, label, seconds, ok, skipped=False):
+        self.label = label
+        self.seconds = seconds
+        self.ok = ok
+        self.skipped = skipped
+
+    def status(self):
+        if self.skipped:
+            return "skipped"
+        return "ok" if self.ok else "FAILED"
+
+
+class Runner(object):
+    """
+    Runs manifest steps on one CliConf session.
+
+    Args:
+        :dev: CliConf the steps run on.
+        :pipeline: send consecutive loads back to back with rpc_pipeline(). Ignored when dev has a state_file, as skipped loads need no pipelining. Defaults to True.
+    """
+    def __init__(self, dev, pipeline=True):
+        self.dev = dev
+        self.pipeline = pipeline and dev._state is None
+        self.timings = []
+
+    def run(self, steps):
+        """
+        Runs steps in order, stopping at the first failure. Returns True if every step succeeded.
+        """
+        index = 0
+        while index < len(steps):
+            batch = [steps[index]]
+            if self.pipeline and steps[index]["op"] == "load":
+                while index + len(batch) < len(steps) and steps[index + len(batch)]["op"] == "load":
+                    batch.append(steps[index + len(batch)])
+            index += len(batch)
+
+            if len(batch) > 1:
+                timing = self.run_loads(batch)
+            else:
+                timing = self.run_step(batch[0])
+            self.timings.append(timing)
+            if not timing.ok:
+                return False
+        return True
+
+    def run_step(self, step):
+        op = step["op"]
+        started = time.time()
+        if op == "load":
+            cfg_string = self.config(step)
+            reply = None
+            if "url" in step:
+                reply = self.dev.load_config(url=step["url"], cfg_format=step.get("format", "text"),
+                                             action=step.get("action", "merge"), force=step.get("force", False))
+            elif cfg_string is not None:
+                reply = self.dev.load_config(cfg_string=cfg_string, cfg_format=step.get("format", "text"),
+                                             action=step.get("action", "merge"), force=step.get("force", False))
+            label = "load %s" % self.source(step)
+        elif op == "commit":
+            reply = self.dev.commit(force=step.get("force", False))
+            label = "commit"
+        elif op == "install_package":
+            reply = self.dev.install_package(**dict((key, step[key]) for key in PACKAGE_ARGS if key in step))
+            label = "install_package %s" % step["url"]
+        else:
+            reply = getattr(self.dev, op)()
+            label = op
+        ok = reply is not None and reply.ok
+        return StepTiming(label, time.time() - started, ok, ok and reply.skipped)
+
+    def run_loads(self, steps):
+        """
+        Renders every load in steps and sends them with one rpc_pipeline() call.
+        """
+        started = time.time()
+        label = "load x%d (pipelined)" % len(steps)
+        rpcs = []
+        for step in steps:
+            cfg_string = None
+            if "url" not in step:
+                cfg_string = self.config(step)
+                if cfg_string is None:
+                    return StepTiming(label, time.time() - started, False)
+                if not self.dev._validate(cfg_string, step.get("format", "text"), step.get("action", "merge")):
+                    return StepTiming(label, time.time() - started, False)
+            try:
+                rpcs.append(self.dev._load_rpc(cfg_string, step.get("url", False), step.get("format", "text"), step.get("action", "merge")))
+            except Exception as err:
+                self.dev.log("RPC Load Error: %r" % err, level="error")
+                return StepTiming(label, time.time() - started, False)
+
+        ok = True
+        for reply in self.dev.rpc_pipeline(rpcs):
+            if not self.dev.check_reply(reply, "RPC Load Error"):
+                ok = False
+        return StepTiming(label, time.time() - started, ok)
+
+    def config(self, step):
+        """
+        Returns the configuration string of a load step, rendering templates, or None on failure.
+        """
+        try:
+            if "config" in step:
+                return step["config"]
+            if "config_file" in step:
+                with open(step["config_file"]) as handle:
+                    return handle.read()
+            if "template" in step:
+                template = step["template"]
+            elif "template_file" in step:
+                with open(step["template_file"]) as handle:
+                    template = handle.read()
+            else:
+                return None
+        except (IOError, OSError) as err:
+            self.dev.log("Manifest Load Error: %r" % err, level="error")
+            return None
+        return self.dev.render_template(template, step.get("vars", {}))
+
+    def source(self, step):
+        if "config" in step:
+            return "string"
+        if "template" in step:
+            return "template"
+        return step.get("url") or step.get("config_file") or step.get("template_file")
+
+    def report(self, startup, total):
+        """
+        Returns the step timings as readable text.
+        """
+        lines = ["%-8s %9s  %s" % ("status", "seconds", "step"),
+                 "%-8s %8.3fs  %s" % ("ok", startup, "session open")]
+        for timing in self.timings:
+            lines.append("%-8s %8.3fs  %s" % (timing.status(), timing.seconds, timing.label))
+        lines.append("%-8s %8.3fs  %s" % ("", total, "total"))
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSON manifest of pyCliConf operations over one NETCONF session.")
+    parser.add_argument("manifest", help="JSON manifest of steps")
+    parser.add_argument("--logfile", default="/var/root/ztp-log.txt", help="log file (default: /var/root/ztp-log.txt)")
+    parser.add_argument("--debug", action="store_true", help="also print log output")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="log file format (default: text)")
+    parser.add_argument("--log-max-bytes", type=int, default=None, help="rotate the log file at this size")
+    parser.add_argument("--template-path", action="append", default=None, help="directory for included templates")
+    parser.add_argument("--state-file", default=None, help="skip loads and commits already applied by an earlier run")
+    parser.add_argument("--metrics-file", default=None, help="JSON-lines file receiving one record per RPC")
+    parser.add_argument("--command", default=None, help="command giving a NETCONF session (default: cli xml-mode netconf)")
+    parser.add_argument("--no-pipeline", action="store_true", help="send loads one at a time")
+    parser.add_argument("--json", action="store_true", help="print the timing report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        steps = load_manifest(args.manifest)
+    except (IOError, OSError, ValueError) as err:
+        sys.stderr.write("cliconf: %s\n" % err)
+        return 2
+
+    started = time.time()
+    transport = ProcessTransport(shlex.split(args.command)) if args.command else None
+    dev = CliConf(logfile=args.logfile, Debug=args.debug, transport=transport, template_path=args.template_path,
+                  metrics_file=args.metrics_file, state_file=args.state_file, log_format=args.log_format,
+                  log_max_bytes=args.log_max_bytes)
+    startup = time.time() - started
+
+    runner = Runner(dev, pipeline=not args.no_pipeline)
+    try:
+        ok = runner.run(steps)
+    finally:
+        dev.close()
+    total = time.time() - started
+
+    if args.json:
+        print(json.dumps({
+            "ok": ok,
+            "startup": startup,
+            "seconds": total,
+            "steps": [{"step": timing.label, "seconds": timing.seconds, "status": timing.status()} for timing in runner.timings],
+        }, indent=1, sort_keys=True))
+    else:
+        print(runner.report(startup, total))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
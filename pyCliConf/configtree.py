@@ -0,0 +1,286 @@
+"""
+Compact, queryable configuration tree built from a streamed XML reply.
+
+CliConf.get_config() parses the <get-configuration> reply with
+ElementTree.iterparse() as it arrives, discarding every XML element once
+it has been turned into a ConfigNode, so a 300k-line configuration never
+exists as a full ElementTree (or as one reply string) in memory.
+ConfigNode uses __slots__ and interned names, and a list entry stores
+its <name> as the node key instead of as a child.
+
+Nodes are addressed with paths of XML element names, list entries
+keyed in brackets:
+
+    interfaces/interface[ge-0/0/0]/unit[0]/family/inet/address[10.0.0.1/24]
+    system/host-name
+    vlans/vlan[*]/vlan-id
+
+find() and value() look paths up through an index built on first use;
+findall() also accepts "*" for any name or key.
+"""
+import sys
+
+try:
+    # Python 2's ElementTree.iterparse is pure Python; the C version is several times faster.
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+from .netconf import local_name
+from .validate import escape
+
+try:
+    intern
+except NameError:
+    intern = sys.intern
+
+# Values shorter than this are interned, since leaves such as "inet", "0" or "enable" repeat constantly.
+INTERN_LIMIT = 32
+
+
+def _intern(text):
+    if len(text) < INTERN_LIMIT:
+        try:
+            return intern(text)
+        except TypeError:
+            # Python 2 cannot intern unicode.
+            return text
+    return text
+
+
+def split_path(path):
+    """
+    Splits a path into (name, key) segments; key is None for a plain name.
+    """
+    segments = []
+    start = 0
+    depth = 0
+    path = path.strip("/")
+    for index, char in enumerate(path):
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "/" and depth == 0:
+            segments.append(path[start:index])
+            start = index + 1
+    segments.append(path[start:])
+    result = []
+    for segment in segments:
+        if not segment:
+            continue
+        if segment.endswith("]") and "[" in segment:
+            name, _, key = segment[:-1].partition("[")
+            result.append((name, key))
+        else:
+            result.append((segment, None))
+    return result
+
+
+def join_path(segments):
+    return "/".join(name if key is None else "%s[%s]" % (name, key) for name, key in segments)
+
+
+def subtree_filter(path):
+    """
+    Returns the <configuration> subtree filter selecting path, for <get-configuration>.
+    """
+    opening = []
+    closing = []
+    for name, key in split_path(path):
+        opening.append("<%s>" % name)
+        if key is not None:
+            opening.append("<name>%s</name>" % escape(key))
+        closing.insert(0, "</%s>" % name)
+    return "<configuration>%s%s</configuration>" % ("".join(opening), "".join(closing))
+
+
+class ConfigNode(object):
+    """
+    One configuration element.
+
+    Attributes:
+        :name: element name, eg "interface".
+        :key: <name> of a list entry, eg "ge-0/0/0", or None.
+        :text: value of a leaf, or None.
+        :children: list of child nodes, or None for a leaf.
+    """
+    __slots__ = ("name", "key", "text", "children")
+
+    def __init__(self, name, key=None, text=None):
+        self.name = name
+        self.key = key
+        self.text = text
+        self.children = None
+
+    def child(self, name, key=None):
+        """
+        Returns the first child with this name (and key, if given), or None.
+        """
+        for node in self.children or ():
+            if node.name == name and (key is None or node.key == key):
+                return node
+        return None
+
+    def findall(self, path):
+        """
+        Yields the nodes below this one matching path; "*" matches any name or key.
+        """
+        nodes = [self]
+        for name, key in split_path(path):
+            nodes = [node for parent in nodes for node in parent.children or ()
+                     if (name == "*" or node.name == name) and (key is None or key == "*" or node.key == key)]
+        return iter(nodes)
+
+    def segment(self):
+        return self.name if self.key is None else "%s[%s]" % (self.name, self.key)
+
+    def __iter__(self):
+        return iter(self.children or ())
+
+    def __len__(self):
+        return len(self.children or ())
+
+    def __repr__(self):
+        if self.text is not None:
+            return "<ConfigNode %s %r>" % (self.segment(), self.text)
+        return "<ConfigNode %s, %d children>" % (self.segment(), len(self))
+
+
+class ConfigTree(object):
+    """
+    A parsed configuration.
+
+    Attributes:
+        :root: the <configuration> ConfigNode.
+        :nodes: number of nodes in the tree.
+        :errors: <rpc-error> messages with severity "error" from the reply.
+        :warnings: <rpc-error> messages with severity "warning" from the reply.
+    """
+    def __init__(self, root=None):
+        self.root = root or ConfigNode("configuration")
+        self.nodes = 0
+        self.errors = []
+        self.warnings = []
+        self._index = None
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def find(self, path):
+        """
+        Returns the node at path, or None.
+        """
+        segments = split_path(path)
+        if not segments:
+            return self.root
+        index = self.index()
+        node = index.get(join_path(segments))
+        if node is not None:
+            return node
+        # Leaves are not indexed: look the last segment up in its parent.
+        parent = index.get(join_path(segments[:-1])) if len(segments) > 1 else self.root
+        if parent is None:
+            return None
+        return parent.child(*segments[-1])
+
+    def findall(self, path):
+        """
+        Yields every node matching path; "*" matches any name or key.
+        """
+        return self.root.findall(path)
+
+    def index(self):
+        """
+        Returns {path: node} for every node that has children, building it on first use.
+        """
+        if self._index is None:
+            index = {}
+            stack = [("", self.root)]
+            while stack:
+                prefix, parent = stack.pop()
+                for node in parent.children or ():
+                    if node.children is not None:
+                        path = prefix + node.segment()
+                        index[path] = node
+                        stack.append((path + "/", node))
+            self._index = index
+        return self._index
+
+    def value(self, path, default=None):
+        """
+        Returns the text of the leaf at path, or default.
+        """
+        node = self.find(path)
+        if node is None or node.text is None:
+            return default
+        return node.text
+
+    def __len__(self):
+        return self.nodes
+
+    def __repr__(self):
+        return "<ConfigTree %d nodes>" % self.nodes
+
+
+def parse_config(source):
+    """
+    Builds a ConfigTree from a file-like object holding an <rpc-reply> or a bare <configuration>.
+
+    Elements are cleared and detached as soon as their node is built.
+    """
+    tree = None
+    configured = False
+    nodes = []
+    elements = []
+    error = None
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        name = local_name(element.tag)
+        if event == "start":
+            if nodes:
+                node = ConfigNode(_intern(name))
+                parent = nodes[-1]
+                if parent.children is None:
+                    parent.children = [node]
+                else:
+                    parent.children.append(node)
+                nodes.append(node)
+                tree.nodes += 1
+            elif name == "configuration" and not configured:
+                tree = tree or ConfigTree()
+                nodes.append(tree.root)
+                configured = True
+            elif name == "rpc-error":
+                error = ["error", ""]
+            elements.append(element)
+            continue
+
+        elements.pop()
+        if nodes:
+            node = nodes.pop()
+            if node.children is None and element.text is not None:
+                text = element.text.strip()
+                if text:
+                    node.text = _intern(text)
+            if nodes and node.name == "name" and node.children is None and nodes[-1].children == [node]:
+                # A list entry's key: keep it on the entry rather than as a child.
+                nodes[-1].key = node.text
+                nodes[-1].children = None
+                tree.nodes -= 1
+            element.clear()
+            if elements:
+                elements[-1].remove(element)
+        elif error is not None:
+            if name == "error-severity":
+                error[0] = (element.text or "error").strip()
+            elif name == "error-message":
+                error[1] = (element.text or "").strip()
+            elif name == "rpc-error":
+                if tree is None:
+                    tree = ConfigTree()
+                (tree.warnings if error[0] == "warning" else tree.errors).append(error[1])
+                error = None
+    if tree is None:
+        tree = ConfigTree()
+    return tree
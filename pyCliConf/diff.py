@@ -0,0 +1,220 @@
+"""
+Compare desired "set" configuration with what is already on the device.
+
+Used by CliConf.load_config_diff() so that a re-run only sends the set
+lines that are missing from the running configuration, plus any delete
+lines that still have something to delete.
+
+Desired lines are checked in order against a working copy of the running
+configuration, as Junos applies them: after "delete interfaces ge-0/0/0",
+a following "set interfaces ge-0/0/0 ..." is needed again even if the
+device already has it.
+"""
+import bisect
+import re
+
+from .netconf import string_types
+
+
+_spaces = re.compile(r"\s+")
+# A word: a run of anything but whitespace, where quoted strings (which may hold spaces) and backslash escapes count as one character.
+_word = re.compile(r'(?:[^\s"\\]|\\(?:[\s\S]|$)|"(?:[^"\\]|\\(?:[\s\S]|$))*"?)+')
+
+
+def normalize(line):
+    """
+    Returns a set/delete line in canonical form, or None for blank and comment lines.
+
+    Runs of whitespace are collapsed to one space, except inside double
+    quotes, so lines compare equal however they were indented or spaced.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if '"' not in line:
+        return " ".join(line.split())
+    if " ".join(line.split()) == line:
+        # Only single spaces anywhere, quoted or not: already canonical.
+        return line
+    if "\\" in line:
+        return " ".join(_word.findall(line))
+    # Without escapes, every other piece between quotes is quoted text.
+    parts = line.split('"')
+    for index in range(0, len(parts), 2):
+        parts[index] = _spaces.sub(" ", parts[index])
+    return '"'.join(parts)
+
+
+def split_words(line):
+    """
+    Splits a line into words, keeping a quoted string with its spaces as one word.
+    """
+    return _word.findall(line)
+
+
+def split_lines(config):
+    """
+    Splits set configuration (a string or iterable of lines) into normalized (verb, statement) pairs.
+    """
+    if isinstance(config, string_types):
+        config = config.splitlines()
+    for line in config:
+        line = normalize(line)
+        if line is None:
+            continue
+        verb, _, statement = line.partition(" ")
+        yield verb, statement
+
+
+class SetIndex(object):
+    """
+    An indexed collection of "set" statements, with the leading "set " removed.
+
+    Membership is a hash lookup; has_prefix() answers "would this delete
+    remove anything" with a binary search over the sorted statements.
+    """
+    def __init__(self, statements=()):
+        self.statements = set(statements)
+        self._sorted = None
+
+    def copy(self):
+        index = SetIndex()
+        index.statements = set(self.statements)
+        index._sorted = list(self._sorted) if self._sorted is not None else None
+        return index
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds an index from set configuration, applying any delete lines in order.
+        """
+        index = cls()
+        for verb, statement in split_lines(config):
+            if verb == "set":
+                index.statements.add(statement)
+            elif verb == "delete":
+                index.delete(statement)
+        return index
+
+    def __contains__(self, statement):
+        return statement in self.statements
+
+    def __len__(self):
+        return len(self.statements)
+
+    def add(self, statement):
+        if statement not in self.statements:
+            self.statements.add(statement)
+            if self._sorted is not None:
+                bisect.insort(self._sorted, statement)
+
+    def delete(self, prefix):
+        """
+        Removes what a "delete <prefix>" would remove. Returns True if anything was removed.
+        """
+        found = self.matching(prefix)
+        if found:
+            # prefix and "prefix ..." sort next to each other.
+            self.statements.difference_update(found)
+            start = bisect.bisect_left(self._sorted, found[0])
+            del self._sorted[start:start + len(found)]
+        return bool(found)
+
+    def matching(self, prefix):
+        """
+        Returns the statements a "delete <prefix>" would remove.
+        """
+        if self._sorted is None:
+            self._sorted = sorted(self.statements)
+        start = bisect.bisect_left(self._sorted, prefix)
+        found = []
+        for statement in self._sorted[start:]:
+            if statement == prefix or statement.startswith(prefix + " "):
+                found.append(statement)
+            elif not statement.startswith(prefix):
+                break
+        return found
+
+    def has_prefix(self, prefix):
+        return bool(self.matching(prefix))
+
+
+class ConfigDiff(object):
+    """
+    Set and delete lines needed to bring the device to the desired configuration.
+
+    Attributes:
+        :lines: every line to send, in the order it must be applied.
+        :set_lines: "set ..." lines missing from the device.
+        :delete_lines: "delete ..." lines that will remove something.
+        :replies: RpcReply objects for the load and commit RPCs sent, if any.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.set_lines = [line for line in lines if not line.startswith("delete ")]
+        self.delete_lines = [line for line in lines if line.startswith("delete ")]
+        self.replies = []
+
+    @property
+    def changed(self):
+        return bool(self.lines)
+
+    @property
+    def ok(self):
+        """
+        True when nothing needed changing, or every RPC sent succeeded.
+        """
+        return all(reply is not None and reply.ok for reply in self.replies)
+
+    def config(self):
+        """
+        Returns the lines to send as one string.
+        """
+        return "\n".join(self.lines)
+
+    def __repr__(self):
+        return "<ConfigDiff %d set, %d delete>" % (len(self.set_lines), len(self.delete_lines))
+
+
+def diff_set(desired, running, prune=False):
+    """
+    Compares desired set configuration with the running configuration.
+
+    Desired lines are applied in order to a copy of the running index, so
+    a delete affects the set lines after it. A set statement is already
+    present when the running configuration holds it exactly or as a prefix
+    of longer statements ("set interfaces ge-0/0/0 unit 0 family inet"
+    when an address is configured under it).
+
+    Args:
+        :desired: set configuration to apply (string or iterable of lines). May contain delete lines.
+        :running: running configuration as set lines, or a SetIndex of it.
+        :prune: also delete running statements that are not in desired, treating desired as the complete configuration. Defaults to False.
+
+    Returns a ConfigDiff.
+    """
+    if not isinstance(running, SetIndex):
+        running = SetIndex.from_config(running)
+    current = running.copy()
+    desired = list(split_lines(desired))
+
+    lines = []
+    if prune:
+        wanted = set(statement for verb, statement in desired if verb == "set")
+        for statement in sorted(running.statements - wanted):
+            lines.append("delete " + statement)
+            current.delete(statement)
+
+    for verb, statement in desired:
+        if verb == "set":
+            if statement not in current and not current.has_prefix(statement):
+                lines.append("set " + statement)
+                current.add(statement)
+        elif verb == "delete":
+            if current.delete(statement):
+                lines.append("delete " + statement)
+        else:
+            # Anything else (activate, deactivate, ...) can not be diffed, send it as is.
+            lines.append(verb + " " + statement)
+
+    return ConfigDiff(lines)
@@ -0,0 +1,55 @@
+"""
+Exceptions raised by pyCliConf.
+
+Most CliConf methods log errors rather than raising them, so that a ZTP
+script keeps going. These are used where the caller has to know that
+something failed, such as a transaction that was rolled back.
+"""
+
+
+class CliConfError(Exception):
+    """
+    Base class for pyCliConf errors.
+    """
+
+
+class RpcError(CliConfError):
+    """
+    The device rejected an RPC or the session closed before it replied.
+
+    Attributes:
+        :reply: RpcReply returned by the device, or None.
+    """
+    def __init__(self, message, reply=None):
+        CliConfError.__init__(self, message)
+        self.reply = reply
+
+
+class RpcTimeoutError(RpcError):
+    """
+    The device did not reply to an RPC within its timeout.
+    """
+
+
+class TransactionError(RpcError):
+    """
+    A transaction failed to load or commit and its changes were discarded.
+    """
+
+
+class PackageError(CliConfError):
+    """
+    A package could not be downloaded or failed checksum verification.
+    """
+
+
+class FetchError(CliConfError):
+    """
+    A configuration fragment could not be downloaded and no cached copy exists.
+    """
+
+
+class CacheDirectoryError(CliConfError):
+    """
+    A cache directory is not owned by this user or can be written by other users.
+    """
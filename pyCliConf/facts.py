@@ -0,0 +1,122 @@
+"""
+Device facts: software version, model, serial number and host name.
+
+CliConf.facts() sends the RPCs below once, pipelined, and reduces the
+replies to a small dict. The dict is kept in memory for the session and,
+with a facts_file, on disk for the rest of the ZTP run, so later steps
+and later attempts can decide whether an upgrade is needed without
+asking the device again. Installing a package or rebooting clears it,
+before the RPC is sent.
+"""
+import json
+import os
+import time
+
+from .netconf import local_name
+
+FACT_RPCS = [
+    """
+        <rpc>
+            <get-software-information/>
+        </rpc>
+        ]]>]]>
+        """,
+    """
+        <rpc>
+            <get-chassis-inventory/>
+        </rpc>
+        ]]>]]>
+        """,
+]
+
+
+def _text(element, name):
+    """
+    Returns the stripped text of the first descendant of element called name, or None.
+    """
+    for child in element.iter():
+        if local_name(child.tag) == name and child.text and child.text.strip():
+            return child.text.strip()
+    return None
+
+
+def parse_software(reply):
+    """
+    Returns {"hostname", "model", "version"} from a <get-software-information> reply.
+
+    Releases without <junos-version> only report it in the package
+    comments, as in "JUNOS Base OS boot [14.1X53-D15.2]"; on a
+    multi-RE system the first routing engine is used.
+    """
+    facts = {"hostname": None, "model": None, "version": None}
+    if reply is None or reply.xml is None:
+        return facts
+    facts["hostname"] = _text(reply.xml, "host-name")
+    facts["model"] = _text(reply.xml, "product-model")
+    facts["version"] = _text(reply.xml, "junos-version")
+    if facts["version"] is None:
+        for element in reply.xml.iter():
+            if local_name(element.tag) != "comment" or not element.text:
+                continue
+            comment = element.text
+            if "[" in comment and ("JUNOS Base OS" in comment or "JUNOS Software Release" in comment):
+                facts["version"] = comment[comment.index("[") + 1:comment.index("]")]
+                break
+    return facts
+
+
+def parse_chassis(reply):
+    """
+    Returns {"serial", "chassis"} from a <get-chassis-inventory> reply.
+    """
+    facts = {"serial": None, "chassis": None}
+    if reply is None or reply.xml is None:
+        return facts
+    for element in reply.xml.iter():
+        if local_name(element.tag) == "chassis":
+            for child in element:
+                name = local_name(child.tag)
+                if name == "serial-number" and child.text:
+                    facts["serial"] = child.text.strip()
+                elif name == "description" and child.text:
+                    facts["chassis"] = child.text.strip()
+            break
+    return facts
+
+
+class FactsCache(object):
+    """
+    Facts persisted as JSON, valid for max_age seconds.
+
+    Args:
+        :path: cache file, eg "/var/root/pycliconf-facts.json".
+        :max_age: seconds a cached copy is trusted. Defaults to 3600.
+    """
+    def __init__(self, path, max_age=3600):
+        self.path = path
+        self.max_age = max_age
+
+    def load(self):
+        """
+        Returns the cached facts, or None if there are none or they are too old.
+        """
+        try:
+            with open(self.path) as handle:
+                cached = json.load(handle)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(cached, dict) or time.time() - cached.get("time", 0) > self.max_age:
+            return None
+        return cached.get("facts")
+
+    def save(self, facts):
+        partial = self.path + ".tmp"
+        with open(partial, "w") as handle:
+            json.dump({"time": time.time(), "facts": facts}, handle, indent=1, sort_keys=True)
+        os.rename(partial, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
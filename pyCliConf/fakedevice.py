@@ -0,0 +1,371 @@
+"""
+A local stand-in for the Junos "cli xml-mode netconf" session.
+
+It reads "]]>]]>" framed RPCs on stdin and writes framed <rpc-reply>
+messages on stdout, so CliConf can be driven, load tested and benchmarked
+without a switch. It keeps an in-memory candidate and running
+configuration and understands the RPCs pyCliConf sends:
+
+    load-configuration, commit, discard-changes, get-configuration,
+    get-software-information, get-chassis-inventory, request-package-add,
+    request-reboot, close-session
+
+Configuration is modelled as an ordered set of "set" lines. Text and XML
+loads are kept verbatim alongside them.
+
+This file only uses the standard library and runs on its own:
+
+    python fakedevice.py --latency 0.01 --commit-time 2 --fail-on commit
+
+Usually it is started through pyCliConf.transport.FakeDeviceTransport.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+DELIMITER = b"]]>]]>"
+NETCONF_NS = "urn:ietf:params:xml:ns:netconf:base:1.0"
+
+# Set keywords followed by the name of a list entry, as "container": "entry element".
+LIST_CONTAINERS = {"interfaces": "interface", "vlans": "vlan"}
+LIST_ENTRIES = frozenset(["unit", "address", "neighbor", "group", "user", "route", "term", "filter"])
+
+
+class Database(object):
+    """
+    One configuration database: ordered set lines plus verbatim text/XML loads.
+    """
+    def __init__(self, lines=None, blobs=None):
+        self.lines = list(lines or [])
+        self.index = set(self.lines)
+        self.blobs = list(blobs or [])
+
+    def copy(self):
+        return Database(self.lines, self.blobs)
+
+    def clear(self):
+        self.lines = []
+        self.index = set()
+        self.blobs = []
+
+    def apply_set(self, text):
+        """
+        Apply "set" / "delete" lines in order. Returns a list of error messages.
+        """
+        errors = []
+        deletes = []
+        for raw in text.splitlines():
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("set "):
+                if deletes:
+                    # Consecutive deletes are applied in one pass.
+                    self.delete(deletes)
+                    deletes = []
+                statement = line[4:].strip()
+                if statement not in self.index:
+                    self.index.add(statement)
+                    self.lines.append(statement)
+            elif line.startswith("delete "):
+                deletes.append(line[7:].strip())
+            else:
+                errors.append("syntax error: %s" % line)
+        if deletes:
+            self.delete(deletes)
+        return errors
+
+    def delete(self, statements):
+        kept = []
+        for line in self.lines:
+            if any(line == s or line.startswith(s + " ") for s in statements):
+                continue
+            kept.append(line)
+        self.lines = kept
+        self.index = set(kept)
+
+    def as_set(self):
+        return "\n".join("set " + line for line in self.lines)
+
+    def as_xml(self, subtree=None):
+        """
+        Returns the set lines as a <configuration> element, selected by an optional subtree filter.
+
+        Only a handful of list statements are known (see LIST_CONTAINERS and
+        LIST_ENTRIES); otherwise the last word of a line is a leaf value.
+        """
+        root = ET.Element("configuration")
+        made = {}
+
+        def child(parent, name, key=None):
+            node = made.get((id(parent), name, key))
+            if node is None:
+                node = ET.SubElement(parent, name)
+                if key is not None:
+                    ET.SubElement(node, "name").text = key
+                made[(id(parent), name, key)] = node
+            return node
+
+        for line in self.lines:
+            words = line.split()
+            node = root
+            index = 0
+            while index < len(words):
+                word = words[index]
+                if word in LIST_CONTAINERS and index + 1 < len(words):
+                    node = child(child(node, word), LIST_CONTAINERS[word], words[index + 1])
+                    index += 2
+                elif word in LIST_ENTRIES and index + 1 < len(words):
+                    node = child(node, word, words[index + 1])
+                    index += 2
+                elif index == len(words) - 2:
+                    ET.SubElement(node, word).text = words[index + 1]
+                    break
+                else:
+                    node = child(node, word)
+                    index += 1
+        if subtree is not None:
+            root = select(root, subtree)
+        return root
+
+
+class FakeDevice(object):
+    """
+    State machine answering one RPC at a time.
+    """
+    def __init__(self, latency=0.0, commit_time=0.0, fail_rate=0.0, fail_on=None, seed=None,
+                 version="14.1X53-D15.2", model="qfx5100-48s-6q", serial="VF3715030157"):
+        self.latency = latency
+        self.commit_time = commit_time
+        self.fail_rate = fail_rate
+        self.fail_on = set(fail_on or [])
+        self.random = random.Random(seed)
+        self.running = Database()
+        self.candidate = Database()
+        self.version = version
+        self.model = model
+        self.serial = serial
+        self.commits = 0
+        self.rpcs = 0
+        self.closed = False
+
+    def hello(self):
+        return ('<!-- No zombies were killed during the creation of this user interface -->\n'
+                '<hello xmlns="%s"><capabilities>'
+                '<capability>urn:ietf:params:netconf:base:1.0</capability>'
+                '<capability>urn:ietf:params:netconf:capability:candidate:1.0</capability>'
+                '</capabilities><session-id>%d</session-id></hello>' % (NETCONF_NS, os.getpid()))
+
+    def handle(self, message):
+        """
+        Return the reply text for one framed message.
+        """
+        self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        text = message.decode("utf-8", "replace").strip()
+        if not text:
+            return None
+        try:
+            rpc = ET.fromstring(text)
+        except Exception as err:
+            return self.reply({}, error("syntax error, expecting <rpc>: %s" % err))
+
+        if local_name(rpc.tag) == "hello":
+            return None
+        if local_name(rpc.tag) != "rpc" or len(rpc) == 0:
+            return self.reply(rpc.attrib, error("syntax error, expecting <rpc>"))
+
+        operation = rpc[0]
+        name = local_name(operation.tag)
+        if name in self.fail_on or (self.fail_rate and self.random.random() < self.fail_rate):
+            return self.reply(rpc.attrib, error("injected failure for <%s>" % name))
+
+        handler = getattr(self, "rpc_" + name.replace("-", "_"), None)
+        if handler is None:
+            return self.reply(rpc.attrib, error("syntax error, unknown RPC <%s>" % name))
+        return self.reply(rpc.attrib, handler(operation))
+
+    def reply(self, attrib, body):
+        attrs = "".join(' %s="%s"' % (key, value) for key, value in attrib.items())
+        return '<rpc-reply xmlns="%s"%s>%s</rpc-reply>' % (NETCONF_NS, attrs, body)
+
+    def rpc_load_configuration(self, operation):
+        action = operation.get("action", "merge")
+        url = operation.get("url")
+        if action in ("override", "overide"):
+            self.candidate.clear()
+
+        if url:
+            if url.startswith("/") and not os.path.exists(url):
+                return error("could not open configuration file: %s" % url)
+            if url.startswith("/"):
+                with open(url) as handle:
+                    payload = handle.read()
+            else:
+                payload = None
+            kind = "set" if action == "set" else operation.get("format", "text")
+        else:
+            if len(operation) == 0:
+                return error("syntax error, no configuration to load")
+            child = operation[0]
+            kind = {"configuration-set": "set", "configuration-text": "text"}.get(local_name(child.tag), "xml")
+            if action == "set":
+                kind = "set"
+            if kind == "xml":
+                payload = ET.tostring(child).decode("utf-8")
+            else:
+                payload = child.text or ""
+
+        if payload is None:
+            self.candidate.blobs.append(url)
+        elif kind == "set":
+            errors = self.candidate.apply_set(payload)
+            if errors:
+                return "".join(error(message) for message in errors)
+        else:
+            self.candidate.blobs.append(payload)
+        return '<load-configuration-results><ok/></load-configuration-results>'
+
+    def rpc_commit(self, operation):
+        if self.commit_time:
+            time.sleep(self.commit_time)
+        self.running = self.candidate.copy()
+        self.commits += 1
+        return ('<commit-results><routing-engine><name>re0</name><commit-success/>'
+                '</routing-engine></commit-results><ok/>')
+
+    def rpc_commit_configuration(self, operation):
+        return self.rpc_commit(operation)
+
+    def rpc_discard_changes(self, operation):
+        self.candidate = self.running.copy()
+        return '<ok/>'
+
+    def rpc_get_configuration(self, operation):
+        database = self.candidate if operation.get("database") == "candidate" else self.running
+        if operation.get("format") == "set":
+            return '<configuration-set>%s</configuration-set>' % quote(database.as_set())
+        if operation.get("format") == "text":
+            return '<configuration-text>%s</configuration-text>' % quote("\n".join(database.blobs))
+        subtree = None
+        for child in operation:
+            if local_name(child.tag) == "configuration":
+                subtree = child
+        return ET.tostring(database.as_xml(subtree)).decode("utf-8")
+
+    def rpc_get_software_information(self, operation):
+        return ('<software-information><host-name>fakedevice</host-name>'
+                '<product-model>%s</product-model><product-name>%s</product-name>'
+                '<junos-version>%s</junos-version>'
+                '<package-information><name>junos</name><comment>JUNOS Base OS boot [%s]</comment></package-information>'
+                '</software-information>' % (self.model, self.model, self.version, self.version))
+
+    def rpc_get_chassis_inventory(self, operation):
+        return ('<chassis-inventory><chassis style="inventory"><name>Chassis</name>'
+                '<serial-number>%s</serial-number><description>%s</description>'
+                '</chassis></chassis-inventory>' % (self.serial, self.model.upper()))
+
+    def rpc_request_package_add(self, operation):
+        package = "".join(operation.itertext()).strip()
+        return '<output>Installing package \'%s\' ...</output><package-result>0</package-result>' % quote(package)
+
+    def rpc_request_reboot(self, operation):
+        return '<request-reboot-results><request-reboot-status>Shutdown NOW!</request-reboot-status></request-reboot-results>'
+
+    def rpc_close_session(self, operation):
+        self.closed = True
+        return '<ok/>'
+
+
+def local_name(tag):
+    if tag[:1] == "{":
+        return tag.split("}", 1)[1]
+    return tag
+
+
+def select(node, subtree):
+    """
+    Returns a copy of node holding only what the subtree filter element asks for.
+    """
+    selected = ET.Element(node.tag)
+    key = node.find("name")
+    if key is not None:
+        selected.append(key)
+    for wanted in subtree:
+        wanted_key = wanted.find("name")
+        deeper = [element for element in wanted if element.tag != "name"]
+        for element in node:
+            if element.tag != local_name(wanted.tag):
+                continue
+            if wanted_key is not None:
+                element_key = element.find("name")
+                if element_key is None or element_key.text != wanted_key.text:
+                    continue
+            selected.append(select(element, wanted) if deeper else element)
+    return selected
+
+
+def quote(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def error(message):
+    return ('<rpc-error><error-type>protocol</error-type><error-severity>error</error-severity>'
+            '<error-message>%s</error-message></rpc-error>' % quote(message))
+
+
+def serve(device, stdin_fd=0, stdout=None):
+    """
+    Answer framed RPCs from stdin_fd until end of stream or <close-session/>.
+    """
+    stdout = stdout or getattr(sys.stdout, "buffer", sys.stdout)
+
+    def send(text):
+        stdout.write(text.encode("utf-8") + b"\n" + DELIMITER + b"\n")
+        stdout.flush()
+
+    send(device.hello())
+    buffered = b""
+    start = 0
+    while not device.closed:
+        index = buffered.find(DELIMITER, start)
+        if index == -1:
+            start = max(0, len(buffered) - len(DELIMITER) + 1)
+            data = os.read(stdin_fd, 65536)
+            if not data:
+                break
+            buffered += data
+            continue
+        message = buffered[:index]
+        buffered = buffered[index + len(DELIMITER):]
+        start = 0
+        reply = device.handle(message)
+        if reply is not None:
+            send(reply)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in for Junos 'cli xml-mode netconf'.")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every RPC")
+    parser.add_argument("--commit-time", type=float, default=0.0, help="seconds a commit takes")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probability any RPC fails")
+    parser.add_argument("--fail-on", action="append", default=[], help="RPC name that always fails")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for --fail-rate")
+    parser.add_argument("--version", default="14.1X53-D15.2", help="Junos version reported by get-software-information")
+    args = parser.parse_args(argv)
+
+    device = FakeDevice(latency=args.latency, commit_time=args.commit_time, fail_rate=args.fail_rate,
+                        fail_on=args.fail_on, seed=args.seed, version=args.version)
+    try:
+        serve(device)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
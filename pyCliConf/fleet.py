@@ -0,0 +1,278 @@
+"""
+Drive many CliConf sessions at once.
+
+A Fleet runs the same kind of plan (load_config, load_config_template,
+commit, install_package, ...) against every device in an inventory,
+using a bounded pool of worker threads. Each device gets its own CliConf,
+its own logfile and a timeout; the results are collected into a
+FleetResult with a throughput and latency summary.
+
+Devices are reached through any pyCliConf transport, for example
+"cli xml-mode netconf" run over ssh from a jump host:
+
+.. code-block:: python
+
+    from pyCliConf.fleet import Fleet
+    from pyCliConf.transport import ProcessTransport
+
+    inventory = [
+        {"name": "leaf1", "command": ["ssh", "root@leaf1", "cli", "xml-mode", "netconf"], "vars": {"hostname": "leaf1"}},
+        {"name": "leaf2", "command": ["ssh", "root@leaf2", "cli", "xml-mode", "netconf"], "vars": {"hostname": "leaf2"}},
+    ]
+    plan = [
+        ("load_config_template", {"template": "system { host-name {{ hostname }}; }"}),
+        ("commit", {}),
+    ]
+
+    result = Fleet(inventory, plan, workers=32, timeout=600, logdir="/var/tmp/fleet").run()
+    print(result.report())
+"""
+import os
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .pyCliConf import CliConf
+from .transport import FakeDeviceTransport, ProcessTransport
+
+OPERATIONS = ["load_config", "load_config_stream", "load_config_template", "commit", "discard_changes", "install_package", "reboot"]
+
+
+def percentile(values, pct):
+    """
+    Returns the pct (0 - 100) percentile of a list of numbers, or 0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = int(round((pct / 100.0) * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class StepResult(object):
+    """
+    Outcome of one plan step on one device.
+    """
+    def __init__(self, operation, seconds, ok, errors):
+        self.operation = operation
+        self.seconds = seconds
+        self.ok = ok
+        self.errors = errors
+
+    def __repr__(self):
+        return "<StepResult %s %s %.3fs>" % (self.operation, "ok" if self.ok else "failed", self.seconds)
+
+
+class DeviceResult(object):
+    """
+    Outcome of a whole plan on one device.
+
+    Attributes:
+        :name: device name from the inventory.
+        :ok: True when every step succeeded within the timeout.
+        :steps: list of StepResult, in plan order. Stops at the first failure.
+        :seconds: wall time spent on the device, including session setup and close.
+        :error: description of why the device failed, or None.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.ok = False
+        self.steps = []
+        self.seconds = 0.0
+        self.error = None
+
+    def __repr__(self):
+        return "<DeviceResult %s %s %.3fs>" % (self.name, "ok" if self.ok else "failed: %s" % self.error, self.seconds)
+
+
+class FleetResult(object):
+    """
+    Results for every device in a Fleet run.
+    """
+    def __init__(self, devices, seconds, workers):
+        self.devices = devices
+        self.seconds = seconds
+        self.workers = workers
+
+    @property
+    def failed(self):
+        return [device for device in self.devices if not device.ok]
+
+    def summary(self):
+        """
+        Returns a dict with device counts, throughput and per-operation latency (p50/p90/p99/max seconds).
+        """
+        latencies = {}
+        for device in self.devices:
+            for step in device.steps:
+                latencies.setdefault(step.operation, []).append(step.seconds)
+        device_times = [device.seconds for device in self.devices]
+
+        return {
+            "devices": len(self.devices),
+            "ok": len(self.devices) - len(self.failed),
+            "failed": len(self.failed),
+            "workers": self.workers,
+            "seconds": self.seconds,
+            "devices_per_second": len(self.devices) / self.seconds if self.seconds else 0.0,
+            "device_seconds": latency_summary(device_times),
+            "operations": dict((operation, latency_summary(values)) for operation, values in latencies.items()),
+        }
+
+    def report(self):
+        """
+        Returns the summary as readable text.
+        """
+        summary = self.summary()
+        lines = [
+            "%d devices, %d ok, %d failed in %.2fs (%.2f devices/s, %d workers)" % (
+                summary["devices"], summary["ok"], summary["failed"], summary["seconds"],
+                summary["devices_per_second"], summary["workers"]),
+            "%-22s %6s %9s %9s %9s %9s" % ("operation", "count", "p50", "p90", "p99", "max"),
+        ]
+        rows = [("device", summary["device_seconds"])] + sorted(summary["operations"].items())
+        for name, stats in rows:
+            lines.append("%-22s %6d %8.3fs %8.3fs %8.3fs %8.3fs" % (
+                name, stats["count"], stats["p50"], stats["p90"], stats["p99"], stats["max"]))
+        for device in self.failed:
+            lines.append("FAILED %s: %s" % (device.name, device.error))
+        return "\n".join(lines)
+
+
+def latency_summary(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+class Fleet(object):
+    """
+    Runs a plan on every device of an inventory with a pool of worker threads.
+
+    Args:
+        :inventory: list of dicts, one per device:
+            - "name": device name, used for results and the logfile name
+            - "transport": a pyCliConf transport, or
+            - "command": command list started with ProcessTransport, or
+            - "fake": dict of FakeDeviceTransport arguments, for testing
+            - "vars": dict of template vars for load_config_template steps (optional)
+            - "plan": per-device plan overriding the shared one (optional)
+        :plan: list of (operation, kwargs) tuples run in order on each device. Operations are CliConf method names: "load_config", "load_config_stream", "load_config_template", "commit", "discard_changes", "install_package", "reboot". load_config_template uses the device "vars" unless template_vars is given. May also be a callable taking the inventory entry and returning a plan.
+        :workers: number of devices worked on at once. Defaults to 16.
+        :timeout: seconds allowed per device before its session is aborted. Defaults to None (no limit).
+        :logdir: directory for per-device logfiles "<name>.log". Defaults to "/var/tmp".
+        :log_format: "text" or "json" logfiles; json logs can be summarised with pyCliConf.timeline. Defaults to "text".
+    """
+    def __init__(self, inventory, plan, workers=16, timeout=None, logdir="/var/tmp", log_format="text"):
+        self.inventory = list(inventory)
+        self.plan = plan
+        self.workers = max(1, min(workers, len(self.inventory) or 1))
+        self.timeout = timeout
+        self.logdir = logdir
+        self.log_format = log_format
+
+    def run(self):
+        """
+        Runs the plan on every device and returns a FleetResult.
+        """
+        if not os.path.isdir(self.logdir):
+            os.makedirs(self.logdir)
+
+        pending = queue.Queue()
+        for index, device in enumerate(self.inventory):
+            pending.put((index, device))
+        results = [None] * len(self.inventory)
+
+        def worker():
+            while True:
+                try:
+                    index, device = pending.get(False)
+                except queue.Empty:
+                    return
+                results[index] = self.run_device(device)
+
+        started = time.time()
+        threads = [threading.Thread(target=worker, name="pyCliConf-fleet-%d" % n) for n in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return FleetResult(results, time.time() - started, self.workers)
+
+    def run_device(self, device):
+        """
+        Runs the plan on a single inventory entry and returns a DeviceResult.
+        """
+        name = device.get("name", "device")
+        result = DeviceResult(name)
+        started = time.time()
+        timed_out = []
+        timer = None
+        dev = None
+        try:
+            transport = self.transport(device)
+
+            def expire():
+                timed_out.append(True)
+                transport.abort()
+
+            if self.timeout:
+                timer = threading.Timer(self.timeout, expire)
+                timer.daemon = True
+                timer.start()
+
+            dev = CliConf(logfile=os.path.join(self.logdir, "%s.log" % name), transport=transport, log_format=self.log_format)
+            plan = device.get("plan", self.plan)
+            if callable(plan):
+                plan = plan(device)
+            for operation, kwargs in plan:
+                step = self.run_step(dev, device, operation, dict(kwargs))
+                result.steps.append(step)
+                if timed_out:
+                    result.error = "timed out after %ss" % self.timeout
+                    break
+                if not step.ok:
+                    result.error = "%s failed: %s" % (operation, "; ".join(step.errors) or "no reply")
+                    break
+            else:
+                result.ok = True
+        except Exception as err:
+            result.error = "%r" % err
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if dev is not None:
+                dev.close()
+            result.seconds = time.time() - started
+        return result
+
+    def run_step(self, dev, device, operation, kwargs):
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown fleet operation: %r" % operation)
+        if operation == "load_config_template":
+            kwargs.setdefault("template_vars", device.get("vars", {}))
+
+        started = time.time()
+        reply = getattr(dev, operation)(**kwargs)
+        seconds = time.time() - started
+        if reply is None:
+            return StepResult(operation, seconds, False, [])
+        return StepResult(operation, seconds, reply.ok, reply.errors)
+
+    def transport(self, device):
+        if "transport" in device:
+            return device["transport"]
+        if "command" in device:
+            return ProcessTransport(device["command"])
+        if "fake" in device:
+            return FakeDeviceTransport(**device["fake"])
+        raise ValueError("Inventory entry %r needs a transport, command or fake" % device.get("name"))
@@ -0,0 +1,330 @@
+"""
+Client-side fetch cache for configuration fragments.
+
+load_config(url=...) makes Junos download the URL itself, on a new
+connection every time, and a ZTP retry downloads every fragment again.
+FragmentCache downloads fragments in pyCliConf instead:
+
+    - over a pool of keep-alive HTTP connections, one pool per server
+    - into a private per-user cache under /var/tmp (see pyCliConf.cachedir),
+      revalidated with If-None-Match /
+      If-Modified-Since so an unchanged fragment costs one 304 reply
+    - several at a time with fetch_all()
+
+A copy validated within the last fresh_for seconds is used without
+contacting the server, and a cached copy is used if the server cannot be
+reached. FTP fragments are revalidated with MDTM.
+
+CliConf.load_config(url=..., fetch="inline") loads a fragment from the
+cache as a cfg_string; fetch="path" hands Junos the cached file instead.
+CliConf.prefetch(urls) fills the cache in parallel beforehand.
+"""
+import base64
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    import Queue as queue
+    from urlparse import urljoin, urlsplit
+except ImportError:
+    import queue
+    from urllib.parse import urljoin, urlsplit
+
+from .cachedir import cache_directory, private_directory
+from .exceptions import CacheDirectoryError, FetchError
+from .netconf import to_text
+
+MAX_REDIRECTS = 5
+
+
+def is_remote(url):
+    """
+    Returns True for the http, https and ftp URLs that FragmentCache fetches.
+    """
+    return bool(url) and urlsplit(url).scheme in ("http", "https", "ftp")
+
+
+def http_client():
+    """
+    Returns the httplib module, imported on first use: most scripts never fetch a fragment.
+    """
+    try:
+        import httplib
+    except ImportError:
+        import http.client as httplib
+    return httplib
+
+
+class ConnectionPool(object):
+    """
+    Idle keep-alive HTTP(S) connections, kept per (scheme, host, port).
+
+    Args:
+        :timeout: socket timeout in seconds. Defaults to 30.
+        :size: idle connections kept per server. Defaults to 4.
+    """
+    def __init__(self, timeout=30, size=4):
+        self.timeout = timeout
+        self.size = size
+        self.idle = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def get(self, parts, path, headers):
+        """
+        Sends a GET on a pooled connection.
+
+        Returns (status, {lower-case header: value}, body bytes).
+        """
+        httplib = http_client()
+        key = (parts.scheme, parts.hostname, parts.port)
+        for attempt in range(2):
+            connection, reused = self._checkout(key)
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                # The server may have dropped an idle connection; retry once on a new one.
+                if reused and attempt == 0:
+                    continue
+                raise
+            response_headers = dict((name.lower(), value) for name, value in response.getheaders())
+            if response.will_close:
+                connection.close()
+            else:
+                self._checkin(key, connection)
+            return response.status, response_headers, body
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle = {}
+
+    def _checkin(self, key, connection):
+        with self.lock:
+            connections = self.idle.setdefault(key, [])
+            if len(connections) < self.size:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def _checkout(self, key):
+        with self.lock:
+            connections = self.idle.get(key)
+            if connections:
+                return connections.pop(), True
+            self.connections += 1
+        scheme, host, port = key
+        httplib = http_client()
+        if scheme == "https":
+            return httplib.HTTPSConnection(host, port, timeout=self.timeout), False
+        return httplib.HTTPConnection(host, port, timeout=self.timeout), False
+
+
+class FragmentCache(object):
+    """
+    Fetches and caches configuration fragments.
+
+    Each URL is cached as "<directory>/<sha1 of url>" with a ".meta" JSON
+    file holding its ETag, Last-Modified and when it was last validated.
+
+    Args:
+        :directory: cache location, created with mode 0700 and refused unless this user owns it and nobody else can write to it. Defaults to "/var/tmp/pycliconf-fragments-<uid>".
+        :fresh_for: seconds a validated copy is used without asking the server again. Defaults to 60.
+        :workers: fragments fetched at once by fetch_all(). Defaults to 4.
+        :timeout: socket timeout in seconds. Defaults to 30.
+        :pool_size: idle keep-alive connections kept per server. Defaults to 4.
+
+    Example:
+
+    .. code-block:: python
+
+        from pyCliConf.fragments import FragmentCache
+
+        cache = FragmentCache()
+        base, ntp = cache.fetch_all(["http://172.32.32.254/base.conf", "http://172.32.32.254/ntp.conf"])
+    """
+    def __init__(self, directory=None, fresh_for=60, workers=4, timeout=30, pool_size=4):
+        self.directory = directory or cache_directory("fragments")
+        self.fresh_for = fresh_for
+        self.workers = workers
+        self.timeout = timeout
+        self.pool = ConnectionPool(timeout=timeout, size=pool_size)
+        self.stats = {"fetched": 0, "revalidated": 0, "fresh": 0, "stale": 0}
+        self.lock = threading.Lock()
+
+    def path(self, url):
+        """
+        Returns where the cached copy of url lives, whether or not it exists yet.
+        """
+        return os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def fetch(self, url):
+        """
+        Returns the text of url, from the cache when it is still current.
+        """
+        with open(self.fetch_path(url), "rb") as handle:
+            return to_text(handle.read())
+
+    def fetch_all(self, urls):
+        """
+        Fetches several URLs in parallel and returns their texts in the same order.
+
+        Raises the FetchError of the first URL that failed.
+        """
+        urls = list(urls)
+        results = [None] * len(urls)
+        pending = queue.Queue()
+        for index, url in enumerate(urls):
+            pending.put((index, url))
+
+        def worker():
+            while True:
+                try:
+                    index, url = pending.get(False)
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = self.fetch(url)
+                except Exception as err:
+                    results[index] = err if isinstance(err, FetchError) else FetchError("%s: %r" % (url, err))
+
+        threads = [threading.Thread(target=worker, name="pyCliConf-fetch-%d" % n)
+                   for n in range(min(self.workers, len(urls)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for result in results:
+            if isinstance(result, FetchError):
+                raise result
+        return results
+
+    def fetch_path(self, url):
+        """
+        Returns a local path holding the current copy of url.
+
+        Raises FetchError if url cannot be fetched and nothing is cached,
+        or if the cache directory can not be trusted.
+        """
+        # Cached fragments are loaded as device configuration: never read a directory others can write to.
+        try:
+            private_directory(self.directory)
+        except (CacheDirectoryError, OSError) as err:
+            raise FetchError("Fragment cache unusable: %s" % err)
+        path = self.path(url)
+        meta = self._read_meta(path)
+        if meta is not None and time.time() - meta.get("validated", 0) < self.fresh_for:
+            self._count("fresh")
+            return path
+
+        try:
+            if urlsplit(url).scheme == "ftp":
+                changed = self._fetch_ftp(url, path, meta)
+            else:
+                changed = self._fetch_http(url, path, meta)
+        except Exception as err:
+            if meta is not None:
+                self._count("stale")
+                return path
+            if isinstance(err, FetchError):
+                raise
+            raise FetchError("Fragment download failed: %s: %r" % (url, err))
+        self._count("fetched" if changed else "revalidated")
+        return path
+
+    def close(self):
+        self.pool.close()
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _fetch_ftp(self, url, path, meta):
+        import ftplib
+
+        parts = urlsplit(url)
+        ftp = ftplib.FTP(timeout=self.timeout)
+        try:
+            ftp.connect(parts.hostname, parts.port or 21)
+            ftp.login(parts.username or "anonymous", parts.password or "")
+            ftp.voidcmd("TYPE I")
+            try:
+                modified = ftp.sendcmd("MDTM " + parts.path)
+            except ftplib.Error:
+                modified = None
+            if meta is not None and modified and meta.get("last_modified") == modified:
+                self._write_meta(path, meta)
+                return False
+            chunks = []
+            ftp.retrbinary("RETR " + parts.path, chunks.append)
+        finally:
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+        self._store(path, url, b"".join(chunks), None, modified)
+        return True
+
+    def _fetch_http(self, url, path, meta):
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        location = url
+        for redirect in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(location)
+            request_headers = dict(headers)
+            if parts.username:
+                credentials = "%s:%s" % (parts.username, parts.password or "")
+                request_headers["Authorization"] = "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+            status, response_headers, body = self.pool.get(parts, (parts.path or "/") + ("?" + parts.query if parts.query else ""),
+                                                           request_headers)
+            if status in (301, 302, 303, 307, 308) and "location" in response_headers:
+                location = urljoin(location, response_headers["location"])
+                continue
+            break
+
+        if status == 304 and meta is not None:
+            self._write_meta(path, meta)
+            return False
+        if status != 200:
+            raise FetchError("Fragment download failed: %s: HTTP %d" % (url, status))
+        self._store(path, url, body, response_headers.get("etag"), response_headers.get("last-modified"))
+        return True
+
+    def _read_meta(self, path):
+        try:
+            with open(path + ".meta") as handle:
+                meta = json.load(handle)
+        except (IOError, OSError, ValueError):
+            return None
+        if not os.path.exists(path):
+            return None
+        return meta
+
+    def _store(self, path, url, body, etag, last_modified):
+        partial = "%s.%d.%d.part" % (path, os.getpid(), threading.current_thread().ident)
+        with open(partial, "wb") as handle:
+            handle.write(body)
+        os.rename(partial, path)
+        self._write_meta(path, {"url": url, "etag": etag, "last_modified": last_modified})
+
+    def _write_meta(self, path, meta):
+        meta = dict(meta, validated=time.time())
+        partial = "%s.meta.%d.%d.part" % (path, os.getpid(), threading.current_thread().ident)
+        with open(partial, "w") as handle:
+            json.dump(meta, handle)
+        os.rename(partial, path + ".meta")
@@ -0,0 +1,191 @@
+"""
+Buffered, background log writer used by CliConf.log().
+
+Writing every log line straight to flash-backed /var/root makes logging a
+measurable part of ZTP time. LogWriter puts lines on a bounded queue and
+a background thread writes them out in large batches, once per
+flush_interval or whenever a megabyte has built up. Everything queued is
+written when the writer is closed, and at interpreter exit for writers
+that were never closed.
+
+With max_bytes set the file is rotated like a logrotate'd log: when it
+would grow past max_bytes it is renamed to "<path>.1" (older copies move
+up to "<path>.<backups>", the oldest is dropped) and a new file started.
+"""
+import atexit
+import os
+import threading
+import time
+import weakref
+
+from datetime import datetime
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+FLUSH_INTERVAL = 1.0
+QUEUE_SIZE = 10000
+BATCH_BYTES = 1024 * 1024
+
+_STOP = object()
+_FLUSH = object()
+_timestamp = [None, ""]
+_writers = weakref.WeakSet()
+
+
+def timestamp():
+    """
+    Returns the current time as "YYYY-MM-DD HH:MM:SS", formatted at most once per second.
+    """
+    now = int(time.time())
+    cached = _timestamp
+    if cached[0] != now:
+        cached[1] = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        cached[0] = now
+    return cached[1]
+
+
+class LogWriter(object):
+    """
+    Appends lines to a file from a background thread.
+
+    Args:
+        :path: file to append to.
+        :flush_interval: maximum seconds a line waits in memory before it is written. Defaults to 1.0.
+        :queue_size: maximum number of lines held in memory. write() blocks when the queue is full. Defaults to 10000.
+        :max_bytes: rotate the file before it grows past this size. Defaults to None, never rotate.
+        :backups: rotated copies kept. Defaults to 3.
+
+    Attributes:
+        :file: the underlying file object, for handing to subprocesses as stderr. A subprocess keeps writing to the file it was given after a rotation.
+    """
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, queue_size=QUEUE_SIZE, max_bytes=None, backups=3):
+        self.path = path
+        self.file = open(path, "a")
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(queue_size)
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="pyCliConf-log")
+        self.thread.daemon = True
+        self.thread.start()
+        _writers.add(self)
+
+    def write(self, data):
+        """
+        Queues data to be appended to the file.
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed log file %s" % self.path)
+        self.queue.put(data)
+
+    def flush(self):
+        """
+        Blocks until everything queued so far is on disk.
+        """
+        if self.closed:
+            return
+        done = threading.Event()
+        self.queue.put((_FLUSH, done))
+        done.wait()
+
+    def close(self):
+        """
+        Writes out everything still queued and closes the file.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.file.close()
+
+    def _run(self):
+        get = self.queue.get
+        while True:
+            item = get()
+            size = 0
+            deadline = time.time() + self.flush_interval
+            stop = False
+            events = []
+            lines = []
+            # Collect lines until the flush interval passes, the batch is
+            # large, or someone asks for a flush or close.
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, tuple) and item[:1] == (_FLUSH,):
+                    events.append(item[1])
+                else:
+                    lines.append(item)
+                    size += len(item)
+                if stop or events or size >= BATCH_BYTES:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = get(True, remaining)
+                except queue.Empty:
+                    break
+
+            try:
+                if lines and self.max_bytes:
+                    self._write_rotating(lines)
+                elif lines:
+                    self.file.write("".join(lines))
+                self.file.flush()
+            except Exception as err:
+                print("Error logging to file: %r" % err)
+            for event in events:
+                event.set()
+            if stop:
+                return
+
+    def _write_rotating(self, lines):
+        """
+        Writes a batch, rotating between lines wherever the file would grow past max_bytes.
+        """
+        start = 0
+        pending = 0
+        for index, line in enumerate(lines):
+            if self.size + pending + len(line) > self.max_bytes and self.size + pending > 0:
+                self.file.write("".join(lines[start:index]))
+                self._rotate()
+                start = index
+                pending = 0
+            pending += len(line)
+        self.file.write("".join(lines[start:]))
+        self.size += pending
+
+    def _rotate(self):
+        self.file.close()
+        try:
+            for number in range(self.backups - 1, 0, -1):
+                older = "%s.%d" % (self.path, number)
+                if os.path.exists(older):
+                    os.rename(older, "%s.%d" % (self.path, number + 1))
+            if self.backups > 0:
+                os.rename(self.path, self.path + ".1")
+        finally:
+            # Without backups the file is simply started again.
+            self.file = open(self.path, "a" if self.backups > 0 else "w")
+            self.size = os.fstat(self.file.fileno()).st_size
+
+
+def close_all():
+    """
+    Closes every open LogWriter. Registered to run at interpreter exit.
+    """
+    for writer in list(_writers):
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_all)
@@ -0,0 +1,232 @@
+"""
+Timing and byte counters for CliConf.
+
+Every RPC sent through CliConf.rpc() is timed from the first byte written
+to the reply being parsed and recorded in a latency histogram for its
+type (load, commit, package-add, reboot, close, ...), along with the
+bytes written and read. Template rendering and logging are timed too.
+dev.metrics() returns a snapshot, and an optional JSON-lines file gets
+one record per RPC.
+
+Setting the PYCLICONF_PROFILE environment variable wraps every public
+CliConf method so each call is timed as "call.<method>" as well.
+"""
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+PROFILE_ENV = "PYCLICONF_PROFILE"
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+
+RPC_NAMES = {
+    "load-configuration": "load",
+    "commit": "commit",
+    "commit-configuration": "commit",
+    "request-package-add": "package-add",
+    "request-reboot": "reboot",
+    "close-session": "close",
+    "get-configuration": "get-config",
+    "discard-changes": "discard",
+}
+
+_rpc_tag = re.compile(r"<rpc[^>]*>\s*<([\w:-]+)")
+
+
+def rpc_name(rpc):
+    """
+    Returns the short metrics name for an RPC string, from the first element inside <rpc>.
+    """
+    match = _rpc_tag.search(rpc[:4096])
+    if match is None:
+        return "other"
+    tag = match.group(1).split(":")[-1]
+    return RPC_NAMES.get(tag, tag)
+
+
+class Histogram(object):
+    """
+    Fixed-bucket latency histogram with count, sum, min and max.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q (0.0 - 1.0) quantile, capped at max.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                bound = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        buckets = {}
+        for index, count in enumerate(self.counts):
+            if count:
+                label = "le_%g" % BUCKETS[index] if index < len(BUCKETS) else "le_inf"
+                buckets[label] = count
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min or 0.0,
+            "max": self.max or 0.0,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class Metrics(object):
+    """
+    Thread-safe collection of counters and latency histograms.
+
+    Args:
+        :export: file object (anything with write()) that receives one JSON line per recorded event. Defaults to None.
+    """
+    def __init__(self, export=None):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {}
+        self.counters = {}
+        self.export = export
+
+    def observe(self, name, seconds):
+        """
+        Records a duration in the histogram called name.
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def add(self, name, value=1):
+        """
+        Adds value to the counter called name.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_rpc(self, name, seconds, bytes_written, bytes_read, ok):
+        """
+        Records one RPC round trip. bytes_written only goes to the export;
+        the "bytes_written" counter is kept by the caller as data is sent.
+        """
+        self.observe("rpc." + name, seconds)
+        with self.lock:
+            self.counters["rpcs"] = self.counters.get("rpcs", 0) + 1
+            self.counters["bytes_read"] = self.counters.get("bytes_read", 0) + bytes_read
+            if not ok:
+                self.counters["rpc_errors"] = self.counters.get("rpc_errors", 0) + 1
+        self.emit({"event": "rpc", "rpc": name, "seconds": seconds,
+                   "bytes_written": bytes_written, "bytes_read": bytes_read, "ok": ok})
+
+    def emit(self, record):
+        """
+        Writes a record to the JSON-lines export, if there is one.
+        """
+        if self.export is None:
+            return
+        record["time"] = time.time()
+        try:
+            self.export.write(json.dumps(record, sort_keys=True) + "\n")
+        except Exception:
+            pass
+
+    def timer(self, name):
+        """
+        Context manager timing a block into the histogram called name.
+        """
+        return Timer(self, name)
+
+    def snapshot(self):
+        """
+        Returns a dict of every counter and histogram.
+
+        Histogram names are "rpc.<type>" for RPC round trips,
+        "template_render", "log" and, with PYCLICONF_PROFILE set,
+        "call.<method>".
+        """
+        with self.lock:
+            return {
+                "uptime": time.time() - self.started,
+                "counters": dict(self.counters),
+                "histograms": dict((name, histogram.snapshot()) for name, histogram in self.histograms.items()),
+            }
+
+
+class Timer(object):
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.time() - self.started)
+        return False
+
+
+def profile_methods(cls):
+    """
+    Wraps every public method of cls so each call is timed into "call.<method>".
+
+    The instance must have a "_metrics" attribute holding a Metrics.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not callable(method):
+            continue
+        setattr(cls, name, _profiled(name, method))
+    return cls
+
+
+def _profiled(name, method):
+    label = "call." + name
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.time()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics = getattr(self, "_metrics", None)
+            if metrics is not None:
+                seconds = time.time() - started
+                metrics.observe(label, seconds)
+                metrics.emit({"event": "call", "method": name, "seconds": seconds})
+    return wrapper
+
+
+def profiling_enabled():
+    return bool(os.environ.get(PROFILE_ENV))
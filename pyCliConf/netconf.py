@@ -0,0 +1,318 @@
+"""
+NETCONF framing helpers for the "cli xml-mode netconf" session.
+
+Junos terminates every message on the session with the NETCONF 1.0
+end-of-message marker "]]>]]>".  NetconfReader collects those messages
+incrementally from whatever the session hands back and RpcReply wraps
+each parsed <rpc-reply>.
+"""
+import xml.etree.ElementTree as ET
+
+DELIMITER = b"]]>]]>"
+READ_SIZE = 65536
+
+try:
+    string_types = (basestring,)
+except NameError:
+    string_types = (str, bytes)
+
+
+def local_name(tag):
+    """
+    Strip the "{namespace}" prefix ElementTree puts on tag names.
+    """
+    if tag[:1] == "{":
+        return tag.split("}", 1)[1]
+    return tag
+
+
+def to_text(data):
+    """
+    Return data as a native str, decoding bytes read from the session.
+    """
+    if isinstance(data, str):
+        return data
+    return data.decode("utf-8", "replace")
+
+
+def to_bytes(data):
+    """
+    Return data as bytes suitable for writing to the session.
+    """
+    if isinstance(data, bytes):
+        return data
+    return data.encode("utf-8")
+
+
+def parse_message(message):
+    """
+    Parse a single framed message into an ElementTree element.
+
+    Junos may put comments and an XML declaration in front of the first
+    element, so anything before the first real tag is dropped.
+
+    Returns None when the message is not well formed XML.
+    """
+    text = to_text(message).strip()
+    if text.startswith("<?xml"):
+        text = text[text.find("?>") + 2:].strip()
+    try:
+        return ET.fromstring(text)
+    except Exception:
+        return None
+
+
+class RpcReply(object):
+    """
+    A single NETCONF <rpc-reply> read back from the device.
+
+    Attributes:
+        :raw: Reply text as received, without the framing delimiter.
+        :xml: Parsed ElementTree element, or None if the reply could not be parsed.
+        :errors: List of <error-message> strings with severity "error".
+        :warnings: List of <error-message> strings with severity "warning".
+        :skipped: True when nothing was sent because the change was already applied (see CliConf state_file).
+    """
+    def __init__(self, raw, skipped=False):
+        self.raw = to_text(raw).strip()
+        self.xml = parse_message(raw)
+        self.errors = []
+        self.warnings = []
+        self.skipped = skipped
+
+        if self.xml is None:
+            return
+        for element in self.xml.iter():
+            if local_name(element.tag) != "rpc-error":
+                continue
+            severity = "error"
+            message = ""
+            for child in element:
+                name = local_name(child.tag)
+                if name == "error-severity":
+                    severity = (child.text or "error").strip()
+                elif name == "error-message":
+                    message = (child.text or "").strip()
+            if severity == "warning":
+                self.warnings.append(message)
+            else:
+                self.errors.append(message)
+
+    @property
+    def ok(self):
+        """
+        True when the reply parsed and carries no <rpc-error> of severity "error".
+        """
+        return self.xml is not None and not self.errors
+
+    @property
+    def message_id(self):
+        """
+        The message-id attribute the device echoed from the <rpc>, or None.
+        """
+        if self.xml is None:
+            return None
+        return self.xml.get("message-id")
+
+    def find(self, name):
+        """
+        Return the first element in the reply with the given local tag name.
+        """
+        if self.xml is None:
+            return None
+        for element in self.xml.iter():
+            if local_name(element.tag) == name:
+                return element
+        return None
+
+    def __repr__(self):
+        if self.skipped:
+            return "<RpcReply skipped>"
+        if self.ok:
+            return "<RpcReply ok>"
+        return "<RpcReply errors=%r>" % (self.errors or ["unparsable reply"])
+
+
+def error_reply(message):
+    """
+    Returns a failed RpcReply for an error found on this side, before or instead of a device reply.
+    """
+    # Escaped by hand: xml.sax.saxutils imports urllib and with it ssl, which every script would pay for.
+    message = message.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return RpcReply("<rpc-reply><rpc-error><error-severity>error</error-severity>"
+                    "<error-message>%s</error-message></rpc-error></rpc-reply>" % message)
+
+
+class NetconfReader(object):
+    """
+    Incremental reader for a "]]>]]>" framed NETCONF stream.
+
+    Args:
+        :read: callable taking a byte count and returning whatever data is available, or an empty string at end of stream. May be None when data is handed to feed() instead, as AsyncCliConf does.
+
+    The <hello> the device sends when the session starts is kept in
+    the "hello" attribute and never returned as a reply.
+    """
+    def __init__(self, read=None):
+        self._read = read
+        self._buffer = b""
+        self._start = 0
+        self.hello = None
+        self.bytes_read = 0
+        self._hello_checked = False
+        self.eof = False
+
+    def buffered(self):
+        """
+        Return True if data read from the session is waiting to be parsed.
+        """
+        return len(self._buffer) > 0
+
+    def feed(self, data):
+        """
+        Add data read from the session to the buffer.
+        """
+        self.bytes_read += len(data)
+        self._buffer += data
+
+    def next_message(self):
+        """
+        Return the next complete framed message already buffered, or None.
+        """
+        index = self._buffer.find(DELIMITER, self._start)
+        if index == -1:
+            # Only the tail can hold the start of a delimiter split across reads.
+            self._start = max(0, len(self._buffer) - len(DELIMITER) + 1)
+            return None
+        message = self._buffer[:index]
+        self._buffer = self._buffer[index + len(DELIMITER):]
+        self._start = 0
+        return message
+
+    def read_message(self):
+        """
+        Return the next complete framed message, or None at end of stream.
+        """
+        while True:
+            message = self.next_message()
+            if message is not None:
+                return message
+            data = self._read(READ_SIZE)
+            if not data:
+                return None
+            self.feed(data)
+
+    def read_hello(self):
+        """
+        Reads the <hello> if that has not happened yet, leaving any other message buffered.
+
+        Returns the hello RpcReply, or None if the device did not send one.
+        """
+        if self._hello_checked:
+            return self.hello
+        self._hello_checked = True
+        while self.hello is None:
+            message = self.read_message()
+            if message is None:
+                break
+            if message.strip() and self.reply(message) is not None:
+                # Not a hello; put it back for whoever is waiting for it.
+                self._buffer = message + DELIMITER + self._buffer
+                self._start = 0
+                break
+        return self.hello
+
+    def reply(self, message):
+        """
+        Return the RpcReply for a framed message, or None for blank messages and the <hello>.
+        """
+        if not message.strip():
+            return None
+        if self.hello is None and b"<hello" in message and b"<rpc-reply" not in message:
+            self.hello = RpcReply(message)
+            return None
+        return RpcReply(message)
+
+    def read_reply(self):
+        """
+        Return the next RpcReply, or None once the session has closed.
+        """
+        while True:
+            message = self.read_message()
+            if message is None:
+                return None
+            reply = self.reply(message)
+            if reply is not None:
+                return reply
+
+    def stream_message(self):
+        """
+        Yields the next framed message in pieces as they are read, without holding all of it in memory.
+        """
+        while True:
+            index = self._buffer.find(DELIMITER)
+            if index != -1:
+                piece = self._buffer[:index]
+                self._buffer = self._buffer[index + len(DELIMITER):]
+                self._start = 0
+                if piece:
+                    yield piece
+                return
+            # Hold back what could be the start of a delimiter split across reads.
+            keep = len(DELIMITER) - 1
+            if len(self._buffer) > keep:
+                piece = self._buffer[:-keep]
+                self._buffer = self._buffer[-keep:]
+                self._start = 0
+                yield piece
+            data = self._read(READ_SIZE)
+            if not data:
+                self.eof = True
+                return
+            self.feed(data)
+
+
+class MessageStream(object):
+    """
+    File-like view of the next non-blank message on a NetconfReader, for incremental parsers such as ElementTree.iterparse().
+
+    Leading whitespace is dropped, so an XML declaration can start the stream.
+    """
+    def __init__(self, reader):
+        self.reader = reader
+        self._pieces = None
+        self._pending = b""
+        self._started = False
+        self._done = False
+
+    def read(self, size=-1):
+        while not self._pending and not self._done:
+            if self._pieces is None:
+                self._pieces = self.reader.stream_message()
+            try:
+                piece = next(self._pieces)
+            except StopIteration:
+                if self._started or self.reader.eof:
+                    self._done = True
+                else:
+                    # A blank message: move on to the next one.
+                    self._pieces = None
+                continue
+            if not self._started:
+                piece = piece.lstrip()
+                if not piece:
+                    continue
+                self._started = True
+            self._pending = piece
+        if size is None or size < 0 or size >= len(self._pending):
+            data, self._pending = self._pending, b""
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def drain(self):
+        """
+        Discards the rest of the message, so the session stays in step after a parse error.
+        """
+        while self.read(READ_SIZE):
+            pass
@@ -0,0 +1,236 @@
+"""
+Resumable, checksum-verified local cache for Junos packages.
+
+A 500MB jinstall image over a thin out-of-band link should only ever be
+transferred once. PackageCache downloads images into a private per-user
+directory under /var/tmp (see pyCliConf.cachedir) with
+ranged (HTTP) or restarted (FTP) transfers, so an interrupted download
+picks up where it stopped, verifies them against a SHA-256 or MD5
+checksum and keys the cache on that checksum, so a verified copy is
+reused instead of downloaded again. A cached copy is hashed again every
+time it is used with a checksum.
+
+Used by CliConf.install_package() when a checksum or cache=True is given.
+"""
+import base64
+import hashlib
+import os
+import time
+
+try:
+    from urlparse import urlsplit, urlunsplit
+except ImportError:
+    from urllib.parse import urlsplit, urlunsplit
+
+from .cachedir import cache_directory, private_directory
+from .exceptions import CacheDirectoryError, PackageError
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path, algorithm):
+    """
+    Returns the hex digest of a file, reading it in 1MB chunks.
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as package:
+        for chunk in iter(lambda: package.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PackageCache(object):
+    """
+    Content-addressed package cache.
+
+    Files live in "<directory>/<checksum>/<filename>", with partial
+    downloads kept as "<filename>.part" until they complete and verify.
+
+    Args:
+        :directory: cache location, created with mode 0700 and refused unless this user owns it and nobody else can write to it. Defaults to "/var/tmp/pycliconf-packages-<uid>".
+        :retries: download attempts before giving up. Each attempt resumes the previous one. Defaults to 3.
+        :timeout: socket timeout in seconds for each attempt. Defaults to 60.
+
+    Example:
+
+    .. code-block:: python
+
+        from pyCliConf.packagecache import PackageCache
+
+        path = PackageCache().fetch("http://172.32.32.254/jinstall-X.Y.tgz", sha256="9f86d0...")
+    """
+    def __init__(self, directory=None, retries=3, timeout=60):
+        self.directory = directory or cache_directory("packages")
+        self.retries = retries
+        self.timeout = timeout
+
+    def path(self, url, sha256=None, md5=None):
+        """
+        Returns where the cached copy of url lives, whether or not it exists yet.
+        """
+        if sha256:
+            key = "sha256-" + sha256.lower()
+        elif md5:
+            key = "md5-" + md5.lower()
+        else:
+            key = "url-" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+        filename = os.path.basename(urlsplit(url).path) or "package"
+        return os.path.join(self.directory, key, filename)
+
+    def fetch(self, url, sha256=None, md5=None):
+        """
+        Returns a local path holding a verified copy of url, downloading only what is missing.
+
+        Local paths are returned as they are, after verifying them if a
+        checksum was given.
+
+        Raises PackageError if the download fails, the checksum does not
+        match or the cache directory can not be trusted.
+        """
+        if not urlsplit(url).scheme:
+            if (sha256 or md5) and not self.verify(url, sha256, md5):
+                raise PackageError("Package checksum mismatch: %s" % url)
+            return url
+
+        try:
+            private_directory(self.directory)
+        except (CacheDirectoryError, OSError) as err:
+            raise PackageError("Package cache unusable: %s" % err)
+        path = self.path(url, sha256, md5)
+        if os.path.exists(path) and self.verified(path, sha256, md5):
+            return path
+
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        partial = path + ".part"
+
+        error = None
+        for attempt in range(self.retries):
+            try:
+                self.download(url, partial)
+                break
+            except Exception as err:
+                error = err
+                time.sleep(min(2 ** attempt, 30))
+        else:
+            raise PackageError("Package download failed after %d attempts: %s: %r" % (self.retries, url, error))
+
+        if (sha256 or md5) and not self.verify(partial, sha256, md5):
+            os.remove(partial)
+            raise PackageError("Package checksum mismatch: %s" % url)
+        os.rename(partial, path)
+        self.mark_verified(path)
+        return path
+
+    def download(self, url, partial):
+        """
+        Downloads url into partial, continuing from its current size.
+        """
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        parts = urlsplit(url)
+        if parts.scheme in ("http", "https"):
+            self.download_http(parts, partial, offset)
+        elif parts.scheme == "ftp":
+            self.download_ftp(parts, partial, offset)
+        else:
+            raise PackageError("Unsupported package URL scheme: %s" % url)
+
+    def download_http(self, parts, partial, offset):
+        # Imported here: urllib2 pulls in httplib and ssl, which only a download needs.
+        try:
+            from urllib2 import HTTPError, Request, urlopen
+        except ImportError:
+            from urllib.error import HTTPError
+            from urllib.request import Request, urlopen
+
+        netloc = parts.hostname + (":%d" % parts.port if parts.port else "")
+        request = Request(urlunsplit((parts.scheme, netloc, parts.path, parts.query, "")))
+        if parts.username:
+            credentials = "%s:%s" % (parts.username, parts.password or "")
+            request.add_header("Authorization", "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii"))
+        if offset:
+            request.add_header("Range", "bytes=%d-" % offset)
+
+        try:
+            response = urlopen(request, timeout=self.timeout)
+        except HTTPError as err:
+            if err.code == 416 and offset:
+                # Range not satisfiable: the partial file is already complete.
+                return
+            raise
+
+        # A server that ignores Range sends the whole file again.
+        resumed = offset and response.getcode() == 206
+        length = response.info().get("Content-Length")
+        try:
+            with open(partial, "ab" if resumed else "wb") as package:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    package.write(chunk)
+        finally:
+            response.close()
+
+        if length is not None:
+            expected = int(length) + (offset if resumed else 0)
+            if os.path.getsize(partial) < expected:
+                raise PackageError("Package download incomplete: %d of %d bytes" % (os.path.getsize(partial), expected))
+
+    def download_ftp(self, parts, partial, offset):
+        import ftplib
+
+        ftp = ftplib.FTP(timeout=self.timeout)
+        try:
+            ftp.connect(parts.hostname, parts.port or 21)
+            ftp.login(parts.username or "anonymous", parts.password or "")
+            ftp.voidcmd("TYPE I")
+            try:
+                size = ftp.size(parts.path)
+            except ftplib.Error:
+                size = None
+            if size is not None and offset >= size:
+                return
+            with open(partial, "ab" if offset else "wb") as package:
+                ftp.retrbinary("RETR " + parts.path, package.write, CHUNK_SIZE, rest=offset or None)
+        finally:
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+
+    def verify(self, path, sha256=None, md5=None):
+        """
+        Returns True when path matches the given checksum.
+        """
+        if sha256:
+            return file_digest(path, "sha256") == sha256.lower()
+        if md5:
+            return file_digest(path, "md5") == md5.lower()
+        return True
+
+    def verified(self, path, sha256=None, md5=None):
+        """
+        Returns True if path can be used.
+
+        With a checksum the file is always hashed. Without one, a copy
+        that is unchanged since it was downloaded is accepted.
+        """
+        if sha256 or md5:
+            return self.verify(path, sha256, md5)
+        marker = path + ".verified"
+        stat = os.stat(path)
+        stamp = "%d %d" % (stat.st_size, int(stat.st_mtime))
+        try:
+            with open(marker) as handle:
+                if handle.read().strip() == stamp:
+                    return True
+        except (IOError, OSError):
+            pass
+        if self.verify(path, sha256, md5):
+            self.mark_verified(path)
+            return True
+        return False
+
+    def mark_verified(self, path):
+        stat = os.stat(path)
+        with open(path + ".verified", "w") as handle:
+            handle.write("%d %d\n" % (stat.st_size, int(stat.st_mtime)))
@@ -0,0 +1,263 @@
+"""
+Resumable, named ZTP stages with on-disk checkpoints.
+
+Junos re-runs the ZTP script from the top after every reboot, so a
+script that upgrades with install_package(reboot=True) repeats every
+load, commit and download before it. A Pipeline runs named stages in
+order and checkpoints each completed stage atomically to persistent
+storage; the next run resumes at the first stage that has not completed.
+The whole run, across reboots, is bounded by a deadline.
+
+.. code-block:: python
+
+    from pyCliConf.pipeline import Pipeline
+
+    pipe = Pipeline(checkpoint="/var/root/ztp-pipeline.json", deadline=3600)
+
+    @pipe.stage("base-config")
+    def base_config(dev):
+        dev.load_config(cfg_string=BASE_CONFIG, action="set")
+        return dev.commit()
+
+    @pipe.stage("upgrade", reboots=True)
+    def upgrade(dev):
+        return dev.ensure_version("14.1X53-D15.2", JUNOS_INSTALL)
+
+    @pipe.stage("final-config")
+    def final_config(dev):
+        dev.load_config(cfg_string=FINAL_CONFIG, action="set")
+        return dev.commit()
+
+    result = pipe.run()
+"""
+import json
+import os
+import threading
+import time
+
+CHECKPOINT_FILE = "/var/root/pycliconf-pipeline.json"
+
+
+class Stage(object):
+    """
+    A named step of a Pipeline.
+
+    Attributes:
+        :name: unique stage name, the checkpoint key.
+        :func: callable taking the CliConf. Returning None, False or a failed RpcReply, or raising, fails the stage.
+        :reboots: the stage may reboot the device, so it is checkpointed as complete before it runs. The pipeline stops after it unless it returned a skipped reply (eg ensure_version() found the version already running).
+        :done: optional callable taking the CliConf and returning True when the stage's work is already in place, so it can be skipped.
+    """
+    def __init__(self, name, func, reboots=False, done=None):
+        self.name = name
+        self.func = func
+        self.reboots = reboots
+        self.done = done
+
+
+class PipelineResult(object):
+    """
+    Outcome of Pipeline.run().
+
+    Attributes:
+        :completed: names of stages completed in this run.
+        :skipped: names of stages already complete from an earlier run, or whose done check passed.
+        :failed: name of the stage that failed, or None.
+        :error: why it failed, or None.
+        :rebooting: True when the run stopped after a stage that reboots the device.
+        :seconds: wall time of this run.
+    """
+    def __init__(self):
+        self.completed = []
+        self.skipped = []
+        self.failed = None
+        self.error = None
+        self.rebooting = False
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return self.failed is None
+
+    def __repr__(self):
+        if self.failed:
+            return "<PipelineResult failed at %s: %s>" % (self.failed, self.error)
+        return "<PipelineResult %d completed, %d skipped%s>" % (
+            len(self.completed), len(self.skipped), ", rebooting" if self.rebooting else "")
+
+
+class Pipeline(object):
+    """
+    Runs named stages on one CliConf, resuming after reboots.
+
+    Args:
+        :checkpoint: checkpoint file on storage that survives reboots. Defaults to "/var/root/pycliconf-pipeline.json".
+        :deadline: seconds the whole pipeline may take, counted from its first run and across reboots. Defaults to None (no limit).
+        :cliconf_args: keyword arguments for the CliConf the stages run on (logfile, transport, ...).
+    """
+    def __init__(self, checkpoint=CHECKPOINT_FILE, deadline=None, **cliconf_args):
+        self.checkpoint = checkpoint
+        self.deadline = deadline
+        self.cliconf_args = cliconf_args
+        self.stages = []
+
+    def add(self, name, func, reboots=False, done=None):
+        """
+        Appends a stage. Stage names must be unique.
+        """
+        if name in [stage.name for stage in self.stages]:
+            raise ValueError("Duplicate pipeline stage name: %r" % name)
+        self.stages.append(Stage(name, func, reboots=reboots, done=done))
+        return func
+
+    def stage(self, name, reboots=False, done=None):
+        """
+        Decorator form of add().
+        """
+        def register(func):
+            return self.add(name, func, reboots=reboots, done=done)
+        return register
+
+    def load(self):
+        """
+        Returns the checkpoint state: {"started": first run time, "completed": {stage: time}, "attempts": {stage: count}}.
+        """
+        try:
+            with open(self.checkpoint) as handle:
+                state = json.load(handle)
+        except (IOError, OSError, ValueError):
+            state = {}
+        state.setdefault("started", time.time())
+        state.setdefault("completed", {})
+        state.setdefault("attempts", {})
+        return state
+
+    def save(self, state):
+        """
+        Writes the checkpoint atomically: to a temporary file, synced to disk, then renamed over the old one.
+        """
+        directory = os.path.dirname(self.checkpoint)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        partial = self.checkpoint + ".tmp"
+        with open(partial, "w") as handle:
+            json.dump(state, handle, indent=1, sort_keys=True)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.rename(partial, self.checkpoint)
+
+    def reset(self):
+        """
+        Deletes the checkpoint so the next run starts from the first stage.
+        """
+        try:
+            os.remove(self.checkpoint)
+        except OSError:
+            pass
+
+    def run(self, dev=None):
+        """
+        Runs every stage not yet completed, in order.
+
+        Args:
+            :dev: CliConf to run the stages on. Defaults to a new one built from cliconf_args, opened only if a stage needs to run and closed afterwards.
+
+        Returns a PipelineResult.
+        """
+        from .pyCliConf import CliConf
+
+        started = time.time()
+        result = PipelineResult()
+        state = self.load()
+        self.save(state)
+
+        own_dev = False
+        timer = None
+        expired = []
+        try:
+            for stage in self.stages:
+                if stage.name in state["completed"]:
+                    result.skipped.append(stage.name)
+                    continue
+
+                remaining = None
+                if self.deadline is not None:
+                    remaining = self.deadline - (time.time() - state["started"])
+                    if remaining <= 0:
+                        result.failed = stage.name
+                        result.error = "pipeline deadline of %ss exceeded" % self.deadline
+                        break
+
+                if dev is None:
+                    dev = CliConf(**self.cliconf_args)
+                    own_dev = True
+                if remaining is not None and timer is None:
+                    def expire(session=dev.session):
+                        expired.append(True)
+                        session.abort()
+                    timer = threading.Timer(remaining, expire)
+                    timer.daemon = True
+                    timer.start()
+
+                if stage.done is not None and self._call(stage.done, dev):
+                    dev.log("Pipeline: stage %s already in place, skipping" % stage.name)
+                    state["completed"][stage.name] = time.time()
+                    self.save(state)
+                    result.skipped.append(stage.name)
+                    continue
+
+                state["attempts"][stage.name] = state["attempts"].get(stage.name, 0) + 1
+                if stage.reboots:
+                    # The reboot may kill this process before the stage returns.
+                    state["completed"][stage.name] = time.time()
+                self.save(state)
+
+                dev.log("Pipeline: running stage %s (attempt %d)" % (stage.name, state["attempts"][stage.name]))
+                stage_started = time.time()
+                try:
+                    outcome = stage.func(dev)
+                    error = None if self._succeeded(outcome) else "stage returned %r" % (outcome,)
+                except Exception as err:
+                    error = "%r" % err
+                if expired:
+                    error = "pipeline deadline of %ss exceeded" % self.deadline
+
+                if error is not None:
+                    state["completed"].pop(stage.name, None)
+                    self.save(state)
+                    dev.log("Pipeline: stage %s failed: %s" % (stage.name, error), level="error")
+                    result.failed = stage.name
+                    result.error = error
+                    break
+
+                dev.log("Pipeline: stage %s completed in %.1fs" % (stage.name, time.time() - stage_started))
+                state["completed"][stage.name] = time.time()
+                self.save(state)
+                result.completed.append(stage.name)
+                if stage.reboots and getattr(outcome, "skipped", False):
+                    dev.log("Pipeline: stage %s had nothing to do, no reboot, continuing" % stage.name)
+                elif stage.reboots:
+                    dev.log("Pipeline: stage %s reboots the device, stopping here" % stage.name)
+                    result.rebooting = True
+                    break
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if own_dev and dev is not None:
+                dev.close()
+            result.seconds = time.time() - started
+        return result
+
+    def _call(self, check, dev):
+        try:
+            return bool(check(dev))
+        except Exception as err:
+            dev.log("Pipeline: done check failed: %r" % err, level="error")
+            return False
+
+    def _succeeded(self, outcome):
+        if outcome is None or outcome is False:
+            return False
+        if hasattr(outcome, "ok"):
+            return bool(outcome.ok)
+        return True
@@ -0,0 +1,144 @@
+"""
+A small pool of NETCONF sessions to one device.
+
+A CliConf session answers one RPC at a time, so fact gathering or an
+operational query issued during a long commit waits for the commit to
+finish. SessionPool keeps one configuration session, which every load,
+commit, install and reboot goes through, plus up to size - 1 extra
+"cli xml-mode netconf" sessions that run read-only RPCs (<get-...>) in
+parallel, opened as they are first needed.
+
+.. code-block:: python
+
+    import threading
+    from pyCliConf.pool import SessionPool
+
+    with SessionPool(size=3) as pool:
+        commit = threading.Thread(target=lambda: (pool.config.load_config(cfg_string=config), pool.config.commit()))
+        commit.start()
+        facts = pool.facts()
+        interfaces = pool.rpc("<rpc><get-interface-information><terse/></get-interface-information></rpc>]]>]]>")
+        commit.join()
+"""
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from .metrics import rpc_name
+from .netconf import string_types, to_text
+from .pyCliConf import RPC_TIMEOUT, CliConf
+from .transport import CliTransport
+
+
+def read_only(rpc):
+    """
+    Returns True for RPCs that only read from the device (<get-...>).
+    """
+    if not isinstance(rpc, string_types):
+        return False
+    if isinstance(rpc, bytes):
+        rpc = to_text(rpc)
+    return rpc_name(rpc).startswith("get")
+
+
+class SessionPool(object):
+    """
+    One configuration session plus a pool of read-only sessions.
+
+    Args:
+        :size: total number of sessions, including the configuration session. Defaults to 3.
+        :transport: callable returning a new Transport for each session. Defaults to CliTransport.
+        :logfile: logfile shared by every session. Defaults to "/var/root/ztp-log.txt".
+        :cliconf_args: further keyword arguments for the configuration session's CliConf (state_file, trace_file, ...). Debug and rpc_timeout also apply to the read-only sessions.
+
+    Attributes:
+        :config: the CliConf configuration RPCs are pinned to.
+    """
+    def __init__(self, size=3, transport=None, logfile="/var/root/ztp-log.txt", **cliconf_args):
+        self.size = max(1, size)
+        self.transport = transport or CliTransport
+        self.logfile = logfile
+        self.debug = cliconf_args.get("Debug", False)
+        self.rpc_timeout = cliconf_args.get("rpc_timeout", RPC_TIMEOUT)
+        self.config = CliConf(logfile=logfile, transport=self.transport(), **cliconf_args)
+        self.sessions = []
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def acquire(self):
+        """
+        Returns an idle read-only session, opening a new one while the pool has room, or waiting for one.
+
+        Falls back to the configuration session for a pool of size 1.
+        """
+        if self.size == 1:
+            return self.config
+        try:
+            return self.idle.get(False)
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.sessions) < self.size - 1:
+                dev = CliConf(logfile=self.logfile, Debug=self.debug, transport=self.transport(), rpc_timeout=self.rpc_timeout)
+                self.sessions.append(dev)
+                return dev
+        return self.idle.get()
+
+    def close(self):
+        """
+        Closes every session.
+        """
+        with self.lock:
+            sessions, self.sessions = self.sessions, []
+        for dev in sessions:
+            dev.close()
+        self.config.close()
+
+    def facts(self, refresh=False):
+        """
+        Returns CliConf.facts() gathered on a read-only session.
+        """
+        dev = self.acquire()
+        try:
+            return dev.facts(refresh=refresh)
+        finally:
+            self.release(dev)
+
+    def get_config(self, filter=None, database="committed"):
+        """
+        Returns CliConf.get_config() run on a read-only session.
+        """
+        dev = self.acquire()
+        try:
+            return dev.get_config(filter=filter, database=database)
+        finally:
+            self.release(dev)
+
+    def release(self, dev):
+        """
+        Returns a session taken with acquire() to the pool.
+        """
+        if dev is not self.config:
+            self.idle.put(dev)
+
+    def rpc(self, rpc, reply=True, timeout=None):
+        """
+        Sends an RPC: read-only ones on a pooled session, everything else on the configuration session.
+        """
+        if not read_only(rpc):
+            return self.config.rpc(rpc, reply=reply, timeout=timeout)
+        dev = self.acquire()
+        try:
+            return dev.rpc(rpc, reply=reply, timeout=timeout)
+        finally:
+            self.release(dev)
@@ -1,13 +1,34 @@
-import subprocess
+import hashlib
+import json
+import re
+import threading
+import time
+from io import BytesIO
 
-from datetime import datetime
+from .chunking import ChunkedLoad, ChunkSizer
+from .configtree import parse_config, subtree_filter
+from .diff import SetIndex, diff_set
+from .exceptions import RpcTimeoutError
+from .facts import FACT_RPCS, FactsCache, parse_chassis, parse_software
+from .fragments import FragmentCache, is_remote
+from .logwriter import FLUSH_INTERVAL, LogWriter, timestamp
+from .metrics import Metrics, profile_methods, profiling_enabled, rpc_name
+from .netconf import MessageStream, NetconfReader, RpcReply, error_reply, string_types, to_bytes, to_text
+from .packagecache import PackageCache
+from .state import AppliedState, payload_hash
+from .template import JINJA_SUPPORT, get_template_cache
+from .trace import TraceWriter
+from .transaction import Transaction
+from .transport import CliTransport
+from .validate import escape, validate as validate_config
+
+WRITE_SIZE = 65536
+# Long enough for a package add on a slow routing engine; a device silent for longer is not coming back.
+RPC_TIMEOUT = 1800
+SKIPPED_REPLY = "<rpc-reply><ok/></rpc-reply>"
+
+_rpc_open = re.compile(r"<rpc(?=[\s>/])")
 
-# Jijna2 is not supported until Junos 14.1X53, so catch exception on versions without this library.
-try:
-    from jinja2 import Template
-    JINJA_SUPPORT = True
-except:
-    JINJA_SUPPORT = False
 
 class CliConf():
     """
@@ -20,6 +41,18 @@ class CliConf():
     Args:
         :Debug: Ensure log() method prints output to stdout and logfile. Defaults to False, and all log() output only goes to logfile.
         :logfile: Destination logfile for log() method. Defaults to "/var/root/ztp-log.txt" as this is a persistant writable location during ZTP.
+        :log_flush_interval: Maximum seconds log() output is buffered in memory before a background thread writes it to logfile. Defaults to 1.0. Everything is written by close() and at interpreter exit.
+        :log_format: "text" for the classic "time: message" lines, or "json" for one JSON object per line (see log()). Defaults to "text".
+        :log_max_bytes: Rotate logfile to "<logfile>.1", "<logfile>.2", ... before it grows past this size. Defaults to None, never rotate.
+        :log_backups: Number of rotated logfiles kept. Defaults to 3.
+        :transport: Transport carrying the NETCONF session (see pyCliConf.transport). Defaults to CliTransport, which runs "cli xml-mode netconf" on the device.
+        :template_path: Directory, or list of directories, searched by Jinja2 {% include %} / {% import %} in load_config_template(). Defaults to none.
+        :metrics_file: File that receives one JSON line per RPC with its type, latency and byte counts (see metrics()). Defaults to None, no export.
+        :facts_file: File caching facts() for the rest of the ZTP run (eg "/var/root/pycliconf-facts.json"). Defaults to None, facts are only kept for the session.
+        :trace_file: File receiving every RPC request and reply with its timing, one JSON line each, for pyCliConf.trace replay. Compressed when the name ends in ".gz". Defaults to None, no trace.
+        :state_file: File recording a hash of every configuration committed through load_config() (eg "/var/root/pycliconf-state.json"). When set, a re-run that loads the same payloads skips the load and the commit. Defaults to None, always load and commit.
+        :fragment_cache: FragmentCache used by load_config(fetch=...) and prefetch() (see pyCliConf.fragments). Defaults to one caching under "/var/tmp/pycliconf-fragments-<uid>".
+        :rpc_timeout: Seconds to wait for each RPC reply before logging an error and giving up on it, or None to wait forever. Defaults to 1800.
 
     Examples:
 
@@ -34,17 +67,68 @@ class CliConf():
         dev.commit()
         dev.close()
 
+    Skipping configuration that an earlier run already committed:
+
+    .. code-block:: python
+
+        dev = CliConf(state_file="/var/root/pycliconf-state.json")
+        dev.load_config(cfg_string=config, action="merge")
+        dev.commit()
+        dev.close()
+
+    Sharing one CliConf between threads is safe: every RPC is tagged with
+    a message-id and its reply is handed to the thread that sent it. The
+    device still answers one RPC at a time; see pyCliConf.pool for running
+    read-only RPCs on extra sessions.
+
     NOTE: When committing configuration with this script, please ensure that "chassis auto-image-upgrade" is in the configuration, otherwise "Auto Image Upgrade" process will exit and mark the script as a failure.
     """
-    def __init__(self, logfile="/var/root/ztp-log.txt", Debug=False):
-        self.session = " "
-        self.logfile = open(logfile, "a", 0)
+    def __init__(self, logfile="/var/root/ztp-log.txt", Debug=False, transport=None, template_path=None, log_flush_interval=FLUSH_INTERVAL, metrics_file=None, state_file=None, facts_file=None, trace_file=None, fragment_cache=None, log_format="text", log_max_bytes=None, log_backups=3, rpc_timeout=RPC_TIMEOUT):
+        self.session = transport or CliTransport()
+        self.logfile = LogWriter(logfile, flush_interval=log_flush_interval, max_bytes=log_max_bytes, backups=log_backups)
+        self.log_format = log_format
+        self._metrics = Metrics(export=LogWriter(metrics_file, flush_interval=log_flush_interval) if metrics_file else None)
         self.debug = Debug
+        self.template_path = template_path
+        self._templates = None
+        self.reader = NetconfReader(self._read)
+        self._write_lock = threading.Lock()
+        self._replies = threading.Condition()
+        self._message_id = 0
+        self._outstanding = []
+        self._received = {}
+        self._discard = set()
+        self._streamed = set()
+        self._reading = False
+        self._deadline = None
+        self.rpc_timeout = rpc_timeout
+        self._state = AppliedState(state_file) if state_file else None
+        self._facts_cache = FactsCache(facts_file) if facts_file else None
+        self._facts = None
+        self._trace = TraceWriter(trace_file) if trace_file else None
+        self.fragments = fragment_cache or FragmentCache()
+        self._applied = []
+        self._reset_candidate()
 
         try:
-            self.session = subprocess.Popen(['/usr/sbin/cli', 'xml-mode', 'netconf'], stdin=subprocess.PIPE, stdout=self.logfile, stderr=self.logfile)
+            self.session.open(stderr=self.logfile.file)
         except Exception as err:
-            print "RPC Session Error: %r \n\t Are you on Junos?\n" % err
+            print("RPC Session Error: %r \n\t Are you on Junos?\n" % err)
+
+    def check_reply(self, reply, errmsg):
+        """
+        Logs any errors or warnings carried by an RpcReply.
+
+        Returns True if the reply indicates success.
+        """
+        if reply is None:
+            return False
+        for warning in reply.warnings:
+            self.log("%s (warning): %s" % (errmsg, warning), level="warning")
+        if not reply.ok:
+            self.log("%s: %r" % (errmsg, reply.errors or reply.raw), level="error")
+            return False
+        return True
 
     def close(self):
         """
@@ -60,17 +144,31 @@ class CliConf():
             self.rpc(rpc_close)
         except Exception as err:
             errmsg = "RPC Close Error: %r" % err
-            self.log(errmsg)
+            self.log(errmsg, level="error")
+        try:
+            self.session.close()
+        except Exception as err:
+            errmsg = "RPC Session Close Error: %r" % err
+            self.log(errmsg, level="error")
         try:
+            self.fragments.close()
+            if self._trace is not None:
+                self._trace.close()
+            if self._metrics.export is not None:
+                self._metrics.export.close()
             self.logfile.close()
         except Exception as err:
             errmsg = "Error closing logfile: %r" % err
-            self.log(errmsg)
+            self.log(errmsg, level="error")
 
-    def commit(self):
+    def commit(self, force=False):
         """
         Commit current candidate configuration
 
+        With a state_file, the commit is skipped when every load since the
+        last commit was skipped as already applied; the returned RpcReply
+        then has skipped set to True. force=True always commits.
+
         NOTE: When committing configuration with this script, please ensure that "chassis auto-image-upgrade" is in the configuration, otherwise "Auto Image Upgrade" process will exit and mark the script as a failure.
         """
         rpc_commit = """
@@ -79,13 +177,208 @@ class CliConf():
         </rpc>
         ]]>]]>
         """
+        if self._state is not None and not force and self._skipped and not self._changed:
+            self.log("RPC Commit skipped: configuration already committed")
+            self._reset_candidate()
+            return RpcReply(SKIPPED_REPLY, skipped=True)
+
         try:
-            self.rpc(rpc_commit)
+            reply = self.rpc(rpc_commit)
         except Exception as err:
             errmsg = "RPC Commit Error: %r" % err
-            self.log(errmsg)
+            self.log(errmsg, level="error")
+            return None
+        if self.check_reply(reply, "RPC Commit Error"):
+            self._record_commit()
+        return reply
+
+    def discard_changes(self):
+        """
+        Discard uncommitted changes, resetting the candidate configuration to the running configuration.
+        """
+        rpc_discard = """
+        <rpc>
+            <discard-changes/>
+        </rpc>
+        ]]>]]>
+        """
+        try:
+            reply = self.rpc(rpc_discard)
+        except Exception as err:
+            errmsg = "RPC Discard Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+        self.check_reply(reply, "RPC Discard Error")
+        self._reset_candidate()
+        return reply
 
-    def install_package(self, url, no_copy=True, no_validate=True, unlink = True, reboot=False):
+    def ensure_version(self, target, url, reboot=True, **kwargs):
+        """
+        Installs a Junos package only if the device is not already running the target version.
+
+        The running version comes from facts(), so with a facts_file it is
+        read from the device once per ZTP run. When it already matches
+        nothing is installed and the device is not rebooted.
+
+        Args:
+            :target: Junos version the package installs (eg "14.1X53-D15.2")
+            :url: package location, as for install_package()
+            :reboot: reboot after installing. Defaults to True.
+            :kwargs: any other install_package() argument (sha256, md5, cache, no_copy, ...)
+
+        Returns an RpcReply with skipped set to True when the version
+        already matches, otherwise the install_package() reply. Returns
+        None if the version could not be read.
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf(facts_file="/var/root/pycliconf-facts.json")
+            dev.ensure_version("14.1X53-D15.2", "http://172.32.32.254/jinstall-qfx-5-flex-14.1X53-D15.2-domestic-signed.tgz")
+            dev.close()
+        """
+        facts = self.facts()
+        if facts is None or not facts.get("version"):
+            self.log("Ensure Version Error: could not read the running Junos version", level="error")
+            return None
+        if facts["version"] == target:
+            self.log("Ensure Version: already running %s, not installing %s" % (target, url))
+            return RpcReply(SKIPPED_REPLY, skipped=True)
+        self.log("Ensure Version: running %s, installing %s" % (facts["version"], target))
+        return self.install_package(url, reboot=reboot, **kwargs)
+
+    def facts(self, refresh=False):
+        """
+        Returns facts about the device as a dict:
+
+            - "hostname", "model", "version" from <get-software-information>
+            - "serial", "chassis" from <get-chassis-inventory>
+
+        The RPCs are sent once, pipelined, and the result is kept for the
+        session and in facts_file, if one was given. install_package() and
+        reboot() forget it before they send anything, since the session
+        usually dies with the reboot.
+
+        Args:
+            :refresh: ask the device again instead of using a cached copy. Defaults to False.
+
+        Returns None if the facts could not be read.
+        """
+        if self._facts is not None and not refresh:
+            return self._facts
+        if self._facts_cache is not None and not refresh:
+            self._facts = self._facts_cache.load()
+            if self._facts is not None:
+                return self._facts
+
+        software, chassis = self.rpc_pipeline(FACT_RPCS)
+        if not self.check_reply(software, "RPC Facts Error"):
+            return None
+        self.check_reply(chassis, "RPC Facts Error")
+        facts = parse_software(software)
+        facts.update(parse_chassis(chassis))
+        self._facts = facts
+        if self._facts_cache is not None:
+            try:
+                self._facts_cache.save(facts)
+            except Exception as err:
+                errmsg = "Facts File Error: %r" % err
+                self.log(errmsg, level="error")
+        return facts
+
+    def get_config(self, filter=None, database="committed"):
+        """
+        Fetches the device configuration as a ConfigTree (see pyCliConf.configtree).
+
+        The reply is parsed incrementally as it is read from the session
+        and never held in memory whole, so even a very large configuration
+        can be queried on a routing engine with little memory.
+
+        Args:
+            :filter: path selecting part of the configuration (eg "interfaces/interface[ge-0/0/0]"), or an XML <configuration> subtree filter. Defaults to None, the whole configuration.
+            :database: "committed" (the running configuration) or "candidate". Defaults to "committed".
+
+        Returns a ConfigTree, or None if the configuration could not be read.
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf()
+            config = dev.get_config(filter="interfaces")
+            for interface in config.findall("interfaces/interface[*]"):
+                dev.log("%s: %s" % (interface.key, config.value("interfaces/interface[%s]/description" % interface.key)))
+            dev.close()
+        """
+        if filter and not filter.lstrip().startswith("<"):
+            filter = subtree_filter(filter)
+        rpc_get_config = """
+        <rpc>
+            <get-configuration database="%s">%s</get-configuration>
+        </rpc>
+        ]]>]]>
+        """ % (database, filter or "")
+
+        if self._trace is not None:
+            # A trace needs the reply text, so read it whole.
+            reply = self.rpc(rpc_get_config)
+            if reply is None:
+                return None
+            tree = parse_config(BytesIO(to_bytes(reply.raw)))
+        else:
+            started = time.time()
+            submitted = self._submit(rpc_get_config, streamed=True)
+            if submitted is None:
+                return None
+            message_id, name, written, digest = submitted
+            tree, bytes_read = self._wait(message_id, self._stream_config, timeout=self.rpc_timeout)
+            seconds = time.time() - started
+            self._metrics.record_rpc(name, seconds, written, bytes_read, tree is not None and tree.ok)
+            if self.log_format == "json":
+                self._log_rpc(message_id, name, started, seconds, written, digest, bytes_read, tree, rpc_get_config)
+            if tree is None:
+                return None
+            if self.log_format != "json":
+                self.log("RPC Reply from host: configuration of %d nodes (%d bytes streamed)" % (tree.nodes, bytes_read))
+
+        if not tree.ok:
+            self.log("RPC Get Configuration Error: %r" % tree.errors, level="error")
+            return None
+        return tree
+
+    def get_config_set(self, database="committed"):
+        """
+        Fetches the device configuration as "set" lines.
+
+        Args:
+            :database: "committed" (the running configuration) or "candidate". Defaults to "committed".
+
+        Returns a list of set lines, or None if the configuration could not be read.
+        """
+        rpc_get_config = """
+        <rpc>
+            <get-configuration format="set" database="%s"/>
+        </rpc>
+        ]]>]]>
+        """ % database
+        try:
+            reply = self.rpc(rpc_get_config)
+        except Exception as err:
+            errmsg = "RPC Get Configuration Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+        if not self.check_reply(reply, "RPC Get Configuration Error"):
+            return None
+        element = reply.find("configuration-set")
+        if element is None:
+            self.log("RPC Get Configuration Error: no <configuration-set> in reply", level="error")
+            return None
+        return (element.text or "").splitlines()
+
+    def install_package(self, url, no_copy=True, no_validate=True, unlink = True, reboot=False, sha256=None, md5=None, cache=False):
         """
         Install Junos package onto the system.
 
@@ -104,6 +397,9 @@ class CliConf():
             :no_validate: Defaults to True
             :unlink: Defaults to True
             :reboot: Defaults to False
+            :sha256: Expected SHA-256 of the package. Implies cache=True.
+            :md5: Expected MD5 of the package. Implies cache=True.
+            :cache: Download the package into the local package cache (see pyCliConf.packagecache) before installing, resuming any earlier partial download. A verified cached copy is installed without downloading it again. Defaults to False, which hands the URL straight to Junos.
 
         Example:
 
@@ -113,48 +409,36 @@ class CliConf():
         dev = CliConf()
         dev.install_package("http://172.32.32.254/jinstall-X.Y.tgz", reboot=True)
         dev.close()
-        """
-        if no_copy:
-            rpc_package_nocopy = "<no-copy/>"
-        else:
-            rpc_package_nocopy = ""
-        if no_validate:
-            rpc_package_novalidate = "<no-validate/>"
-        else:
-            rpc_package_novalidate = ""
-        if unlink:
-            rpc_package_unlink = "<unlink/>"
-        else:
-            rpc_package_unlink = ""
-        if reboot:
-            rpc_package_reboot = "<reboot/>"
-        else:
-            rpc_package_reboot = ""
 
-        rpc_package = """
-            <rpc>
-               <request-package-add>
-                <package-name>
-                    %s
-                </package-name>
-                 %s
-                 %s
-                 %s
-                 %s
-               </request-package-add>
-            </rpc>
-            ]]>]]>
-        """ % (url, rpc_package_nocopy, rpc_package_novalidate, rpc_package_unlink, rpc_package_reboot)
+        Staging through the local cache with checksum verification:
 
-        rpc_send = rpc_package
+        .. code-block:: python
+        dev.install_package("http://172.32.32.254/jinstall-X.Y.tgz", sha256="9f86d0...", reboot=True)
+        """
+        if cache or sha256 or md5:
+            try:
+                self.log("Staging package %s in local cache" % url)
+                url = PackageCache().fetch(url, sha256=sha256, md5=md5)
+                self.log("Package staged at %s" % url)
+            except Exception as err:
+                errmsg = "Install Package Error: %r" % err
+                self.log(errmsg, level="error")
+                return None
 
+        rpc_send = self._package_rpc(url, no_copy, no_validate, unlink, reboot)
+
+        # Forget facts first: the session normally dies without a reply when the device reboots.
+        self._forget_facts()
         try:
-            self.rpc(rpc_send)
+            reply = self.rpc(rpc_send)
         except Exception as err:
             errmsg = "Install Package Error: %r" % err
-            self.log(errmsg)
+            self.log(errmsg, level="error")
+            return None
+        self.check_reply(reply, "Install Package Error")
+        return reply
 
-    def load_config(self, cfg_string=False, url=False, cfg_format="text", action="merge"):
+    def load_config(self, cfg_string=False, url=False, cfg_format="text", action="merge", force=False, validate=True, fetch=False):
         """
         Loads Junos configuration from a URL or file location
 
@@ -175,6 +459,19 @@ class CliConf():
                 - 'overide'
                 - 'replace'
                 - 'update'
+            :force: load even if a state_file says this payload was already committed. Defaults to False.
+            :validate: check a "set" or "text" cfg_string locally first (see pyCliConf.validate). Problems are logged and a payload with errors is not sent. Defaults to True.
+            :fetch: download an HTTP/FTP url in pyCliConf, through the fragment cache, instead of on the device:
+                - "inline" (or True): load the fragment as a cfg_string, so it is validated and skipped like one
+                - "path": hand Junos the cached file
+            Defaults to False, Junos fetches the url itself.
+
+        The cfg_string is XML escaped as it is embedded in the RPC, so
+        "set" and "text" configuration may contain &, < and >.
+
+        With a state_file, a cfg_string whose hash (with cfg_format and
+        action) was committed by the last run is not sent again; the
+        returned RpcReply has skipped set to True. URL loads are always sent.
 
         Examples:
 
@@ -194,80 +491,242 @@ class CliConf():
             url
         except Exception as err:
             errmsg = "Error: load_config needs either 'cfg_string' or 'url' defined: %r" % err
-            self.log(errmsg)
+            self.log(errmsg, level="error")
 
-        if action == "set" or cfg_format == "set":
-            action_string = ' action = "set" '
-            cfg_format = "text"
-        elif action in  ['merge', 'overide', 'replace', 'update']:
-            action_string = ' action = "%s" ' % action
-        else:
-            raise Exception("RPC Load Error - Unknown action type")
+        if fetch and is_remote(url):
+            try:
+                if fetch == "path":
+                    url = self.fragments.fetch_path(url)
+                else:
+                    cfg_string, url = self.fragments.fetch(url), False
+            except Exception as err:
+                errmsg = "RPC Load Error: %r" % err
+                self.log(errmsg, level="error")
+                return None
 
-        rpc_load_url = """
-        <rpc> 
-            <load-configuration url="%s"%sformat="%s" />
-        </rpc>
-        ]]>]]>
-        """ % (url, action_string, cfg_format)
+        rpc_send = self._load_rpc(cfg_string, url, cfg_format, action)
 
-        rpc_load_text_string = """
-           <rpc> 
-            <load-configuration%sformat="text">
-                <configuration-text>
-                    %s
-                </configuration-text>
-            </load-configuration>
-        </rpc>
-        ]]>]]>
-        """ % (action_string, cfg_string)
+        payload = None
+        if self._state is not None and cfg_string and not url:
+            payload = (payload_hash(cfg_string, cfg_format, action), cfg_format, action)
+            if not force and payload[0] in self._state:
+                self.log("RPC Load skipped: configuration %s already committed" % payload[0][:12])
+                self._applied.append(payload)
+                self._skipped += 1
+                return RpcReply(SKIPPED_REPLY, skipped=True)
 
-        rpc_load_set_string = """
-           <rpc> 
-            <load-configuration%sformat="text">
-                <configuration-set>
-                    %s
-                </configuration-set>
-            </load-configuration>
-        </rpc>
-        ]]>]]>
-        """ % (action_string, cfg_string)
+        if validate and cfg_string and not url and not self._validate(cfg_string, cfg_format, action):
+            return None
 
-        rpc_load_string = """
-           <rpc> 
-            <load-configuration%sformat="xml">
-                <configuration>
-                    %s
-                </configuration>
-            </load-configuration>
-        </rpc>
-        ]]>]]>
-        """ % (action_string, cfg_string)
+        try:
+            reply = self.rpc(rpc_send)
+        except Exception as err:
+            errmsg = "RPC Load Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+        if self.check_reply(reply, "RPC Load Error") and payload is not None:
+            self._loaded.append(payload)
+        return reply
 
-        if url:
-            rpc_send = rpc_load_url
-        elif action == "set" or cfg_format == "set":
-            rpc_send = rpc_load_set_string
-        elif cfg_format == "text":
-            rpc_send = rpc_load_text_string
-        elif cfg_format == "xml":
-            rpc_send = rpc_load_string
+    def load_config_chunked(self, cfg_string, commit=True, chunk_lines=1000, min_lines=100, max_lines=20000, target_seconds=1.0, progress=None, validate=True):
+        """
+        Loads a large "set" configuration as several loads into the same candidate, then commits once.
+
+        The size of each chunk adapts to how quickly the device answered
+        the previous one (see pyCliConf.chunking.ChunkSizer), so mgd never
+        has to take the whole configuration in one RPC. Progress is logged
+        after every chunk. If a chunk fails the candidate is discarded and
+        nothing is committed.
+
+        Args:
+            :cfg_string: "set" (and "delete") lines, as a string or list of lines
+            :commit: commit after the last chunk. Defaults to True.
+            :chunk_lines: lines in the first chunk. Defaults to 1000.
+            :min_lines: smallest chunk. Defaults to 100.
+            :max_lines: largest chunk. Defaults to 20000.
+            :target_seconds: load reply latency to aim for. Defaults to 1.0.
+            :progress: callable receiving the ChunkedLoad after every chunk, eg to report status elsewhere. Defaults to None.
+            :validate: check the whole configuration locally before sending anything. Defaults to True.
+
+        Returns a pyCliConf.chunking.ChunkedLoad, or None if the configuration failed validation.
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf()
+            result = dev.load_config_chunked(open("/var/tmp/fabric-set.cfg").read(), target_seconds=2)
+            dev.log("Loaded %d lines in %d chunks" % (result.sent, len(result.chunks)))
+            dev.close()
+        """
+        if isinstance(cfg_string, string_types):
+            cfg_string = cfg_string.splitlines()
+        lines = [line for line in cfg_string if line.strip() and not line.lstrip().startswith("#")]
+
+        if validate and not self._validate(lines, "set", "set"):
+            return None
+
+        started = time.time()
+        loaded = ChunkedLoad(len(lines))
+        sizer = ChunkSizer(chunk_lines, min_lines, max_lines, target_seconds)
+        while loaded.sent < loaded.lines:
+            chunk = lines[loaded.sent:loaded.sent + sizer.size]
+            chunk_started = time.time()
+            try:
+                reply = self.rpc(self._load_rpc("\n".join(chunk), False, "set", "set"))
+            except Exception as err:
+                errmsg = "RPC Load Error: %r" % err
+                self.log(errmsg, level="error")
+                reply = None
+            seconds = time.time() - chunk_started
+            loaded.replies.append(reply)
+            loaded.chunks.append((len(chunk), seconds))
+            if not self.check_reply(reply, "RPC Load Error"):
+                self.log("Chunked Load: chunk at line %d failed, discarding candidate" % (loaded.sent + 1), level="error")
+                self.discard_changes()
+                loaded.seconds = time.time() - started
+                return loaded
+
+            loaded.sent += len(chunk)
+            next_size = sizer.update(len(chunk), seconds)
+            self.log("Chunked Load: %d/%d lines (%.1f%%), %d lines in %.2fs, next chunk %d lines" % (
+                loaded.sent, loaded.lines, 100.0 * loaded.sent / loaded.lines, len(chunk), seconds, next_size))
+            if progress is not None:
+                progress(loaded)
+
+        if commit and loaded.lines:
+            loaded.replies.append(self.commit())
+        loaded.seconds = time.time() - started
+        return loaded
+
+    def load_config_diff(self, cfg_string, prune=False, commit=True):
+        """
+        Loads only the "set" lines that differ from the running configuration.
+
+        The running configuration is fetched as set lines and indexed;
+        desired lines already present are dropped, delete lines are kept
+        only when they still match something, and nothing at all is sent
+        when the device is already up to date. Re-running a ZTP script
+        therefore costs one <get-configuration> instead of a full load and
+        commit.
+
+        Args:
+            :cfg_string: desired configuration as "set" (and "delete") lines, as a string or list of lines
+            :prune: also delete running statements not present in cfg_string, treating it as the complete configuration. Defaults to False.
+            :commit: commit after loading, when anything changed. Defaults to True.
+
+        Returns a pyCliConf.diff.ConfigDiff describing what was sent, or
+        None if the running configuration could not be read.
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf()
+            diff = dev.load_config_diff(open("/var/tmp/set.cfg").read())
+            dev.log("Sent %d set and %d delete lines" % (len(diff.set_lines), len(diff.delete_lines)))
+            dev.close()
+        """
+        running = self.get_config_set()
+        if running is None:
+            return None
+
+        diff = diff_set(cfg_string, SetIndex.from_config(running), prune=prune)
+        if not diff.changed:
+            self.log("Load Config Diff: running configuration already up to date, nothing sent")
+            return diff
+
+        self.log("Load Config Diff: sending %d set and %d delete lines" % (len(diff.set_lines), len(diff.delete_lines)))
+        reply = self.load_config(cfg_string=diff.config(), action="set")
+        diff.replies.append(reply)
+        if commit and reply is not None and reply.ok:
+            diff.replies.append(self.commit())
+        return diff
+
+    def load_config_stream(self, source, cfg_format="text", action="merge", chunk_size=WRITE_SIZE):
+        """
+        Loads Junos configuration by streaming it to the device.
+
+        The envelope header, the configuration in chunks and the trailer
+        are written straight to the session, so the whole configuration
+        is never held in memory. Use this for configurations too large to
+        load comfortably as a string.
+
+        Args:
+            :source: where the configuration comes from:
+                - a local file path (eg "/var/tmp/fabric-set.cfg")
+                - a file object opened for reading
+                - a list or generator of configuration lines
+            :cfg_format: "text", "xml" or "set", as for load_config()
+            :action: configuration action, as for load_config()
+            :chunk_size: bytes written to the session at a time. Defaults to 65536.
+
+        A file path is opened before anything is sent. If reading the source
+        fails part way, the RPC is ended without its closing tags so the
+        device rejects it and loads nothing, and the session stays usable.
+
+        Returns the RpcReply, or a failed RpcReply describing why the source could not be read.
 
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            def vlans():
+                for vlan in range(1, 4000):
+                    yield "set vlans v%d vlan-id %d" % (vlan, vlan)
+
+            dev = CliConf()
+            dev.load_config_stream(vlans(), action="set")
+            dev.commit()
+            dev.close()
+        """
+        opened = None
         try:
-            self.rpc(rpc_send)
+            header, trailer = self._load_envelope(False, cfg_format, action)
+            if isinstance(source, string_types):
+                source = opened = open(source)
         except Exception as err:
-            errmsg = "RPC Load Error: %r" % err
-            self.log(errmsg)
+            errmsg = "RPC Load Stream Error: %r" % err
+            self.log(errmsg, level="error")
+            return error_reply(errmsg)
+        xml = cfg_format == "xml" and action != "set"
+
+        failed = []
+        try:
+            reply = self.rpc(self._stream_rpc(header, source, trailer, chunk_size, failed, escaped=not xml))
+        except Exception as err:
+            errmsg = "RPC Load Stream Error: %r" % err
+            self.log(errmsg, level="error")
+            return error_reply(errmsg)
+        finally:
+            if opened is not None:
+                opened.close()
+        if failed:
+            errmsg = "RPC Load Stream Error: reading the configuration failed, nothing loaded: %r" % failed[0]
+            self.log(errmsg, level="error")
+            return error_reply(errmsg)
+        if reply is None:
+            return error_reply("RPC Load Stream Error: session closed before the reply was received")
+        self.check_reply(reply, "RPC Load Stream Error")
+        return reply
 
-    def load_config_template(self, template, template_vars, cfg_format="text", action="merge"):
+    def load_config_template(self, template, template_vars, cfg_format="text", action="merge", force=False):
         """
         :template: A templated string using Jinja2 templates
         :template_vars: A dict containing the vars used in the :template: string
         :cfg_format: The type of configuration to load. The default is "text" or a standard Junos config block. Other options are: "set" for set style commands, "xml" for xml configs
         :action: Configurtion action. The default is "merge".
+        :force: load even if a state_file says the rendered configuration was already committed. Defaults to False.
 
         Uses standard `Jinja2`_ Templating.
 
+        Compiled templates are cached in memory and as bytecode under
+        /var/tmp, so repeated calls and repeated ZTP attempts skip
+        compilation (see pyCliConf.template).
+
         .. _`Jinja2`: http://jinja.pocoo.org/
 
         Example:
@@ -285,41 +744,120 @@ class CliConf():
 
         NOTE: When committing configuration with this script, please ensure that "chassis auto-image-upgrade" is in the configuration, otherwise "Auto Image Upgrade" process will exit and mark the script as a failure.
         """
-        if JINJA_SUPPORT == True:
-            try:
-                new_template = Template(template)
-            except Exception as err:
-                errmsg = "Load_Template New Error: %r" % err
-                self.log(errmsg)
-
-            try:
-                final_template = new_template.render(template_vars)
-            except Exception as err:
-                errmsg = "Load_Template Render Error: %r" % err
-                self.log(errmsg)
+        final_template = self.render_template(template, template_vars)
+        if final_template is None:
+            return None
 
-            try:
-                self.load_config(cfg_string=final_template, cfg_format=cfg_format,  action=action)
-            except Exception as err:
-                errmsg = "RPC Load_Template Send Error: %r" % err
-                self.log(errmsg)
-        else:
-            self.log("Jinja2 Template supported on this software version. First support Junos 14.1X53")
+        try:
+            return self.load_config(cfg_string=final_template, cfg_format=cfg_format,  action=action, force=force)
+        except Exception as err:
+            errmsg = "RPC Load_Template Send Error: %r" % err
+            self.log(errmsg, level="error")
 
-    def log(self, msg):
+    def log(self, msg, level="info"):
         """
         Basic logging function for use by script.
+
+        Args:
+            :msg: message to log.
+            :level: "info", "warning" or "error", recorded by log_format="json". Defaults to "info".
+
+        With log_format="json" each message is written as
+        {"ts": epoch seconds, "level": level, "msg": message},
+        and every RPC as one {"event": "rpc"} record instead of its full
+        text: type, message-id, start time, latency, bytes sent and
+        received, SHA-256 digests of request and reply, and any errors.
+        The request and reply text are only included with Debug=True.
+        pyCliConf.timeline turns such logs into per-RPC timelines.
         """
-        logfile = self.logfile
-        log_time = self.time()
+        started = time.time()
+        line = self.time() + ": " + str(msg) + "\n"
 
         if self.debug == True:
-            print(str(log_time) + ": " + str(msg) + "\n")
+            print(line)
+
+        if self.log_format == "json":
+            line = self._log_record({"level": level, "msg": str(msg)})
+
+        try:
+            self.logfile.write(line)
+        except Exception as err:
+            print("Error logging to file: %r" % err)
+        self._metrics.observe("log", time.time() - started)
+
+    def metrics(self):
+        """
+        Returns a snapshot of this session's timing and byte counters.
+
+        The dict holds "counters" (rpcs, rpc_errors, bytes_written,
+        bytes_read) and "histograms" of latency in seconds with count,
+        sum, min, max, mean and approximate p50/p90/p99:
+
+            - "rpc.load", "rpc.commit", "rpc.package-add", "rpc.reboot", "rpc.close", ... per RPC type
+            - "template_render" for load_config_template() rendering
+            - "log" for time spent in log()
+            - "call.<method>" for every public method, when the PYCLICONF_PROFILE environment variable is set
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf(metrics_file="/var/root/ztp-metrics.jsonl")
+            dev.load_config(url="/var/tmp/set.cfg", action="set")
+            dev.commit()
+            dev.log("Commit took %.1fs" % dev.metrics()["histograms"]["rpc.commit"]["max"])
+            dev.close()
+        """
+        return self._metrics.snapshot()
+
+    def prefetch(self, urls):
+        """
+        Downloads configuration fragments into the fragment cache in parallel.
+
+        Later load_config(url=..., fetch=...) calls for these URLs are
+        served from the cache. Returns True if every URL was fetched.
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf()
+            fragments = ["http://172.32.32.254/%s.conf" % name for name in ("base", "ntp", "snmp", "vlans")]
+            dev.prefetch(fragments)
+            for url in fragments:
+                dev.load_config(url=url, fetch="inline")
+            dev.commit()
+            dev.close()
+        """
+        try:
+            self.fragments.fetch_all(urls)
+        except Exception as err:
+            errmsg = "Prefetch Error: %r" % err
+            self.log(errmsg, level="error")
+            return False
+        return True
+
+    def read_reply(self):
+        """
+        Reads the next reply from the NETCONF session.
 
+        Returns an RpcReply, or None once the session has closed.
+        """
         try:
-            logfile.write(str(log_time) + ": " + str(msg) + "\n")
+            reply = self.reader.read_reply()
+        except RpcTimeoutError:
+            raise
         except Exception as err:
-            print "Error logging to file: %r" % err
+            errmsg = "RPC Reply Read Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+        if reply is None:
+            self.log("RPC Reply Error: session closed before reply was received", level="error")
+        elif self.log_format != "json":
+            self.log("RPC Reply from host:\n %s" % reply.raw)
+        return reply
 
     def reboot(self):
         """
@@ -332,33 +870,633 @@ class CliConf():
         </rpc>
         ]]>]]>
         """
+        # Forget facts first: the session normally dies without a reply when the device reboots.
+        self._forget_facts()
         try:
-            self.rpc(rpc_reboot)
+            reply = self.rpc(rpc_reboot)
         except Exception as err:
             errmsg = "RPC Reboot Error: %r" % err
-            self.log(errmsg)
+            self.log(errmsg, level="error")
+            return None
+        self.check_reply(reply, "RPC Reboot Error")
+        return reply
+
+    def render_template(self, template, template_vars):
+        """
+        Renders a Jinja2 template string with the given vars.
+
+        Returns the rendered configuration, or None if Jinja2 is not
+        available or the template failed to compile or render.
+        """
+        if JINJA_SUPPORT != True:
+            self.log("Jinja2 Template supported on this software version. First support Junos 14.1X53", level="error")
+            return None
+
+        with self._metrics.timer("template_render"):
+            try:
+                new_template = self.templates.get(template)
+            except Exception as err:
+                errmsg = "Load_Template New Error: %r" % err
+                self.log(errmsg, level="error")
+                return None
+
+            try:
+                return new_template.render(template_vars)
+            except Exception as err:
+                errmsg = "Load_Template Render Error: %r" % err
+                self.log(errmsg, level="error")
+                return None
 
-    def rpc(self, rpc):
+    def rpc(self, rpc, reply=True, timeout=None):
         """
         Opens a NETCONF session via CLI session and sends RPC.
 
         Primarily used by other methods.
 
         Args:
-            :rpc: string containing properly structured NETCONF RPC
+            :rpc: string containing properly structured NETCONF RPC, or a list or generator of strings that together make up the RPC. Parts are written as they are produced, so a generator can stream an RPC far larger than memory. A bytes RPC is decoded as UTF-8.
+            :reply: Wait for and return the device reply. Defaults to True. Otherwise the reply is discarded when it arrives.
+            :timeout: Seconds to wait for the reply. Defaults to the session's rpc_timeout.
+
+        The RPC is tagged with a message-id, so several threads may call
+        rpc() on the same session at once.
+
+        Returns the RpcReply read back from the device, or None if the
+        session closed, the RPC could not be sent or no reply came within
+        the timeout. A reply arriving after the timeout is discarded.
+        """
+
+        if isinstance(rpc, bytes):
+            rpc = to_text(rpc)
+        if self._trace is not None:
+            rpc = self._traceable(rpc)
+        started = time.time()
+        submitted = self._submit(rpc, discard=not reply)
+        if submitted is None or not reply:
+            return None
+
+        message_id, name, written, digest = submitted
+        rpc_reply, bytes_read = self._wait(message_id, timeout=self.rpc_timeout if timeout is None else timeout)
+        seconds = time.time() - started
+        self._metrics.record_rpc(name, seconds, written, bytes_read, rpc_reply is not None and rpc_reply.ok)
+        if self.log_format == "json":
+            self._log_rpc(message_id, name, started, seconds, written, digest, bytes_read, rpc_reply, rpc)
+        if self._trace is not None:
+            self._trace.record(self._request_text(rpc), rpc_reply, started, seconds)
+        return rpc_reply
+
+    def rpc_pipeline(self, rpcs):
+        """
+        Sends several RPCs back to back and collects their replies.
+
+        All RPCs are written without waiting for the device in between,
+        then the replies are matched to the RPCs in the order they were
+        sent. Writing happens on a helper thread so a device that is busy
+        answering can never stall on a full pipe.
+
+        Args:
+            :rpcs: list of strings containing properly structured NETCONF RPCs. bytes are decoded as UTF-8.
+
+        Returns a list of RpcReply objects, one per RPC. Entries are None
+        when the session closed or rpc_timeout passed before that reply arrived.
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf()
+            replies = dev.rpc_pipeline([rpc_load_system, rpc_load_interfaces])
+            dev.close()
+        """
+        rpcs = [to_text(rpc) if isinstance(rpc, bytes) else rpc for rpc in rpcs]
+        if self._trace is not None:
+            rpcs = [self._traceable(rpc) for rpc in rpcs]
+        sent = [None] * len(rpcs)
+        written = [threading.Event() for rpc in rpcs]
+        writer = threading.Thread(target=self._write_rpcs, args=(rpcs, sent, written))
+        writer.daemon = True
+        writer.start()
+
+        replies = []
+        for index in range(len(rpcs)):
+            written[index].wait()
+            if sent[index] is None:
+                replies.append(None)
+                continue
+            message_id, name, size, digest, started = sent[index]
+            reply, bytes_read = self._wait(message_id, timeout=self.rpc_timeout)
+            received = time.time()
+            replies.append(reply)
+            self._metrics.record_rpc(name, received - started, size, bytes_read, reply is not None and reply.ok)
+            if self.log_format == "json":
+                self._log_rpc(message_id, name, started, received - started, size, digest, bytes_read, reply, rpcs[index])
+            if self._trace is not None:
+                self._trace.record(self._request_text(rpcs[index]), reply, started, received - started)
+        writer.join()
+        return replies
+
+    @property
+    def templates(self):
+        """
+        The TemplateCache used by load_config_template(), shared by every CliConf with the same template_path.
+
+        Use dev.templates.stats() to check compiled template and bytecode cache hits.
+        None, after logging an error, if Jinja2 is not available.
+        """
+        if JINJA_SUPPORT != True:
+            self.log("Jinja2 Template supported on this software version. First support Junos 14.1X53", level="error")
+            return None
+        if self._templates is None:
+            self._templates = get_template_cache(self.template_path)
+        return self._templates
+
+    def time(self):
+        """
+        Basic Time Function for log function use. The string is formatted at most once per second.
+        """
+        return timestamp()
+
+    def transaction(self, action="merge", commit=True):
+        """
+        Returns a Transaction that batches load_config calls into one load and one commit.
+
+        Args:
+            :action: Configuration action for "text" and "xml" fragments. Defaults to "merge".
+            :commit: Commit when the block exits. Defaults to True.
+
+        Example:
+
+        .. code-block:: python
+            from pyCliConf import CliConf
+
+            dev = CliConf()
+            with dev.transaction(action="merge") as tx:
+                tx.load_config(cfg_string="system { host-name foo; }")
+                tx.load_config(cfg_string="set system ntp server 10.0.0.3", cfg_format="set")
+            dev.close()
+
+        If loading or committing fails the candidate is discarded and
+        pyCliConf.exceptions.TransactionError is raised.
+        """
+        return Transaction(self, action=action, commit=commit)
+
+    def _forget_facts(self):
+        self._facts = None
+        if self._facts_cache is not None:
+            self._facts_cache.clear()
+
+    def _give_up(self, message_id, timeout):
+        """
+        Stops waiting for message_id after its timeout: its reply is dropped when it arrives. Call with _replies held.
+
+        Returns (None, 0), for _wait() to return.
+        """
+        if message_id in self._received:
+            return self._received.pop(message_id)
+        if message_id in self._outstanding:
+            self._discard.add(message_id)
+            self._streamed.discard(message_id)
+        self.log("RPC Timeout Error: no reply to message-id %s within %ss" % (message_id, timeout), level="error")
+        return None, 0
+
+    def _load_envelope(self, url, cfg_format, action):
+        """
+        Builds only the <load-configuration> envelope that will be used.
+
+        Returns (header, trailer) to wrap around the configuration, or
+        (rpc, "") for a URL load.
+        """
+        set_format = action == "set" or cfg_format == "set"
+        if set_format:
+            action_string = ' action = "set" '
+            cfg_format = "text"
+        elif action in  ['merge', 'overide', 'replace', 'update']:
+            action_string = ' action = "%s" ' % action
+        else:
+            raise Exception("RPC Load Error - Unknown action type")
+
+        if url:
+            rpc_load_url = """
+        <rpc> 
+            <load-configuration url="%s"%sformat="%s" />
+        </rpc>
+        ]]>]]>
+        """ % (escape(url, quote=True), action_string, cfg_format)
+            return rpc_load_url, ""
+
+        if set_format:
+            element = "configuration-set"
+        elif cfg_format == "text":
+            element = "configuration-text"
+        elif cfg_format == "xml":
+            element = "configuration"
+        else:
+            raise Exception("RPC Load Error - Unknown config format")
+
+        header = """
+           <rpc> 
+            <load-configuration%sformat="%s">
+                <%s>
+                    """ % (action_string, cfg_format, element)
+        trailer = """
+                </%s>
+            </load-configuration>
+        </rpc>
+        ]]>]]>
+        """ % element
+        return header, trailer
+
+    def _load_rpc(self, cfg_string, url, cfg_format, action):
+        """
+        Builds the <load-configuration> RPC used by load_config.
+
+        The configuration is not copied into the envelope; the RPC is
+        returned as a list of parts which rpc() writes one after another.
+        """
+        header, trailer = self._load_envelope(url, cfg_format, action)
+        if url:
+            return header
+        if cfg_format != "xml" or action == "set":
+            cfg_string = escape(cfg_string)
+        return [header, cfg_string, trailer]
 
+    def _log_record(self, record):
+        """
+        Returns record, stamped with the current time, as a JSON log line.
         """
+        record["ts"] = round(time.time(), 6)
+        return json.dumps(record, sort_keys=True, separators=(",", ":")) + "\n"
 
+    def _log_rpc(self, message_id, name, started, seconds, written, digest, bytes_read, reply, request):
+        """
+        Writes the structured log record of a completed RPC. reply is an RpcReply, a ConfigTree or None.
+        """
+        record = {
+            "event": "rpc",
+            "rpc": name,
+            "id": message_id,
+            "started": round(started, 6),
+            "seconds": round(seconds, 6),
+            "sent": written,
+            "received": bytes_read,
+            "sha256": digest,
+            "ok": reply is not None and reply.ok,
+            "level": "info" if reply is not None and reply.ok else "error",
+        }
+        if reply is not None and reply.errors:
+            record["errors"] = reply.errors
+        raw = getattr(reply, "raw", None)
+        if raw is not None:
+            record["reply_sha256"] = hashlib.sha256(to_bytes(raw)).hexdigest()
+        if self.debug:
+            if request is not None:
+                record["request"] = self._request_text(request)
+            if raw is not None:
+                record["reply"] = raw
         try:
-            log_string = "RPC Data Sent to host:\n %r" % rpc
-            self.log(log_string)
-            self.session.stdin.write(rpc)
+            self.logfile.write(self._log_record(record))
         except Exception as err:
-            errmsg = "RPC Communication Error: %r" % err
-            self.log(errmsg)
+            print("Error logging to file: %r" % err)
 
-    def time(self):
+    def _package_rpc(self, url, no_copy, no_validate, unlink, reboot):
+        """
+        Builds the <request-package-add> RPC used by install_package.
+        """
+        if no_copy:
+            rpc_package_nocopy = "<no-copy/>"
+        else:
+            rpc_package_nocopy = ""
+        if no_validate:
+            rpc_package_novalidate = "<no-validate/>"
+        else:
+            rpc_package_novalidate = ""
+        if unlink:
+            rpc_package_unlink = "<unlink/>"
+        else:
+            rpc_package_unlink = ""
+        if reboot:
+            rpc_package_reboot = "<reboot/>"
+        else:
+            rpc_package_reboot = ""
+
+        rpc_package = """
+            <rpc>
+               <request-package-add>
+                <package-name>
+                    %s
+                </package-name>
+                 %s
+                 %s
+                 %s
+                 %s
+               </request-package-add>
+            </rpc>
+            ]]>]]>
+        """ % (escape(url), rpc_package_nocopy, rpc_package_novalidate, rpc_package_unlink, rpc_package_reboot)
+
+        return rpc_package
+
+    def _read(self, size):
+        deadline = self._deadline
+        if deadline is not None and not self.session.readable(max(0.0, deadline - time.time())):
+            raise RpcTimeoutError("RPC Timeout Error: no reply from the device")
+        return self.session.read(size)
+
+    def _read_chunks(self, source, chunk_size):
+        if hasattr(source, "read"):
+            for chunk in iter(lambda: source.read(chunk_size), source.read(0)):
+                yield chunk
+            return
+        lines = []
+        size = 0
+        for line in source:
+            if not line.endswith("\n"):
+                line += "\n"
+            lines.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield "".join(lines)
+                lines = []
+                size = 0
+        if lines:
+            yield "".join(lines)
+
+    def _record_commit(self):
         """
-        Basic Time Function for log function use.
+        Adds the payloads loaded since the last commit to the state file.
+
+        The file is rewritten with everything this session has committed
+        or found already committed, so it always describes the last run.
+        """
+        if self._state is not None:
+            self._applied.extend(self._loaded)
+            try:
+                self._state.record(self._applied)
+            except Exception as err:
+                errmsg = "State File Error: %r" % err
+                self.log(errmsg, level="error")
+        self._reset_candidate()
+
+    def _request_text(self, rpc):
+        if isinstance(rpc, string_types):
+            return rpc
+        return "".join(rpc)
+
+    def _reset_candidate(self):
+        self._loaded = []
+        self._skipped = 0
+        self._changed = False
+
+    def _stream_config(self):
+        """
+        Parses the next message on the session into a ConfigTree, or returns None after logging why.
+        """
+        stream = MessageStream(self.reader)
+        try:
+            return parse_config(stream)
+        except Exception as err:
+            errmsg = "RPC Get Configuration Error: %r" % err
+            self.log(errmsg, level="error")
+            try:
+                stream.drain()
+            except Exception:
+                pass
+            return None
+
+    def _stream_rpc(self, header, source, trailer, chunk_size, failed, escaped=True):
+        """
+        Yields header, configuration chunks read from a file object or iterable of lines, and trailer.
+
+        Chunks are XML escaped unless escaped is False (XML configuration).
+        If reading source raises, the exception is appended to failed and
+        the message is ended with only the framing delimiter: the device
+        rejects the unterminated XML instead of loading part of it.
+        """
+        yield header
+        try:
+            for chunk in self._read_chunks(source, chunk_size):
+                yield escape(chunk) if escaped else chunk
+        except Exception as err:
+            failed.append(err)
+            yield "\n]]>]]>\n"
+            return
+        yield trailer
+
+    def _submit(self, rpc, discard=False, streamed=False):
+        """
+        Tags an RPC with the next message-id, registers it as awaiting a reply and writes it.
+
+        The reply is dropped when it arrives if discard is set, and left
+        on the session for the sending thread to read if streamed is set
+        (see _wait()).
+
+        Returns (message-id, rpc type, bytes written, digest), or None if it could not be sent.
+        """
+        with self._write_lock:
+            self._message_id += 1
+            message_id = str(self._message_id)
+            with self._replies:
+                self._outstanding.append(message_id)
+                if discard:
+                    self._discard.add(message_id)
+                if streamed:
+                    self._streamed.add(message_id)
+            sent = self._send(self._tag(rpc, message_id))
+            if sent is None:
+                with self._replies:
+                    self._outstanding.remove(message_id)
+                    self._discard.discard(message_id)
+                    self._streamed.discard(message_id)
+                return None
+        return (message_id,) + sent
+
+    def _tag(self, rpc, message_id):
+        """
+        Returns rpc with message-id set on its <rpc> element. An RPC that already has a message-id keeps it.
+        """
+        if isinstance(rpc, string_types):
+            match = _rpc_open.search(rpc, 0, 4096)
+            if match is None or "message-id" in rpc[match.end():rpc.find(">", match.end())]:
+                return rpc
+            return '%s message-id="%s"%s' % (rpc[:match.end()], message_id, rpc[match.end():])
+        return self._tag_parts(rpc, message_id)
+
+    def _tag_parts(self, parts, message_id):
+        tagged = False
+        for part in parts:
+            if not tagged and _rpc_open.search(part[:4096]):
+                part = self._tag(part, message_id)
+                tagged = True
+            yield part
+
+    def _traceable(self, rpc):
         """
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        Returns rpc with a generator of parts turned into a list of text, so it can still be traced after it is sent.
+        """
+        if isinstance(rpc, string_types):
+            return rpc
+        return [to_text(part) for part in rpc]
+
+    def _validate(self, cfg_string, cfg_format, action):
+        """
+        Checks configuration locally (see pyCliConf.validate) and logs any problems.
+
+        Returns False when it has errors and must not be sent.
+        """
+        result = validate_config(cfg_string, cfg_format, action)
+        for index, message in enumerate(result.messages()):
+            self.log("Config Validation: %s" % message, level="error" if index < len(result.errors) else "warning")
+        if not result.ok:
+            self.log("RPC Load Error: configuration failed validation, not sent (%d errors)" % len(result.errors), level="error")
+        return result.ok
+
+    def _wait(self, message_id, handler=None, timeout=None):
+        """
+        Waits for the reply to message_id.
+
+        Waiting threads take turns reading replies off the session and
+        hand each to its owner: the RPC named by the reply's message-id
+        or, for replies without a known one, the oldest RPC still waiting,
+        since Junos answers RPCs in order. An RPC submitted with
+        streamed=True is read by its own thread: once its reply is next
+        on the session, handler() is called to consume it and its result
+        is returned.
+
+        After timeout seconds without its reply the RPC is given up: an
+        error is logged and its reply is dropped whenever it arrives. A
+        streamed reply that has started arriving is read to its end.
+
+        Returns (RpcReply or handler result, bytes read), or (None, 0) if the session closed or the timeout passed.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            with self._replies:
+                while True:
+                    if message_id in self._received:
+                        return self._received.pop(message_id)
+                    head = self._outstanding[0] if self._outstanding else None
+                    if not self._reading and (head == message_id or head not in self._streamed):
+                        self._reading = True
+                        break
+                    if deadline is not None and time.time() >= deadline:
+                        return self._give_up(message_id, timeout)
+                    self._replies.wait(None if deadline is None else deadline - time.time())
+
+            try:
+                self._deadline = deadline
+                while head == message_id or head not in self._streamed:
+                    bytes_read = self.reader.bytes_read
+                    if head == message_id and handler is not None:
+                        self.reader.read_hello()
+                        if deadline is not None and not self.reader.buffered() and not self.session.readable(max(0.0, deadline - time.time())):
+                            raise RpcTimeoutError("RPC Timeout Error: no reply from the device")
+                        self._deadline = None
+                        result = handler()
+                        with self._replies:
+                            self._outstanding.remove(message_id)
+                            self._streamed.discard(message_id)
+                        return result, self.reader.bytes_read - bytes_read
+
+                    reply = self.read_reply()
+                    size = self.reader.bytes_read - bytes_read
+                    with self._replies:
+                        if reply is None:
+                            # Session closed: nothing else is coming for anyone.
+                            for waiting in self._outstanding:
+                                if waiting not in self._discard:
+                                    self._received[waiting] = (None, 0)
+                            self._outstanding = []
+                            self._discard = set()
+                            self._streamed = set()
+                            self._received.pop(message_id, None)
+                            return None, 0
+                        owner = reply.message_id
+                        if owner not in self._outstanding:
+                            owner = self._outstanding[0] if self._outstanding else None
+                        if owner is not None:
+                            self._outstanding.remove(owner)
+                            if owner == message_id:
+                                return reply, size
+                            if owner in self._discard:
+                                self._discard.discard(owner)
+                            else:
+                                self._received[owner] = (reply, size)
+                                self._replies.notify_all()
+                        head = self._outstanding[0] if self._outstanding else None
+                # The next reply is another thread's to stream: hand the session over.
+            except RpcTimeoutError:
+                with self._replies:
+                    return self._give_up(message_id, timeout)
+            finally:
+                with self._replies:
+                    self._deadline = None
+                    self._reading = False
+                    self._replies.notify_all()
+
+    def _write(self, data, digest=None):
+        """
+        Writes a string to the session in WRITE_SIZE pieces, so large
+        strings are never encoded or copied in one go. Returns the byte count.
+
+        The bytes written are also fed to digest, when one is given.
+        """
+        written = 0
+        for start in range(0, len(data), WRITE_SIZE):
+            chunk = to_bytes(data[start:start + WRITE_SIZE])
+            self.session.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            written += len(chunk)
+        return written
+
+    def _send(self, rpc):
+        """
+        Writes and logs an RPC. An RPC sent in parts is logged part by
+        part as it is written. With log_format="json" the RPC is not
+        logged here but digested, for the record written once it completes.
+
+        Returns (rpc type, bytes written, SHA-256 hex digest or None), or None if it could not be sent.
+        """
+        structured = self.log_format == "json"
+        digest = hashlib.sha256() if structured else None
+        try:
+            if isinstance(rpc, string_types):
+                if not structured:
+                    log_string = "RPC Data Sent to host:\n %r" % rpc
+                    self.log(log_string)
+                name = rpc_name(rpc)
+                if name == "load":
+                    self._changed = True
+                written = self._write(rpc, digest)
+            else:
+                name = None
+                written = 0
+                for part in rpc:
+                    if name is None:
+                        name = rpc_name(part)
+                        if name == "load":
+                            self._changed = True
+                    if not structured:
+                        self.log("RPC Data Sent to host:\n %r" % to_text(part))
+                    written += self._write(part, digest)
+                if not structured:
+                    self.log("RPC Data Sent to host: %d bytes streamed" % written)
+        except Exception as err:
+            errmsg = "RPC Communication Error: %r" % err
+            self.log(errmsg, level="error")
+            return None
+        self._metrics.add("bytes_written", written)
+        return name, written, digest.hexdigest() if digest is not None else None
+
+    def _write_rpcs(self, rpcs, sent, written):
+        for index, rpc in enumerate(rpcs):
+            started = time.time()
+            result = self._submit(rpc)
+            if result is not None:
+                sent[index] = result + (started,)
+            written[index].set()
+
+
+if profiling_enabled():
+    profile_methods(CliConf)
@@ -0,0 +1,259 @@
+"""
+Run ZTP steps as a dependency graph instead of one after another.
+
+A ZTP script usually loads configuration, commits, then installs the
+Junos image, so the multi-minute image download only starts once the
+configuration work is done. A Scheduler runs steps as soon as the steps
+they depend on have finished: the image can be staged in the package
+cache, templates rendered and fragments fetched while configuration is
+being loaded and committed.
+
+Steps that talk to the device are marked rpc=True and run one at a time,
+since a NETCONF session carries one RPC at a time. Every other step runs
+on a pool of worker threads. Each step is called with the results of the
+steps it depends on, in the order they are listed. At the end,
+ScheduleResult.report() shows when each step ran and the critical path:
+the chain of steps that decided the total run time.
+
+.. code-block:: python
+
+    from pyCliConf import CliConf
+    from pyCliConf.packagecache import PackageCache
+    from pyCliConf.scheduler import Scheduler
+
+    dev = CliConf()
+    sched = Scheduler()
+    sched.add("stage-image", lambda: PackageCache().fetch(JUNOS_URL, sha256=JUNOS_SHA256))
+    sched.add("render", lambda: dev.render_template(TEMPLATE, TEMPLATE_VARS))
+    sched.add("load", lambda config: dev.load_config(cfg_string=config), after=["render"], rpc=True)
+    sched.add("commit", lambda loaded: dev.commit(), after=["load"], rpc=True)
+    sched.add("install", lambda path, committed: dev.install_package(path, reboot=True),
+              after=["stage-image", "commit"], rpc=True)
+    result = sched.run()
+    dev.log(result.report())
+"""
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class Step(object):
+    """
+    A node of the step graph.
+
+    Attributes:
+        :name: unique step name.
+        :func: callable taking one argument per dependency. Returning None, False or a failed RpcReply, or raising, fails the step.
+        :after: names of the steps this one depends on.
+        :rpc: the step uses the device session, so it never overlaps another rpc step.
+    """
+    def __init__(self, name, func, after=(), rpc=False):
+        self.name = name
+        self.func = func
+        self.after = list(after)
+        self.rpc = rpc
+
+
+class StepRun(object):
+    """
+    Outcome of one step.
+
+    Attributes:
+        :name: step name.
+        :status: "ok", "failed" or "skipped" (a dependency failed).
+        :value: what the step returned.
+        :error: why it failed or was skipped, or None.
+        :started: seconds from the start of the run to the start of the step, after any wait for the session.
+        :finished: seconds from the start of the run to the end of the step.
+        :waited: seconds spent waiting for the session.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.status = "pending"
+        self.value = None
+        self.error = None
+        self.started = 0.0
+        self.finished = 0.0
+        self.waited = 0.0
+
+    @property
+    def seconds(self):
+        return self.finished - self.started
+
+    def __repr__(self):
+        return "<StepRun %s %s %.3fs>" % (self.name, self.status, self.seconds)
+
+
+class ScheduleResult(object):
+    """
+    Outcome of Scheduler.run().
+
+    Attributes:
+        :steps: StepRun for every step, in the order they were added.
+        :seconds: wall time of the run.
+        :critical_path: names of the steps on the critical path, first to last.
+    """
+    def __init__(self, steps, graph, seconds):
+        self.steps = steps
+        self.seconds = seconds
+        self.critical_path = self._critical_path(graph)
+
+    @property
+    def ok(self):
+        return all(step.status == "ok" for step in self.steps)
+
+    def __getitem__(self, name):
+        for step in self.steps:
+            if step.name == name:
+                return step
+        raise KeyError(name)
+
+    def report(self):
+        serial = sum(step.seconds for step in self.steps)
+        lines = ["%d steps in %.2fs (%.2fs if run one after another), %d failed, %d skipped" % (
+            len(self.steps), self.seconds, serial,
+            len([step for step in self.steps if step.status == "failed"]),
+            len([step for step in self.steps if step.status == "skipped"])),
+            "%-24s %-8s %9s %9s %9s  %s" % ("step", "status", "start", "seconds", "waited", "critical")]
+        for step in self.steps:
+            lines.append("%-24s %-8s %8.2fs %8.2fs %8.2fs  %s" % (
+                step.name, step.status, step.started, step.seconds, step.waited,
+                "*" if step.name in self.critical_path else ""))
+        lines.append("critical path: %s" % " -> ".join(self.critical_path))
+        return "\n".join(lines)
+
+    def _critical_path(self, graph):
+        """
+        Walks back from the last step to finish, through whatever held each step up.
+
+        A step was held up either by the dependency that finished last or,
+        when it had to wait for the session, by the rpc step that ran just
+        before it.
+        """
+        runs = dict((step.name, step) for step in self.steps if step.status in ("ok", "failed"))
+        if not runs:
+            return []
+        current = max(runs.values(), key=lambda step: step.finished)
+        path = [current.name]
+        while True:
+            blockers = [runs[name] for name in graph[current.name].after if name in runs]
+            if current.waited > 0:
+                blockers += [step for step in runs.values()
+                             if graph[step.name].rpc and step.finished <= current.started + 1e-6 and step is not current]
+            if not blockers:
+                break
+            current = max(blockers, key=lambda step: step.finished)
+            path.append(current.name)
+        path.reverse()
+        return path
+
+    def __repr__(self):
+        return "<ScheduleResult %d steps in %.2fs, %s>" % (len(self.steps), self.seconds, "ok" if self.ok else "failed")
+
+
+class Scheduler(object):
+    """
+    Runs steps as soon as their dependencies are done.
+
+    Args:
+        :workers: maximum number of steps running at once. Defaults to 4.
+    """
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.steps = []
+        self._session = threading.Lock()
+
+    def add(self, name, func, after=(), rpc=False):
+        """
+        Adds a step. Dependencies must already have been added, so the graph cannot have cycles.
+
+        Args:
+            :name: unique step name.
+            :func: callable taking the results of the steps in after, in that order.
+            :after: names of steps that must succeed first. Defaults to none.
+            :rpc: the step sends RPCs on the device session. Defaults to False.
+        """
+        names = [step.name for step in self.steps]
+        if name in names:
+            raise ValueError("Duplicate step name: %r" % name)
+        for dependency in after:
+            if dependency not in names:
+                raise ValueError("Step %r depends on unknown step %r" % (name, dependency))
+        self.steps.append(Step(name, func, after=after, rpc=rpc))
+        return func
+
+    def step(self, name, after=(), rpc=False):
+        """
+        Decorator form of add().
+        """
+        def register(func):
+            return self.add(name, func, after=after, rpc=rpc)
+        return register
+
+    def run(self):
+        """
+        Runs every step and returns a ScheduleResult.
+
+        A failed step does not stop the run; the steps depending on it,
+        directly or not, are skipped.
+        """
+        graph = dict((step.name, step) for step in self.steps)
+        runs = dict((step.name, StepRun(step.name)) for step in self.steps)
+        waiting = list(self.steps)
+        finished = queue.Queue()
+        running = 0
+        started = time.time()
+
+        while waiting or running:
+            for step in list(waiting):
+                failed = [name for name in step.after if runs[name].status in ("failed", "skipped")]
+                if failed:
+                    runs[step.name].status = "skipped"
+                    runs[step.name].error = "dependency %s did not succeed" % failed[0]
+                    waiting.remove(step)
+                    continue
+                if running >= self.workers:
+                    continue
+                if all(runs[name].status == "ok" for name in step.after):
+                    waiting.remove(step)
+                    running += 1
+                    args = [runs[name].value for name in step.after]
+                    thread = threading.Thread(target=self._run_step, args=(step, args, runs[step.name], started, finished),
+                                              name="pyCliConf-step-%s" % step.name)
+                    thread.daemon = True
+                    thread.start()
+            if not running:
+                break
+            finished.get()
+            running -= 1
+
+        return ScheduleResult([runs[step.name] for step in self.steps], graph, time.time() - started)
+
+    def _run_step(self, step, args, run, started, finished):
+        try:
+            ready = time.time()
+            if step.rpc:
+                self._session.acquire()
+            try:
+                run.waited = time.time() - ready
+                run.started = time.time() - started
+                try:
+                    run.value = step.func(*args)
+                    if run.value is None or run.value is False or (hasattr(run.value, "ok") and not run.value.ok):
+                        run.status = "failed"
+                        run.error = "step returned %r" % (run.value,)
+                    else:
+                        run.status = "ok"
+                except Exception as err:
+                    run.status = "failed"
+                    run.error = "%r" % err
+                run.finished = time.time() - started
+            finally:
+                if step.rpc:
+                    self._session.release()
+        finally:
+            finished.put(step.name)
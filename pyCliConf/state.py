@@ -0,0 +1,67 @@
+"""
+Remember which configuration payloads were last committed.
+
+ZTP scripts run again on every boot until they succeed, loading and
+committing the same configuration each time, and a commit can take tens
+of seconds. AppliedState keeps a small JSON file on persistent storage
+with a hash of every payload the last successful commit applied, so
+CliConf.load_config() can skip a load, and commit() the commit, when the
+same payload comes round again.
+"""
+import hashlib
+import json
+import os
+import time
+
+from .netconf import to_bytes
+
+STATE_FILE = "/var/root/pycliconf-state.json"
+
+
+def payload_hash(cfg_string, cfg_format, action):
+    """
+    Returns the SHA-256 of a configuration payload together with its format and action.
+    """
+    digest = hashlib.sha256(to_bytes("%s\n%s\n" % (cfg_format, action)))
+    digest.update(to_bytes(cfg_string))
+    return digest.hexdigest()
+
+
+class AppliedState(object):
+    """
+    Hashes of the payloads applied by the last successful commit.
+
+    The file holds {"committed": {hash: {"format", "action", "time"}}}.
+    Every successful commit replaces it with the payloads loaded since
+    the previous commit; a file that is missing or unreadable counts as
+    empty, so the worst case is an unnecessary load and commit.
+
+    Args:
+        :path: state file location. Defaults to "/var/root/pycliconf-state.json", which survives reboots during ZTP.
+    """
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.committed = {}
+        try:
+            with open(path) as handle:
+                self.committed = json.load(handle).get("committed", {})
+        except (IOError, OSError, ValueError, AttributeError):
+            pass
+
+    def __contains__(self, digest):
+        return digest in self.committed
+
+    def record(self, payloads):
+        """
+        Replaces the committed payloads with payloads, a list of (hash, cfg_format, action), and saves the file.
+        """
+        now = time.time()
+        self.committed = dict((digest, {"format": cfg_format, "action": action, "time": now})
+                              for digest, cfg_format, action in payloads)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        partial = self.path + ".tmp"
+        with open(partial, "w") as handle:
+            json.dump({"committed": self.committed}, handle, indent=1, sort_keys=True)
+        os.rename(partial, self.path)
@@ -0,0 +1,204 @@
+"""
+Compiled Jinja2 template cache used by CliConf.load_config_template().
+
+Compiling Jinja2 templates is slow on switch CPUs, so templates are
+compiled once and reused:
+
+    - an LRU of compiled templates keyed by a hash of the template source
+    - a Jinja2 bytecode cache on disk (a private per-user directory under
+      /var/tmp by default, see pyCliConf.cachedir), so a ZTP attempt after
+      a reboot skips compilation entirely
+    - an Environment with a directory loader, so templates can use
+      {% include %}, {% import %} and {% extends %}
+
+Jinja2 is not supported until Junos 14.1X53; JINJA_SUPPORT is False and
+TemplateCache can not be used when it is missing.
+"""
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+from .cachedir import cache_directory, private_directory
+from .netconf import string_types
+
+try:
+    from jinja2 import BaseLoader, ChoiceLoader, Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateNotFound
+    JINJA_SUPPORT = True
+except:
+    JINJA_SUPPORT = False
+    BaseLoader = FileSystemBytecodeCache = object
+
+CACHE_SIZE = 64
+
+
+class SourceLoader(BaseLoader):
+    """
+    Serves in-memory template sources by their content hash, so string
+    templates go through the same bytecode cache as files.
+    """
+    def __init__(self):
+        self.sources = {}
+
+    def get_source(self, environment, name):
+        if name not in self.sources:
+            raise TemplateNotFound(name)
+        return self.sources[name], None, lambda: True
+
+
+class CountingBytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache that counts how often compiled code was found on disk.
+    """
+    def __init__(self, directory):
+        FileSystemBytecodeCache.__init__(self, directory)
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket):
+        FileSystemBytecodeCache.load_bytecode(self, bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+
+class TemplateCache(object):
+    """
+    Compiles and caches Jinja2 templates.
+
+    Args:
+        :search_path: directory, or list of directories, searched by {% include %} and get_file(). Defaults to none.
+        :cache_size: number of compiled templates kept in memory. Defaults to 64.
+        :bytecode_dir: directory for the on-disk bytecode cache, or False to disable it. It is created with mode 0700 and not used unless this user owns it and nobody else can write to it. Defaults to "/var/tmp/pycliconf-jinja-cache-<uid>".
+
+    Example:
+
+    .. code-block:: python
+
+        from pyCliConf.template import TemplateCache
+
+        templates = TemplateCache(search_path="/var/tmp/templates")
+        config = templates.render("{% include 'system.j2' %}", {"hostname": "foo"})
+        print(templates.stats())
+    """
+    def __init__(self, search_path=None, cache_size=CACHE_SIZE, bytecode_dir=None):
+        if not JINJA_SUPPORT:
+            raise RuntimeError("Jinja2 Template supported on this software version. First support Junos 14.1X53")
+        if isinstance(search_path, string_types):
+            search_path = [search_path]
+        self.search_path = list(search_path or [])
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.compiled = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.bytecode_cache = None
+        if bytecode_dir is None:
+            bytecode_dir = cache_directory("jinja-cache")
+        if bytecode_dir:
+            try:
+                # Bytecode is loaded with marshal: only trust a directory nobody else can write to.
+                self.bytecode_cache = CountingBytecodeCache(private_directory(bytecode_dir))
+            except Exception:
+                self.bytecode_cache = None
+
+        self.sources = SourceLoader()
+        self.environment = Environment(loader=ChoiceLoader([self.sources, FileSystemLoader(self.search_path)]),
+                                       bytecode_cache=self.bytecode_cache,
+                                       cache_size=cache_size)
+
+    def get(self, source):
+        """
+        Returns the compiled Template for a template source string.
+        """
+        if not isinstance(source, bytes):
+            key = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        else:
+            key = hashlib.sha1(source).hexdigest()
+
+        with self.lock:
+            template = self.compiled.get(key)
+            if template is not None:
+                self.hits += 1
+                del self.compiled[key]
+                self.compiled[key] = template
+                return template
+            self.misses += 1
+
+            self.sources.sources[key] = source
+            try:
+                template = self.environment.get_template(key)
+            finally:
+                del self.sources.sources[key]
+            self.remember(key, template)
+            return template
+
+    def get_file(self, name):
+        """
+        Returns the compiled Template for a file in the search path.
+        """
+        key = "file:" + name
+        with self.lock:
+            template = self.compiled.get(key)
+            if template is not None and template.is_up_to_date:
+                self.hits += 1
+                del self.compiled[key]
+                self.compiled[key] = template
+                return template
+            self.misses += 1
+
+            template = self.environment.get_template(name)
+            self.remember(key, template)
+            return template
+
+    def render(self, source, template_vars):
+        """
+        Renders a template source string with a dict of vars.
+        """
+        return self.get(source).render(template_vars)
+
+    def remember(self, key, template):
+        """
+        Adds a compiled template to the LRU, evicting the oldest. Call with the lock held.
+        """
+        self.compiled[key] = template
+        while len(self.compiled) > self.cache_size:
+            self.compiled.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns a dict of cache counters.
+
+            - hits / misses: in-memory compiled template cache
+            - bytecode_hits / bytecode_misses: on-disk bytecode cache, consulted on every in-memory miss
+            - size: compiled templates held in memory
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytecode_hits": self.bytecode_cache.hits if self.bytecode_cache else 0,
+            "bytecode_misses": self.bytecode_cache.misses if self.bytecode_cache else 0,
+            "size": len(self.compiled),
+        }
+
+
+caches = {}
+caches_lock = threading.Lock()
+
+
+def get_template_cache(search_path=None):
+    """
+    Returns the TemplateCache shared by every CliConf using the same search path.
+
+    ZTP scripts often create a new CliConf per step; sharing the cache
+    means a template is compiled once per process, not once per CliConf.
+    """
+    if isinstance(search_path, string_types):
+        search_path = [search_path]
+    key = tuple(search_path or [])
+    with caches_lock:
+        if key not in caches:
+            caches[key] = TemplateCache(search_path=list(key))
+        return caches[key]
@@ -0,0 +1,237 @@
+"""
+Timelines and latency summaries from structured CliConf logs.
+
+CliConf(log_format="json") writes one JSON record per line: every log()
+message, and one {"event": "rpc"} record per RPC with its type, start
+time, latency and byte counts. This module turns such logs back into
+where the time went:
+
+    - per device, a timeline of every RPC, with the time the script spent
+      between RPCs shown as gaps
+    - across devices, p50/p90/p99/max latency of each RPC type, and how
+      the total session time splits into RPC time and script time
+
+Rotated logfiles ("ztp.log.1", "ztp.log.2", ...) are read together with
+the log they were rotated from. Lines that are not JSON, such as text
+log output or stderr, are skipped.
+
+.. code-block:: bash
+
+    python -m pyCliConf.timeline /var/tmp/fleet/*.log
+    python -m pyCliConf.timeline --timeline /var/tmp/fleet/leaf1.log
+    python -m pyCliConf.timeline --json /var/tmp/fleet/*.log
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+from .fleet import latency_summary
+
+BAR_WIDTH = 40
+_rotated = re.compile(r"^(.*)\.(\d+)$")
+
+
+def group_logs(paths):
+    """
+    Groups logfile paths by device: returns [(base path, [paths, oldest first])].
+
+    "x.log.2" and "x.log.1" are rotated copies of "x.log", so they are read before it.
+    """
+    groups = {}
+    order = []
+    for path in paths:
+        match = _rotated.match(path)
+        base, generation = (match.group(1), int(match.group(2))) if match else (path, 0)
+        if base not in groups:
+            groups[base] = []
+            order.append(base)
+        groups[base].append((generation, path))
+    return [(base, [path for generation, path in sorted(groups[base], reverse=True)]) for base in order]
+
+
+def read_log(paths):
+    """
+    Returns the JSON records of one device's logfiles, in time order.
+    """
+    records = []
+    for path in paths:
+        with open(path) as handle:
+            for line in handle:
+                line = line.strip()
+                if not line.startswith("{"):
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and "ts" in record:
+                    records.append(record)
+    records.sort(key=lambda record: record.get("started", record["ts"]))
+    return records
+
+
+class Timeline(object):
+    """
+    The RPCs of one device's session.
+
+    Attributes:
+        :name: device name, the logfile name without its extension.
+        :rpcs: the {"event": "rpc"} records, in the order they started.
+        :errors: messages of the log records with level "error".
+        :started: time of the first record.
+        :seconds: time from the first record to the last.
+    """
+    def __init__(self, name, records):
+        self.name = name
+        self.rpcs = [record for record in records if record.get("event") == "rpc"]
+        self.errors = [record.get("msg", "") for record in records
+                       if record.get("level") == "error" and record.get("event") != "rpc"]
+        if records:
+            self.started = min(record.get("started", record["ts"]) for record in records)
+            self.seconds = max(record["ts"] for record in records) - self.started
+        else:
+            self.started = 0.0
+            self.seconds = 0.0
+
+    @property
+    def rpc_seconds(self):
+        """
+        Time at least one RPC was outstanding; pipelined RPCs overlap, so this is not their sum.
+        """
+        busy = 0.0
+        end = None
+        for record in self.rpcs:
+            start, finish = record["started"], record["started"] + record["seconds"]
+            if end is None or start > end:
+                busy += finish - start
+                end = finish
+            elif finish > end:
+                busy += finish - end
+                end = finish
+        return busy
+
+    @property
+    def script_seconds(self):
+        return max(0.0, self.seconds - self.rpc_seconds)
+
+    def steps(self):
+        """
+        Returns one dict per RPC: offset from the start of the session, seconds, the gap before it, rpc type and ok.
+        """
+        steps = []
+        previous = self.started
+        for record in self.rpcs:
+            offset = record["started"] - self.started
+            steps.append({
+                "offset": offset,
+                "seconds": record["seconds"],
+                "gap": max(0.0, record["started"] - previous),
+                "rpc": record.get("rpc"),
+                "ok": record.get("ok", True),
+                "sent": record.get("sent", 0),
+                "received": record.get("received", 0),
+            })
+            previous = max(previous, record["started"] + record["seconds"])
+        return steps
+
+    def report(self):
+        lines = ["%s: %d RPCs in %.2fs (%.2fs RPC, %.2fs script)" % (
+            self.name, len(self.rpcs), self.seconds, self.rpc_seconds, self.script_seconds),
+            "%9s %9s %9s  %-24s %-6s %s" % ("offset", "seconds", "gap", "rpc", "status", "")]
+        scale = BAR_WIDTH / self.seconds if self.seconds > 0 else 0
+        for step in self.steps():
+            start = int(step["offset"] * scale)
+            bar = " " * start + "#" * max(1, int(step["seconds"] * scale))
+            lines.append("%8.3fs %8.3fs %8.3fs  %-24s %-6s |%s" % (
+                step["offset"], step["seconds"], step["gap"], step["rpc"], "ok" if step["ok"] else "FAILED", bar))
+        for error in self.errors:
+            lines.append("ERROR %s" % error)
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "<Timeline %s %d RPCs in %.2fs>" % (self.name, len(self.rpcs), self.seconds)
+
+
+def load_timelines(paths):
+    """
+    Returns a Timeline per device for a list of logfile paths.
+    """
+    timelines = []
+    for base, group in group_logs(paths):
+        name = os.path.splitext(os.path.basename(base))[0]
+        timelines.append(Timeline(name, read_log(group)))
+    return timelines
+
+
+def summary(timelines):
+    """
+    Returns latency summaries across devices: {"rpc": {type: summary}, "session": ..., "rpc_time": ..., "script_time": ...}.
+    """
+    by_rpc = {}
+    failed = {}
+    for timeline in timelines:
+        for record in timeline.rpcs:
+            name = record.get("rpc") or "unknown"
+            by_rpc.setdefault(name, []).append(record["seconds"])
+            if not record.get("ok", True):
+                failed[name] = failed.get(name, 0) + 1
+    rpcs = {}
+    for name, values in by_rpc.items():
+        rpcs[name] = latency_summary(values)
+        rpcs[name]["failed"] = failed.get(name, 0)
+    return {
+        "devices": len(timelines),
+        "rpc": rpcs,
+        "session": latency_summary([timeline.seconds for timeline in timelines]),
+        "rpc_time": latency_summary([timeline.rpc_seconds for timeline in timelines]),
+        "script_time": latency_summary([timeline.script_seconds for timeline in timelines]),
+    }
+
+
+def summary_report(stats):
+    lines = ["%d devices" % stats["devices"],
+             "%-24s %6s %9s %9s %9s %9s %7s" % ("", "count", "p50", "p90", "p99", "max", "failed")]
+    for name in sorted(stats["rpc"]):
+        row = stats["rpc"][name]
+        lines.append("%-24s %6d %8.3fs %8.3fs %8.3fs %8.3fs %7d" % (
+            name, row["count"], row["p50"], row["p90"], row["p99"], row["max"], row["failed"]))
+    for name in ("session", "rpc_time", "script_time"):
+        row = stats[name]
+        lines.append("%-24s %6d %8.3fs %8.3fs %8.3fs %8.3fs" % (
+            name, row["count"], row["p50"], row["p90"], row["p99"], row["max"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise CliConf logs written with log_format=\"json\".")
+    parser.add_argument("logs", nargs="+", help="logfiles, one or more per device (rotated copies included)")
+    parser.add_argument("--timeline", action="store_true", help="also print each device's RPC timeline")
+    parser.add_argument("--json", action="store_true", help="print the timelines and summary as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        timelines = load_timelines(args.logs)
+    except (IOError, OSError) as err:
+        sys.stderr.write("timeline: %s\n" % err)
+        return 2
+
+    stats = summary(timelines)
+    if args.json:
+        print(json.dumps({
+            "summary": stats,
+            "devices": dict((timeline.name, {"seconds": timeline.seconds, "steps": timeline.steps(), "errors": timeline.errors})
+                            for timeline in timelines),
+        }, indent=1, sort_keys=True))
+        return 0
+    if args.timeline or len(timelines) == 1:
+        for timeline in timelines:
+            print(timeline.report())
+            print("")
+    print(summary_report(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Record RPC sessions to a trace file and replay them.
+
+With trace_file set, CliConf writes one JSON line per RPC: when it was
+sent (seconds from the start of the session), its type, how long the
+reply took, whether it succeeded, and the full request and reply text.
+A trace whose name ends in ".gz" is gzip compressed.
+
+replay() sends the requests of a trace to a device again, by default the
+bundled stand-in, keeping the recorded gaps between them at 1x, Nx or no
+delay at all, and compares the new latencies with the recorded ones.
+That reproduces a slow ZTP run offline and benchmarks library changes
+against real traffic:
+
+    python -m pyCliConf.trace replay /var/root/ztp-trace.jsonl.gz --speed 10
+    python -m pyCliConf.trace replay ztp-trace.jsonl.gz --speed 0 --command "ssh root@lab-qfx cli xml-mode netconf"
+    python -m pyCliConf.trace show ztp-trace.jsonl.gz
+"""
+import argparse
+import gzip
+import json
+import shlex
+import sys
+import threading
+import time
+
+from .metrics import rpc_name
+from .netconf import to_bytes, to_text
+
+TRACE_VERSION = 1
+
+
+def open_trace(path, mode):
+    """
+    Opens a trace file in binary mode, gzip compressed when path ends in ".gz".
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "b")
+    return open(path, mode + "b")
+
+
+class TraceWriter(object):
+    """
+    Writes a trace file. Safe to share between threads calling rpc() on one CliConf.
+
+    Args:
+        :path: trace file, compressed when it ends in ".gz". An existing file is replaced.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.file = open_trace(path, "w")
+        self.write({"trace": TRACE_VERSION, "started": self.started})
+
+    def write(self, record):
+        line = to_bytes(json.dumps(record, sort_keys=True, separators=(",", ":")) + "\n")
+        with self.lock:
+            self.file.write(line)
+
+    def record(self, request, reply, started, seconds):
+        """
+        Writes one RPC: its request text, the RpcReply (or None) and when it was sent and how long it took.
+        """
+        self.write({
+            "at": round(started - self.started, 6),
+            "rpc": rpc_name(request),
+            "seconds": round(seconds, 6),
+            "ok": reply is not None and reply.ok,
+            "request": request,
+            "reply": reply.raw if reply is not None else None,
+        })
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_trace(path):
+    """
+    Yields the RPC records of a trace file in the order they were sent.
+    """
+    with open_trace(path, "r") as handle:
+        for line in handle:
+            record = json.loads(to_text(line))
+            if "request" in record:
+                yield record
+
+
+class ReplayResult(object):
+    """
+    Recorded and replayed latencies of every RPC in a trace.
+
+    Attributes:
+        :rpcs: list of (rpc type, recorded seconds, replayed seconds, replayed ok).
+        :recorded: duration of the recorded session in seconds.
+        :seconds: wall time of the replay.
+        :speed: replay speed used.
+    """
+    def __init__(self, speed):
+        self.rpcs = []
+        self.recorded = 0.0
+        self.seconds = 0.0
+        self.speed = speed
+
+    @property
+    def failed(self):
+        return len([rpc for rpc in self.rpcs if not rpc[3]])
+
+    def summary(self):
+        """
+        Returns {rpc type: {"recorded": latency summary, "replayed": latency summary}}.
+        """
+        from .fleet import latency_summary
+
+        grouped = {}
+        for name, recorded, replayed, ok in self.rpcs:
+            entry = grouped.setdefault(name, ([], []))
+            entry[0].append(recorded)
+            entry[1].append(replayed)
+        return dict((name, {"recorded": latency_summary(values[0]), "replayed": latency_summary(values[1])})
+                    for name, values in grouped.items())
+
+    def report(self):
+        lines = ["%d RPCs replayed in %.2fs at %s (recorded session %.2fs), %d failed" % (
+            len(self.rpcs), self.seconds, "%gx" % self.speed if self.speed else "full speed", self.recorded, self.failed),
+            "%-26s %6s %12s %12s %12s %12s" % ("rpc", "count", "rec p50", "replay p50", "rec max", "replay max")]
+        for name, stats in sorted(self.summary().items()):
+            lines.append("%-26s %6d %11.3fs %11.3fs %11.3fs %11.3fs" % (
+                name, stats["recorded"]["count"], stats["recorded"]["p50"], stats["replayed"]["p50"],
+                stats["recorded"]["max"], stats["replayed"]["max"]))
+        return "\n".join(lines)
+
+
+def replay(path, transport=None, speed=1.0, logfile="/var/tmp/pycliconf-replay.log"):
+    """
+    Sends every request of a trace to a device and times the replies.
+
+    Args:
+        :path: trace file written with CliConf(trace_file=...).
+        :transport: transport to replay against. Defaults to a new FakeDeviceTransport.
+        :speed: 1.0 keeps the recorded gaps between RPCs, 10 replays ten times faster, 0 sends each RPC as soon as the previous reply arrives. Defaults to 1.0.
+        :logfile: logfile of the replay session.
+
+    Returns a ReplayResult.
+    """
+    from .pyCliConf import CliConf
+    from .transport import FakeDeviceTransport
+
+    result = ReplayResult(speed)
+    dev = CliConf(logfile=logfile, transport=transport or FakeDeviceTransport())
+    started = time.time()
+    try:
+        for record in read_trace(path):
+            result.recorded = max(result.recorded, record["at"] + record["seconds"])
+            if speed:
+                delay = record["at"] / speed - (time.time() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.time()
+            reply = dev.rpc(record["request"])
+            result.rpcs.append((record["rpc"], record["seconds"], time.time() - sent, reply is not None and reply.ok))
+            if reply is None:
+                break
+    finally:
+        result.seconds = time.time() - started
+        dev.session.close()
+        dev.logfile.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or replay a pyCliConf RPC trace.")
+    commands = parser.add_subparsers(dest="action")
+    show = commands.add_parser("show", help="summarize a trace")
+    show.add_argument("trace")
+    play = commands.add_parser("replay", help="send a trace to a device again")
+    play.add_argument("trace")
+    play.add_argument("--speed", type=float, default=1.0, help="replay speed: 1 as recorded, N times faster, 0 for no delay (default: 1)")
+    play.add_argument("--command", default=None, help="command giving a NETCONF session (default: the bundled stand-in device)")
+    play.add_argument("--latency", type=float, default=0.0, help="per-RPC latency of the stand-in device")
+    play.add_argument("--commit-time", type=float, default=0.0, help="commit time of the stand-in device")
+    play.add_argument("--logfile", default="/var/tmp/pycliconf-replay.log", help="replay session logfile")
+    args = parser.parse_args(argv)
+
+    if args.action == "show":
+        from .fleet import latency_summary
+
+        grouped = {}
+        count = 0
+        for record in read_trace(args.trace):
+            grouped.setdefault(record["rpc"], []).append(record["seconds"])
+            count += 1
+        print("%d RPCs" % count)
+        for name, values in sorted(grouped.items()):
+            stats = latency_summary(values)
+            print("%-26s %6d  p50 %8.3fs  max %8.3fs  total %8.3fs" % (name, stats["count"], stats["p50"], stats["max"], sum(values)))
+        return 0
+
+    from .transport import FakeDeviceTransport, ProcessTransport
+    if args.command:
+        transport = ProcessTransport(shlex.split(args.command))
+    else:
+        transport = FakeDeviceTransport(latency=args.latency, commit_time=args.commit_time)
+    result = replay(args.trace, transport=transport, speed=args.speed, logfile=args.logfile)
+    print(result.report())
+    return 0 if not result.failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
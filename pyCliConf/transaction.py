@@ -0,0 +1,134 @@
+"""
+Batch many configuration fragments into one load and one commit.
+"""
+from .exceptions import TransactionError
+
+
+class Transaction(object):
+    """
+    Buffers configuration fragments and applies them as a single change.
+
+    Fragments of the same format are joined into one payload, so the
+    whole block costs one <load-configuration> RPC per format used
+    (normally just one) and a single <commit>. If loading or committing
+    fails the candidate configuration is discarded, so nothing
+    half-applied is left behind. If the block raises, nothing is sent.
+
+    Usually created through CliConf.transaction().
+
+    Args:
+        :dev: CliConf instance the transaction runs on.
+        :action: Configuration action used for "text" and "xml" fragments. Defaults to "merge". "set" fragments always load with action "set".
+        :commit: Commit when the block exits. Defaults to True.
+
+    Attributes:
+        :replies: RpcReply objects for the load and commit RPCs that were sent.
+
+    Example:
+
+    .. code-block:: python
+
+        from pyCliConf import CliConf
+
+        dev = CliConf()
+        with dev.transaction(action="merge") as tx:
+            tx.load_config(cfg_string="set system host-name foo", cfg_format="set")
+            tx.load_config(cfg_string="set system ntp server 10.0.0.3", cfg_format="set")
+            tx.load_config_template(config_template, config_vars)
+        dev.close()
+    """
+    def __init__(self, dev, action="merge", commit=True):
+        self.dev = dev
+        self.action = action
+        self.commit = commit
+        self.fragments = {}
+        self.formats = []
+        self.replies = []
+
+    def load_config(self, cfg_string, cfg_format="text"):
+        """
+        Buffers a configuration fragment.
+
+        Args:
+            :cfg_string: string containing valid Junos configuration syntax
+            :cfg_format: "text", "xml" or "set". Defaults to "text", or "set" when the transaction action is "set".
+        """
+        if self.action == "set":
+            cfg_format = "set"
+        if cfg_format not in ["text", "xml", "set"]:
+            raise TransactionError("Transaction Error - Unknown config format: %r" % cfg_format)
+        if cfg_format not in self.fragments:
+            self.fragments[cfg_format] = []
+            self.formats.append(cfg_format)
+        self.fragments[cfg_format].append(cfg_string.strip())
+
+    def load_config_template(self, template, template_vars, cfg_format="text"):
+        """
+        Renders a Jinja2 template and buffers the result as a fragment.
+        """
+        rendered = self.dev.render_template(template, template_vars)
+        if rendered is None:
+            raise TransactionError("Transaction Error - template failed to render")
+        self.load_config(rendered, cfg_format=cfg_format)
+
+    def payloads(self):
+        """
+        Returns a list of (cfg_format, merged cfg_string) in the order formats were first used.
+        """
+        return [(cfg_format, "\n".join(self.fragments[cfg_format])) for cfg_format in self.formats]
+
+    def apply(self):
+        """
+        Sends the buffered fragments and commits them.
+
+        Raises TransactionError, sending nothing, if a payload fails local
+        validation, and after discarding the candidate if any RPC fails.
+        """
+        rpcs = []
+        for cfg_format, cfg_string in self.payloads():
+            action = "set" if cfg_format == "set" else self.action
+            if not self.dev._validate(cfg_string, cfg_format, action):
+                self.fragments = {}
+                self.formats = []
+                raise TransactionError("Transaction Error - configuration failed validation, nothing sent")
+            rpcs.append(self.dev._load_rpc(cfg_string, False, cfg_format, action))
+        if not rpcs:
+            return
+
+        self.dev.log("Transaction: loading %d fragments in %d RPCs" % (sum(len(f) for f in self.fragments.values()), len(rpcs)))
+        if len(rpcs) == 1:
+            replies = [self.dev.rpc(rpcs[0])]
+        else:
+            replies = self.dev.rpc_pipeline(rpcs)
+        self.replies.extend(replies)
+        for reply in replies:
+            if not self.dev.check_reply(reply, "Transaction Load Error"):
+                self.rollback()
+                raise TransactionError("Transaction Error - load failed, changes discarded", reply)
+
+        if self.commit:
+            reply = self.dev.commit()
+            self.replies.append(reply)
+            if reply is None or not reply.ok:
+                self.rollback()
+                raise TransactionError("Transaction Error - commit failed, changes discarded", reply)
+
+    def rollback(self):
+        """
+        Discards the candidate configuration and the buffered fragments.
+        """
+        self.fragments = {}
+        self.formats = []
+        self.dev.discard_changes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.dev.log("Transaction aborted, nothing sent: %r" % exc_value, level="error")
+            self.fragments = {}
+            self.formats = []
+            return False
+        self.apply()
+        return False
@@ -0,0 +1,153 @@
+"""
+Transports carry the framed NETCONF stream between CliConf and a device.
+
+CliConf only needs four operations from a transport: open, write, read
+and close; readable() lets it stop waiting for a device that never answers. The default CliTransport starts "cli xml-mode netconf" on the
+box, as CliConf always has. ProcessTransport runs any other command that
+speaks the same dialect over its stdin/stdout, and FakeDeviceTransport
+starts the bundled stand-in device so the library can be exercised and
+measured away from a switch.
+"""
+import os
+import select
+import subprocess
+import sys
+
+CLI_COMMAND = ['/usr/sbin/cli', 'xml-mode', 'netconf']
+
+
+class Transport(object):
+    """
+    Base class for CliConf transports.
+    """
+    def open(self, stderr=None):
+        """
+        Start the session. :stderr: is where diagnostics from the far end should go.
+        """
+        raise NotImplementedError
+
+    def write(self, data):
+        """
+        Write bytes to the session.
+        """
+        raise NotImplementedError
+
+    def read(self, size):
+        """
+        Return up to :size: bytes as soon as any are available, or an empty string at end of stream.
+        """
+        raise NotImplementedError
+
+    def readable(self, timeout):
+        """
+        Return True once read() would return without blocking, or False after :timeout: seconds. Defaults to True, for transports that cannot tell.
+        """
+        return True
+
+    def close(self):
+        """
+        Shut the session down and release its resources.
+        """
+        raise NotImplementedError
+
+    def abort(self):
+        """
+        Tear the session down immediately, unblocking any pending read. Defaults to close().
+        """
+        self.close()
+
+
+class ProcessTransport(Transport):
+    """
+    Runs a local command and talks NETCONF over its stdin and stdout.
+
+    Args:
+        :command: list containing the command and its arguments.
+    """
+    def __init__(self, command):
+        self.command = list(command)
+        self.process = None
+
+    def open(self, stderr=None):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def read(self, size):
+        return os.read(self.process.stdout.fileno(), size)
+
+    def readable(self, timeout):
+        ready = select.select([self.process.stdout.fileno()], [], [], timeout)[0]
+        return bool(ready)
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        finally:
+            self.process.wait()
+            self.process.stdout.close()
+
+    def abort(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.command)
+
+
+class CliTransport(ProcessTransport):
+    """
+    The Junos "cli xml-mode netconf" session. This is the CliConf default.
+    """
+    def __init__(self, command=None):
+        ProcessTransport.__init__(self, command or CLI_COMMAND)
+
+
+class FakeDeviceTransport(ProcessTransport):
+    """
+    Starts the bundled stand-in device (pyCliConf/fakedevice.py).
+
+    Args:
+        :latency: seconds added to every RPC reply. Defaults to 0.
+        :commit_time: seconds a <commit> takes. Defaults to 0.
+        :fail_rate: probability (0.0 - 1.0) that any RPC returns an <rpc-error>. Defaults to 0.
+        :fail_on: list of RPC names (eg ["commit"]) that always return an <rpc-error>.
+        :seed: random seed for fail_rate, so failures are reproducible.
+        :version: Junos version the stand-in reports in <get-software-information>. Defaults to its built-in one.
+        :python: interpreter used to run the stand-in. Defaults to the current one.
+
+    Example:
+
+    .. code-block:: python
+
+        from pyCliConf import CliConf
+        from pyCliConf.transport import FakeDeviceTransport
+
+        dev = CliConf(logfile="/tmp/ztp-log.txt", transport=FakeDeviceTransport(commit_time=2))
+        dev.load_config(cfg_string="set system host-name foo", action="set")
+        dev.commit()
+        dev.close()
+    """
+    def __init__(self, latency=0, commit_time=0, fail_rate=0, fail_on=None, seed=None, python=None, version=None):
+        command = [python or sys.executable, fake_device_path(),
+                   '--latency', str(latency),
+                   '--commit-time', str(commit_time),
+                   '--fail-rate', str(fail_rate)]
+        for name in fail_on or []:
+            command.extend(['--fail-on', name])
+        if seed is not None:
+            command.extend(['--seed', str(seed)])
+        if version is not None:
+            command.extend(['--version', version])
+        ProcessTransport.__init__(self, command)
+
+
+def fake_device_path():
+    """
+    Path of the stand-in device script shipped with the package.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fakedevice.py')
@@ -0,0 +1,328 @@
+"""
+Check configuration locally before it is sent to the device.
+
+A malformed payload used to show up only as a failed load or commit on
+the device, often at the end of a long ZTP attempt. validate() tokenizes
+"set" and curly-brace "text" configuration and reports:
+
+    - errors: unbalanced braces or brackets, unterminated quotes or
+      comments, statements missing their ";", unknown set verbs
+    - warnings: duplicate statements, a set line later removed by a
+      delete in the same payload, and different values for the same
+      single-valued statement (host-name, description, vlan-id, ...)
+
+CliConf.load_config() runs it on every cfg_string unless validate=False
+and does not send a payload with errors; so do pipelined manifest loads
+and transactions. Canonical set lines and text lines without quotes,
+comments or more than one statement take a fast path; quoted lines are
+only scanned character by character when they contain a backslash. A
+500k-line configuration validates in about a second.
+
+escape() makes text safe to embed in the <load-configuration> envelope.
+"""
+import re
+
+from .diff import SetIndex, normalize, split_words
+from .netconf import string_types
+
+SET_VERBS = frozenset(["set", "delete", "activate", "deactivate", "annotate", "insert", "rename", "copy",
+                       "protect", "unprotect", "replace", "edit", "top", "up", "exit", "wildcard"])
+
+# Statements that take exactly one value, so two different values in one payload conflict.
+SINGLE_VALUED = frozenset(["host-name", "domain-name", "description", "vlan-id", "mtu", "time-zone",
+                           "encrypted-password", "location", "native-vlan-id", "router-id", "autonomous-system"])
+
+MAX_PROBLEMS = 100
+
+_token = re.compile(r'"(?:[^"\\]|\\.)*"|"(?:[^"\\]|\\.)*$|/\*[\s\S]*?\*/|/\*[\s\S]*$|#[^\n]*|[{};\[\]]|[^\s{};\[\]"]+')
+_slow = re.compile(r'["#\[\]]|/\*')
+_closed = re.compile(r'(?:[^"\\]|\\(?:[\s\S]|$)|"(?:[^"\\]|\\(?:[\s\S]|$))*")*$')
+
+
+def escape(text, quote=False):
+    """
+    Returns text with &, < and > escaped for embedding in an XML element, and " too when quote is set (for attribute values).
+    """
+    if isinstance(text, bytes) and not isinstance(text, str):
+        text = text.replace(b"&", b"&amp;").replace(b"<", b"&lt;").replace(b">", b"&gt;")
+        return text.replace(b'"', b"&quot;") if quote else text
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    if quote and '"' in text:
+        text = text.replace('"', "&quot;")
+    return text
+
+
+class ValidationResult(object):
+    """
+    Problems found in a configuration.
+
+    Attributes:
+        :errors: list of (line number, message) that would make the load fail.
+        :warnings: list of (line number, message) worth a look but not fatal.
+        :lines: number of lines checked.
+    """
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+        self.lines = 0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def error(self, line, message):
+        if len(self.errors) < MAX_PROBLEMS:
+            self.errors.append((line, message))
+
+    def warning(self, line, message):
+        if len(self.warnings) < MAX_PROBLEMS:
+            self.warnings.append((line, message))
+
+    def messages(self):
+        """
+        Returns every problem as "line N: [error|warning] message", errors first.
+        """
+        return (["line %d: error: %s" % problem for problem in self.errors] +
+                ["line %d: warning: %s" % problem for problem in self.warnings])
+
+    def __repr__(self):
+        return "<ValidationResult %d lines, %d errors, %d warnings>" % (self.lines, len(self.errors), len(self.warnings))
+
+
+def validate(config, cfg_format="text", action="merge"):
+    """
+    Validates configuration without contacting the device.
+
+    Args:
+        :config: configuration as a string or list of lines.
+        :cfg_format: "text", "set" or "xml". XML is left to the XML parser and always passes.
+        :action: configuration action; "set" means set format whatever cfg_format says.
+
+    Returns a ValidationResult.
+    """
+    if action == "set" or cfg_format == "set":
+        return validate_set(config)
+    if cfg_format == "text":
+        if isinstance(config, string_types):
+            config = config.splitlines()
+        return validate_text(config)
+    return ValidationResult()
+
+
+def validate_set(config):
+    """
+    Validates "set" style configuration, as a string or list of lines.
+    """
+    if not isinstance(config, string_types):
+        config = "\n".join(config)
+    # Without quotes, tabs, runs of spaces or trailing spaces every "set " line is already canonical.
+    canonical = not ('"' in config or "\t" in config or "  " in config or " \n" in config or config.endswith(" "))
+
+    result = ValidationResult()
+    statements = {}
+    single = {}
+    deletes = []
+    number = 0
+    for number, line in enumerate(config.splitlines(), 1):
+        if canonical and line[:4] == "set ":
+            verb = "set"
+            statement = line[4:]
+        elif '"' in line:
+            if not _quotes_closed(line):
+                result.error(number, "unterminated quoted string")
+                continue
+            line = normalize(line)
+            if line is None:
+                continue
+            verb, _, statement = line.partition(" ")
+        else:
+            words = line.split()
+            if not words or words[0][0] == "#":
+                continue
+            verb = words[0]
+            statement = " ".join(words[1:])
+
+        if verb not in SET_VERBS:
+            result.error(number, "unknown statement %r, expected set, delete, ..." % verb)
+            continue
+        if verb == "set":
+            if not statement:
+                result.error(number, "set without a statement")
+                continue
+            if statement in statements:
+                result.warning(number, "duplicate of line %d" % statements[statement])
+                continue
+            statements[statement] = number
+            if '"' in statement:
+                # A quoted value may hold spaces: take the last word, not the text after the last space.
+                value = split_words(statement)[-1]
+                key = statement[:len(statement) - len(value)].rstrip()
+            else:
+                cut = statement.rfind(" ")
+                key = statement[:cut]
+                value = statement[cut + 1:]
+            leaf = key[key.rfind(" ") + 1:]
+            if leaf in SINGLE_VALUED and leaf != key:
+                previous = single.get(key)
+                if previous is not None and previous[0] != value:
+                    result.warning(number, "%s conflicts with line %d (%s)" % (leaf, previous[1], previous[0]))
+                single[key] = (value, number)
+        elif verb == "delete":
+            if not statement:
+                result.error(number, "delete without a statement")
+                continue
+            deletes.append((number, statement))
+
+    if deletes:
+        index = SetIndex(statements)
+        for number_deleted, prefix in deletes:
+            for statement in index.matching(prefix):
+                if statements[statement] < number_deleted:
+                    result.warning(number_deleted, "deletes line %d set earlier in this configuration" % statements[statement])
+                    break
+    result.lines = number
+    return result
+
+
+def validate_text(lines):
+    """
+    Validates curly-brace "text" configuration.
+    """
+    result = ValidationResult()
+    stack = []
+    path = ""
+    seen = {}
+    pending = []
+    pending_line = 0
+    brackets = 0
+    carry = ""
+    carry_line = 0
+    number = 0
+    for number, line in enumerate(lines, 1):
+        if carry:
+            line = carry + "\n" + line
+            carry = ""
+        else:
+            carry_line = number
+
+        stripped = line.strip()
+        if not stripped:
+            continue
+        last = stripped[-1]
+        plain = _slow.search(stripped) is None
+        if plain and stripped.count("{") + stripped.count("}") + stripped.count(";") == 1 and last in "{};":
+            if pending:
+                tokens = stripped[:-1].split() + [last]
+            elif last == "}":
+                if stripped != "}":
+                    result.error(number, "missing ';' before '}'")
+                tokens = ["}"]
+            elif last == ";":
+                words = stripped[:-1].split()
+                if not words:
+                    continue
+                key = path + "\0" + " ".join(words)
+                if key in seen:
+                    result.warning(number, "duplicate of line %d" % seen[key])
+                else:
+                    seen[key] = number
+                continue
+            else:
+                words = stripped[:-1].split()
+                if not words:
+                    result.error(number, "'{' without a statement")
+                    words = ["?"]
+                stack.append((path, number))
+                path = path + "\0" + " ".join(words)
+                continue
+        elif plain:
+            tokens = stripped.replace("{", " { ").replace("}", " } ").replace(";", " ; ").split()
+        else:
+            tokens = _token.findall(line)
+            if tokens and _unterminated(tokens[-1]):
+                # A quoted string or comment running onto the next line.
+                carry = line
+                continue
+
+        for token in tokens:
+            char = token[0]
+            if char == "#" or token.startswith("/*"):
+                continue
+            if token == "[":
+                brackets += 1
+                pending.append(token)
+            elif token == "]":
+                if brackets == 0:
+                    result.error(number, "']' without '['")
+                else:
+                    brackets -= 1
+                pending.append(token)
+            elif token == ";":
+                if brackets:
+                    result.error(number, "';' inside '[ ]' list")
+                    brackets = 0
+                if pending:
+                    key = path + "\0" + " ".join(pending)
+                    if key in seen:
+                        result.warning(pending_line, "duplicate of line %d" % seen[key])
+                    else:
+                        seen[key] = pending_line
+                pending = []
+            elif token == "{":
+                if brackets:
+                    result.error(number, "'{' inside '[ ]' list")
+                    brackets = 0
+                if not pending:
+                    result.error(number, "'{' without a statement")
+                    pending = ["?"]
+                stack.append((path, number))
+                path = path + "\0" + " ".join(pending)
+                pending = []
+            elif token == "}":
+                if pending:
+                    result.error(pending_line, "missing ';' after %r" % " ".join(pending))
+                    pending = []
+                if not stack:
+                    result.error(number, "'}' without '{'")
+                else:
+                    path = stack.pop()[0]
+            else:
+                if not pending:
+                    pending_line = carry_line
+                pending.append(token)
+
+    if carry:
+        result.error(carry_line, "unterminated quoted string or comment")
+    if pending:
+        result.error(pending_line, "missing ';' after %r" % " ".join(pending))
+    if brackets:
+        result.error(number, "'[' without ']'")
+    for unclosed_path, opened in stack[-MAX_PROBLEMS:]:
+        result.error(opened, "'{' is never closed")
+    result.lines = number
+    return result
+
+
+def _unterminated(token):
+    """
+    Returns True for a quoted string or /* comment */ token that runs to the end of the text unclosed.
+    """
+    if token[0] == '"':
+        return len(token) == 1 or not _quotes_closed(token)
+    if token.startswith("/*"):
+        return len(token) < 4 or not token.endswith("*/")
+    return False
+
+
+def _quotes_closed(line):
+    """
+    Returns True when every double quote in line is closed, ignoring escaped quotes.
+    """
+    if "\\" not in line:
+        return line.count('"') % 2 == 0
+    return _closed.match(line) is not None
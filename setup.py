@@ -1,7 +1,32 @@
 #!/usr/bin/env python
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+from setuptools.command.install_lib import install_lib
 import pyCliConf
 import os
+import sys
+
+# pyCliConf/aio.py uses async/await: it is only imported on Python 3.5 and
+# later, and must not be byte-compiled by older interpreters, which report
+# it as a SyntaxError. pip may still print that SyntaxError when installing
+# on Python 2.7; it is harmless, the module is never imported there.
+PY3_ONLY = [os.path.join('pyCliConf', 'aio.py')]
+
+
+def skip_py3_only(files):
+    if sys.version_info >= (3, 5):
+        return files
+    return [path for path in files if not any(path.endswith(name) for name in PY3_ONLY)]
+
+
+class BuildPy(build_py):
+    def byte_compile(self, files):
+        build_py.byte_compile(self, skip_py3_only(files))
+
+
+class InstallLib(install_lib):
+    def byte_compile(self, files):
+        install_lib.byte_compile(self, skip_py3_only(files))
 
 # on_rtd is whether we are on readthedocs.org, this line of code grabbed from docs.readthedocs.org
 on_rtd = os.environ.get('READTHEDOCS', None) == 'True'
@@ -23,6 +48,7 @@ setup(
     author_email='rcameron@juniper.net',
     packages=['pyCliConf'],
     include_package_data=True,
+    cmdclass={'build_py': BuildPy, 'install_lib': InstallLib},
     entry_points = {
         'console_scripts' : ['cliconf=pyCliConf.command_line:main'],
     },
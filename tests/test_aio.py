@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from pyCliConf.transport import FakeDeviceTransport
+
+if sys.version_info >= (3, 5):
+    import asyncio
+
+    from pyCliConf.aio import AsyncCliConf
+
+SOFTWARE = "<rpc><get-software-information/></rpc>]]>]]>"
+INVENTORY = "<rpc><get-chassis-inventory/></rpc>]]>]]>"
+
+
+@unittest.skipIf(sys.version_info < (3, 5), "AsyncCliConf needs Python 3.5 or later")
+class AsyncCliConfTest(unittest.TestCase):
+    # Coroutines are driven with run_until_complete(), so this module still imports on Python 2.
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.loop = asyncio.new_event_loop()
+        self.dev = AsyncCliConf(command=FakeDeviceTransport().command, logfile=os.path.join(self.tmp, "ztp.log"))
+        self.wait(self.dev.open())
+
+    def tearDown(self):
+        self.wait(self.dev.close())
+        self.loop.close()
+        shutil.rmtree(self.tmp)
+
+    def wait(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_load_and_commit(self):
+        self.assertTrue(self.wait(self.dev.load_config(cfg_string="set system host-name leaf1", action="set")).ok)
+        self.assertTrue(self.wait(self.dev.commit()).ok)
+
+    def test_discarded_reply_not_returned_to_next_rpc(self):
+        self.assertIsNone(self.wait(self.dev.rpc(SOFTWARE, reply=False)))
+        self.assertIsNone(self.wait(self.dev.rpc(SOFTWARE, reply=False)))
+        self.assertIn("<chassis-inventory>", self.wait(self.dev.rpc(INVENTORY)).raw)
+        commit = self.wait(self.dev.commit())
+        self.assertTrue(commit.ok)
+        self.assertIn("<commit-results>", commit.raw)
+
+
+if __name__ == "__main__":
+    unittest.main()
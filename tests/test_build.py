@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf.build import build, fingerprint, load_inventory
+from pyCliConf.template import JINJA_SUPPORT
+
+INVENTORY = dict(("leaf%d" % number, {"hostname": "leaf%d" % number}) for number in range(4))
+
+
+class InputTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_unicode_paths(self):
+        path = os.path.join(self.tmp, "inventory.json")
+        with open(path, "w") as handle:
+            json.dump(INVENTORY, handle)
+        self.assertEqual(load_inventory(u"%s" % path), sorted(INVENTORY.items()))
+        with open(os.path.join(self.tmp, "include.j2"), "w") as handle:
+            handle.write("set system domain-name example.net")
+        self.assertEqual(fingerprint("{{ hostname }}", u"%s" % self.tmp), fingerprint("{{ hostname }}", [self.tmp]))
+        self.assertNotEqual(fingerprint("{{ hostname }}", u"%s" % self.tmp), fingerprint("{{ hostname }}"))
+
+
+@unittest.skipUnless(JINJA_SUPPORT, "Jinja2 is not installed")
+class BuildTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = tempfile.mkdtemp()
+        os.environ["PYCLICONF_CACHE_DIR"] = self.cache
+
+    def tearDown(self):
+        del os.environ["PYCLICONF_CACHE_DIR"]
+        shutil.rmtree(self.tmp)
+        shutil.rmtree(self.cache)
+
+    def test_render_then_unchanged(self):
+        result = build("set system host-name {{ hostname }}", INVENTORY, self.tmp, processes=2)
+        self.assertEqual(sorted(result.rendered), sorted(INVENTORY))
+        with open(os.path.join(self.tmp, "leaf1.conf")) as handle:
+            self.assertEqual(handle.read(), "set system host-name leaf1")
+        result = build("set system host-name {{ hostname }}", INVENTORY, self.tmp, processes=2)
+        self.assertEqual(sorted(result.unchanged), sorted(INVENTORY))
+
+    def test_syntax_error_fails_every_device(self):
+        for processes in (1, 2):
+            result = build("set system host-name {{ hostname }", INVENTORY, self.tmp, processes=processes)
+            self.assertFalse(result.ok)
+            self.assertEqual(sorted(result.failed), sorted(INVENTORY))
+            self.assertIn("template failed to compile", result.failed["leaf0"])
+
+    def test_failed_render_removes_old_artifact(self):
+        template = "set system host-name {{ hostname }}{% if broken %}{{ 1 // 0 }}{% endif %}"
+        self.assertTrue(build(template, INVENTORY, self.tmp, processes=1).ok)
+        inventory = dict(INVENTORY, leaf1={"hostname": "leaf1", "broken": True})
+        for processes in (1, 2):
+            result = build(template, inventory, self.tmp, processes=processes)
+            self.assertEqual(list(result.failed), ["leaf1"])
+            self.assertFalse(os.path.exists(os.path.join(self.tmp, "leaf1.conf")))
+            self.assertTrue(os.path.exists(os.path.join(self.tmp, "leaf0.conf")))
+            with open(os.path.join(self.tmp, "manifest.json")) as handle:
+                self.assertNotIn("leaf1", json.load(handle))
+
+    def test_compile_failure_removes_old_artifacts(self):
+        self.assertTrue(build("set system host-name {{ hostname }}", INVENTORY, self.tmp, processes=1).ok)
+        build("set system host-name {{ hostname }} {{ domain }}{% if %}", INVENTORY, self.tmp, processes=1)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["manifest.json"])
+
+    def test_force_removes_devices_left_inventory(self):
+        template = "set system host-name {{ hostname }}"
+        self.assertTrue(build(template, INVENTORY, self.tmp, processes=1).ok)
+        inventory = dict(INVENTORY)
+        del inventory["leaf3"]
+        result = build(template, inventory, self.tmp, processes=1, force=True)
+        self.assertEqual(sorted(result.rendered), sorted(inventory))
+        self.assertEqual(result.removed, ["leaf3"])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "leaf3.conf")))
+
+
+if __name__ == "__main__":
+    unittest.main()
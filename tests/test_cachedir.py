@@ -0,0 +1,64 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from pyCliConf.cachedir import cache_directory, private_directory
+from pyCliConf.exceptions import CacheDirectoryError
+from pyCliConf.template import JINJA_SUPPORT
+
+
+class PrivateDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_created_private(self):
+        path = private_directory(os.path.join(self.tmp, "cache"))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode) & 0o077, 0)
+        self.assertEqual(private_directory(path), path)
+
+    def test_default_per_user(self):
+        os.environ["PYCLICONF_CACHE_DIR"] = self.tmp
+        try:
+            self.assertEqual(cache_directory("packages"), os.path.join(self.tmp, "pycliconf-packages-%d" % os.getuid()))
+        finally:
+            del os.environ["PYCLICONF_CACHE_DIR"]
+        self.assertTrue(cache_directory("packages").startswith("/var/tmp/"))
+
+    def test_writable_by_others_refused(self):
+        path = os.path.join(self.tmp, "cache")
+        os.mkdir(path)
+        os.chmod(path, 0o777)
+        self.assertRaises(CacheDirectoryError, private_directory, path)
+
+    def test_symlink_and_file_refused(self):
+        target = private_directory(os.path.join(self.tmp, "target"))
+        os.symlink(target, os.path.join(self.tmp, "link"))
+        self.assertRaises(CacheDirectoryError, private_directory, os.path.join(self.tmp, "link"))
+        open(os.path.join(self.tmp, "file"), "w").close()
+        self.assertRaises(CacheDirectoryError, private_directory, os.path.join(self.tmp, "file"))
+
+    @unittest.skipUnless(os.getuid() == 0, "needs root to create a directory owned by another user")
+    def test_other_owner_refused(self):
+        path = os.path.join(self.tmp, "cache")
+        os.mkdir(path, 0o700)
+        os.chown(path, 65534, 65534)
+        self.assertRaises(CacheDirectoryError, private_directory, path)
+
+    @unittest.skipUnless(JINJA_SUPPORT, "Jinja2 is not installed")
+    def test_template_cache_skips_untrusted_bytecode_dir(self):
+        from pyCliConf.template import TemplateCache
+
+        path = os.path.join(self.tmp, "jinja")
+        os.mkdir(path)
+        os.chmod(path, 0o777)
+        self.assertIsNone(TemplateCache(bytecode_dir=path).bytecode_cache)
+        self.assertIsNotNone(TemplateCache(bytecode_dir=os.path.join(self.tmp, "own")).bytecode_cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
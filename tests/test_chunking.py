@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.chunking import ChunkSizer
+from pyCliConf.transport import FakeDeviceTransport
+
+LINES = ["set vlans v%d vlan-id %d" % (number, number) for number in range(1, 2501)]
+
+
+class ChunkSizerTest(unittest.TestCase):
+    def test_grows_and_shrinks_by_at_most_two(self):
+        sizer = ChunkSizer(initial=1000, minimum=100, maximum=20000, target=1.0)
+        self.assertEqual(sizer.update(1000, 0.1), 2000)
+        self.assertEqual(sizer.update(2000, 0.8), 2500)
+        self.assertEqual(sizer.update(2500, 10.0), 1250)
+        self.assertEqual(sizer.update(1250, 0), 2500)
+
+    def test_bounds(self):
+        self.assertEqual(ChunkSizer(initial=50, minimum=100).size, 100)
+        sizer = ChunkSizer(initial=1000, minimum=800, maximum=1500)
+        self.assertEqual(sizer.update(1000, 0.01), 1500)
+        self.assertEqual(sizer.update(1500, 100.0), 800)
+
+
+class ChunkedLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport())
+
+    def tearDown(self):
+        self.dev.close()
+        shutil.rmtree(self.tmp)
+
+    def test_empty_configuration(self):
+        for config in ("", "# nothing to load\n\n", []):
+            loaded = self.dev.load_config_chunked(config)
+            self.assertTrue(loaded.ok)
+            self.assertEqual((loaded.lines, loaded.sent, loaded.chunks, loaded.replies), (0, 0, [], []))
+
+    def test_chunk_boundaries(self):
+        progress = []
+        loaded = self.dev.load_config_chunked("\n".join(LINES), chunk_lines=1000, min_lines=1000, max_lines=1000,
+                                              progress=lambda load: progress.append(load.sent))
+        self.assertTrue(loaded.ok)
+        self.assertEqual([lines for lines, seconds in loaded.chunks], [1000, 1000, 500])
+        self.assertEqual(progress, [1000, 2000, 2500])
+        self.assertEqual((loaded.lines, loaded.sent, len(loaded.replies)), (2500, 2500, 4))
+        self.assertEqual(self.dev.get_config_set(), LINES)
+
+    def test_comments_and_blank_lines_skipped(self):
+        loaded = self.dev.load_config_chunked(["# vlans", ""] + LINES[:150] + ["   ", "  # end"], commit=False, chunk_lines=100)
+        self.assertEqual([lines for lines, seconds in loaded.chunks], [100, 50])
+        self.assertEqual(len(loaded.replies), 2)
+        self.assertEqual(self.dev.get_config_set(database="candidate"), LINES[:150])
+        self.assertEqual(self.dev.get_config_set(), [])
+
+    def test_failed_chunk_discards_candidate(self):
+        # Passes local validation, but the device rejects it.
+        lines = LINES[:1500] + ["activate vlans v1"] + LINES[1500:]
+        loaded = self.dev.load_config_chunked(lines, chunk_lines=1000, min_lines=1000, max_lines=1000)
+        self.assertFalse(loaded.ok)
+        self.assertEqual(loaded.sent, 1000)
+        self.assertEqual(len(loaded.chunks), 2)
+        self.assertEqual(len(loaded.replies), 2)
+        self.assertEqual(self.dev.get_config_set(database="candidate"), [])
+        self.assertEqual(self.dev.metrics()["histograms"].get("rpc.commit"), None)
+
+    def test_invalid_configuration_not_sent(self):
+        self.assertIsNone(self.dev.load_config_chunked(LINES[:10] + ['set system host-name "leaf1']))
+        self.assertEqual(self.dev.metrics()["counters"].get("rpcs", 0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
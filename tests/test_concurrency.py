@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.pool import SessionPool, read_only
+from pyCliConf.transport import FakeDeviceTransport
+
+SOFTWARE = "<rpc><get-software-information/></rpc>]]>]]>"
+INVENTORY = "<rpc><get-chassis-inventory/></rpc>]]>]]>"
+
+
+def load_set(lines):
+    return ('<rpc><load-configuration action="set" format="text">'
+            '<configuration-set>%s</configuration-set></load-configuration></rpc>]]>]]>' % "\n".join(lines))
+
+
+class ConcurrentRpcTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(latency=0.005))
+        self.assertTrue(self.dev.load_config(cfg_string="set system host-name leaf1", action="set").ok)
+        self.assertTrue(self.dev.commit().ok)
+
+    def tearDown(self):
+        self.dev.close()
+        shutil.rmtree(self.tmp)
+
+    def run_threads(self, *targets):
+        failures = []
+
+        def guarded(target):
+            try:
+                target()
+            except Exception as err:
+                failures.append(err)
+
+        threads = [threading.Thread(target=guarded, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(failures, [])
+
+    def test_replies_reach_their_callers(self):
+        def software():
+            for attempt in range(10):
+                reply = self.dev.rpc(SOFTWARE)
+                assert reply.ok and "<junos-version>" in reply.raw, reply.raw
+
+        def inventory():
+            for attempt in range(10):
+                reply = self.dev.rpc(INVENTORY)
+                assert reply.ok and "<chassis-inventory>" in reply.raw, reply.raw
+
+        def config():
+            for attempt in range(5):
+                tree = self.dev.get_config(filter="system")
+                assert tree.ok and tree.find("system/host-name").text == "leaf1", tree
+
+        def pipeline():
+            for attempt in range(5):
+                replies = self.dev.rpc_pipeline([SOFTWARE, INVENTORY, SOFTWARE])
+                assert [reply.ok for reply in replies] == [True] * 3, replies
+                assert "<junos-version>" in replies[0].raw and "<chassis-inventory>" in replies[1].raw
+
+        self.run_threads(software, inventory, config, pipeline)
+
+    def test_bytes_rpcs(self):
+        reply = self.dev.rpc(SOFTWARE.encode("utf-8"))
+        self.assertTrue(reply.ok)
+        self.assertIn("<junos-version>", reply.raw)
+        replies = self.dev.rpc_pipeline([SOFTWARE.encode("utf-8"), INVENTORY.encode("utf-8")])
+        self.assertTrue(all(reply.ok for reply in replies))
+        self.assertIn("<chassis-inventory>", replies[1].raw)
+
+    def test_discarded_reply_is_not_delivered(self):
+        self.assertIsNone(self.dev.rpc(load_set(["set system host-name leaf2"]), reply=False))
+        reply = self.dev.rpc(SOFTWARE)
+        self.assertIn("<junos-version>", reply.raw)
+        self.assertIn("set system host-name leaf2", self.dev.get_config_set(database="candidate"))
+
+    def test_discarded_replies_among_threads(self):
+        def loads():
+            for vlan in range(1, 11):
+                self.dev.rpc(load_set(["set vlans v%d vlan-id %d" % (vlan, vlan)]), reply=False)
+
+        def reads():
+            for attempt in range(10):
+                reply = self.dev.rpc(SOFTWARE)
+                assert "<junos-version>" in reply.raw, reply.raw
+
+        self.run_threads(loads, reads)
+        candidate = self.dev.get_config_set(database="candidate")
+        self.assertEqual(len([line for line in candidate if line.startswith("set vlans")]), 10)
+
+
+class SessionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pool = SessionPool(size=3, transport=FakeDeviceTransport, logfile=os.path.join(self.tmp, "ztp.log"))
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.tmp)
+
+    def test_sessions_opened_as_needed(self):
+        first = self.pool.acquire()
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(), first)
+        second = self.pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertIsNot(second, self.pool.config)
+        self.assertEqual(len(self.pool.sessions), 2)
+        self.pool.release(first)
+        self.pool.release(second)
+
+    def test_acquire_waits_for_release(self):
+        taken = [self.pool.acquire(), self.pool.acquire()]
+        waited = []
+        waiter = threading.Thread(target=lambda: waited.append(self.pool.acquire()))
+        waiter.start()
+        waiter.join(0.2)
+        self.assertTrue(waiter.is_alive())
+        self.pool.release(taken[1])
+        waiter.join(5)
+        self.assertEqual(waited, [taken[1]])
+        self.pool.release(taken[0])
+        self.pool.release(waited[0])
+
+    def test_reads_pooled_writes_pinned(self):
+        self.assertEqual(self.pool.facts()["version"], "14.1X53-D15.2")
+        self.assertTrue(self.pool.rpc(SOFTWARE).ok)
+        self.assertTrue(self.pool.rpc(load_set(["set system host-name leaf1"])).ok)
+        self.assertTrue(self.pool.config.commit().ok)
+        # The pooled sessions talk to their own stand-in devices, only the configuration session was loaded.
+        self.assertEqual(self.pool.config.get_config_set(), ["set system host-name leaf1"])
+        self.assertIsNone(self.pool.get_config().find("system/host-name"))
+        self.assertEqual(len(self.pool.sessions), 1)
+        self.assertEqual(self.pool.idle.qsize(), 1)
+
+    def test_read_only(self):
+        self.assertTrue(read_only(SOFTWARE))
+        self.assertTrue(read_only(u"<rpc><get-chassis-inventory/></rpc>]]>]]>"))
+        self.assertTrue(read_only(b"<rpc><get-chassis-inventory/></rpc>]]>]]>"))
+        self.assertFalse(read_only(u"<rpc><commit-configuration/></rpc>]]>]]>"))
+        self.assertFalse(read_only(iter([SOFTWARE])))
+
+    def test_size_one_uses_configuration_session(self):
+        pool = SessionPool(size=1, transport=FakeDeviceTransport, logfile=os.path.join(self.tmp, "one.log"))
+        try:
+            self.assertIs(pool.acquire(), pool.config)
+            self.assertTrue(pool.rpc(SOFTWARE).ok)
+            self.assertEqual(pool.sessions, [])
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
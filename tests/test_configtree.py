@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from io import BytesIO
+
+from pyCliConf import CliConf
+from pyCliConf.configtree import parse_config, split_path, subtree_filter
+from pyCliConf.transport import FakeDeviceTransport
+
+REPLY = b"""<rpc-reply xmlns="urn:ietf:params:xml:ns:netconf:base:1.0" xmlns:junos="http://xml.juniper.net/junos/14.1X53/junos">
+<configuration junos:commit-user="root">
+    <system>
+        <host-name>leaf1</host-name>
+        <services><ssh/></services>
+    </system>
+    <interfaces>
+        <interface>
+            <name>ge-0/0/0</name>
+            <description>uplink to spine1</description>
+            <unit>
+                <name>0</name>
+                <family><inet><address><name>10.0.0.1/24</name></address></inet></family>
+            </unit>
+        </interface>
+        <interface>
+            <name>ge-0/0/1</name>
+        </interface>
+    </interfaces>
+    <vlans>
+        <vlan><name>v100</name><vlan-id>100</vlan-id></vlan>
+        <vlan><name>v200</name><vlan-id>200</vlan-id></vlan>
+    </vlans>
+</configuration>
+<rpc-error><error-severity>warning</error-severity><error-message>statement is deprecated</error-message></rpc-error>
+</rpc-reply>"""
+
+CONFIG = """set system host-name leaf1
+set interfaces ge-0/0/0 description uplink
+set interfaces ge-0/0/0 unit 0 family inet address 10.0.0.1/24
+set interfaces ge-0/0/1 unit 0 family ethernet-switching
+set vlans v100 vlan-id 100
+set vlans v200 vlan-id 200"""
+
+
+class ConfigTreeTest(unittest.TestCase):
+    def setUp(self):
+        self.tree = parse_config(BytesIO(REPLY))
+
+    def test_paths(self):
+        self.assertEqual(split_path("/interfaces/interface[ge-0/0/0]/unit[0]/"),
+                         [("interfaces", None), ("interface", "ge-0/0/0"), ("unit", "0")])
+        self.assertEqual(subtree_filter("policy-options/prefix-list[a&b]"),
+                         "<configuration><policy-options><prefix-list><name>a&amp;b</name></prefix-list></policy-options></configuration>")
+
+    def test_lookups(self):
+        tree = self.tree
+        self.assertTrue(tree.ok)
+        self.assertEqual(tree.warnings, ["statement is deprecated"])
+        self.assertEqual(tree.value("system/host-name"), "leaf1")
+        self.assertEqual(tree.value("interfaces/interface[ge-0/0/0]/description"), "uplink to spine1")
+        self.assertEqual(tree.find("interfaces/interface[ge-0/0/0]/unit[0]/family/inet/address[10.0.0.1/24]").key, "10.0.0.1/24")
+        self.assertIsNotNone(tree.find("system/services/ssh"))
+        self.assertEqual(tree.find("interfaces/interface[ge-0/0/1]").key, "ge-0/0/1")
+        self.assertIs(tree.find(""), tree.root)
+        self.assertIsNone(tree.find("interfaces/interface[ge-0/0/2]"))
+        self.assertIsNone(tree.find("routing-options/router-id"))
+        self.assertEqual(tree.value("system/location", "unknown"), "unknown")
+        self.assertIsNone(tree.value("interfaces"))
+
+    def test_list_keys_are_not_children(self):
+        interface = self.tree.find("interfaces/interface[ge-0/0/0]")
+        self.assertEqual([node.name for node in interface], ["description", "unit"])
+        self.assertIsNone(interface.child("name"))
+        self.assertEqual(len(self.tree), 17)
+
+    def test_findall(self):
+        self.assertEqual([node.text for node in self.tree.findall("vlans/vlan[*]/vlan-id")], ["100", "200"])
+        self.assertEqual([node.key for node in self.tree.findall("interfaces/interface")], ["ge-0/0/0", "ge-0/0/1"])
+        self.assertEqual([node.name for node in self.tree.findall("*")], ["system", "interfaces", "vlans"])
+        self.assertEqual(list(self.tree.findall("vlans/vlan[v300]")), [])
+
+    def test_errors(self):
+        tree = parse_config(BytesIO(b'<rpc-reply><rpc-error><error-severity>error</error-severity>'
+                                    b'<error-message>syntax error</error-message></rpc-error></rpc-reply>'))
+        self.assertFalse(tree.ok)
+        self.assertEqual(tree.errors, ["syntax error"])
+        self.assertEqual(len(tree), 0)
+
+
+class GetConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport())
+        self.assertTrue(self.dev.load_config(cfg_string=CONFIG, action="set").ok)
+        self.assertTrue(self.dev.commit().ok)
+
+    def tearDown(self):
+        self.dev.close()
+        shutil.rmtree(self.tmp)
+
+    def test_whole_configuration(self):
+        tree = self.dev.get_config()
+        self.assertEqual(tree.value("system/host-name"), "leaf1")
+        self.assertEqual(tree.value("interfaces/interface[ge-0/0/0]/description"), "uplink")
+        self.assertEqual([node.key for node in tree.findall("vlans/vlan")], ["v100", "v200"])
+
+    def test_filters(self):
+        tree = self.dev.get_config(filter="vlans")
+        self.assertEqual([node.name for node in tree.root], ["vlans"])
+        self.assertEqual(tree.value("vlans/vlan[v200]/vlan-id"), "200")
+
+        tree = self.dev.get_config(filter="interfaces/interface[ge-0/0/1]")
+        self.assertEqual([node.key for node in tree.findall("interfaces/interface")], ["ge-0/0/1"])
+        self.assertEqual(tree.value("interfaces/interface[ge-0/0/1]/unit[0]/family"), "ethernet-switching")
+
+        tree = self.dev.get_config(filter="<configuration><system/></configuration>")
+        self.assertEqual([node.name for node in tree.root], ["system"])
+
+    def test_candidate(self):
+        self.dev.load_config(cfg_string="set system location rack-1", action="set")
+        self.assertEqual(self.dev.get_config(filter="system", database="candidate").value("system/location"), "rack-1")
+        self.assertIsNone(self.dev.get_config(filter="system").value("system/location"))
+
+
+if __name__ == "__main__":
+    unittest.main()
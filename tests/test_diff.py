@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.diff import SetIndex, diff_set
+from pyCliConf.transport import FakeDeviceTransport
+
+ADDRESS = "set interfaces ge-0/0/0 unit 0 family inet address 10.0.0.1/24"
+
+
+class DiffSetTest(unittest.TestCase):
+    def test_missing_lines_only(self):
+        diff = diff_set("set system host-name a\nset system ntp server 10.0.0.9", "set system host-name a")
+        self.assertEqual(diff.lines, ["set system ntp server 10.0.0.9"])
+
+    def test_delete_then_set_keeps_order(self):
+        diff = diff_set("delete interfaces ge-0/0/0\n" + ADDRESS, ADDRESS)
+        self.assertEqual(diff.lines, ["delete interfaces ge-0/0/0", ADDRESS])
+        self.assertEqual(diff.config(), "delete interfaces ge-0/0/0\n" + ADDRESS)
+
+    def test_delete_of_nothing_is_dropped(self):
+        diff = diff_set("delete interfaces ge-0/0/1\n" + ADDRESS, ADDRESS)
+        self.assertFalse(diff.changed)
+
+    def test_set_after_own_delete(self):
+        diff = diff_set("set system host-name a\ndelete system host-name\nset system host-name b", "")
+        self.assertEqual(diff.lines, ["set system host-name a", "delete system host-name", "set system host-name b"])
+
+    def test_parent_statement_present(self):
+        diff = diff_set("set interfaces ge-0/0/0 unit 0 family inet", ADDRESS)
+        self.assertFalse(diff.changed)
+
+    def test_prune(self):
+        diff = diff_set("set interfaces ge-0/0/0 unit 0 family inet", ADDRESS + "\nset system host-name a", prune=True)
+        self.assertEqual(diff.lines, ["delete interfaces ge-0/0/0 unit 0 family inet address 10.0.0.1/24",
+                                      "delete system host-name a",
+                                      "set interfaces ge-0/0/0 unit 0 family inet"])
+
+    def test_index_delete(self):
+        index = SetIndex.from_config("set a b\nset a b c\nset a-b\nset a c")
+        self.assertTrue(index.delete("a b"))
+        self.assertEqual(sorted(index.statements), ["a c", "a-b"])
+        self.assertEqual(index.matching("a"), ["a c"])
+        self.assertFalse(index.delete("a b"))
+
+
+class LoadConfigDiffTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport())
+
+    def tearDown(self):
+        self.dev.close()
+        shutil.rmtree(self.tmp)
+
+    def running(self):
+        return self.dev.get_config_set()
+
+    def test_delete_then_set_keeps_interface(self):
+        self.dev.load_config(cfg_string=ADDRESS + "\nset interfaces ge-0/0/0 unit 0 family inet address 10.0.0.2/24",
+                             action="set")
+        self.dev.commit()
+        diff = self.dev.load_config_diff("delete interfaces ge-0/0/0\n" + ADDRESS)
+        self.assertTrue(diff.ok)
+        self.assertEqual(diff.lines, ["delete interfaces ge-0/0/0", ADDRESS])
+        self.assertEqual(self.running(), [ADDRESS])
+
+    def test_rerun_resends_only_leading_delete(self):
+        config = "delete interfaces ge-0/0/0\n" + ADDRESS + "\nset interfaces ge-0/0/0 unit 0 family inet"
+        self.assertTrue(self.dev.load_config_diff(config).changed)
+        # The leading delete always matches, so a re-run still replaces the interface, but nothing else.
+        diff = self.dev.load_config_diff(config)
+        self.assertEqual(diff.lines, ["delete interfaces ge-0/0/0", ADDRESS])
+        self.assertFalse(self.dev.load_config_diff(ADDRESS + "\nset interfaces ge-0/0/0 unit 0 family inet").changed)
+        self.assertEqual(self.running(), [ADDRESS])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.transport import FakeDeviceTransport
+
+
+class FactsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.facts_file = os.path.join(self.tmp, "facts.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def device(self, **transport_args):
+        return CliConf(logfile=os.path.join(self.tmp, "ztp.log"), facts_file=self.facts_file,
+                       transport=FakeDeviceTransport(**transport_args))
+
+    def test_facts_cached_in_file(self):
+        dev = self.device(version="14.1X53-D15.2")
+        self.assertEqual(dev.facts()["version"], "14.1X53-D15.2")
+        dev.close()
+        self.assertTrue(os.path.exists(self.facts_file))
+
+        dev = self.device(version="15.1X53-D60.4")
+        self.assertEqual(dev.facts()["version"], "14.1X53-D15.2")
+        self.assertEqual(dev.facts(refresh=True)["version"], "15.1X53-D60.4")
+        dev.close()
+
+    def test_forgotten_before_reboot_without_reply(self):
+        for operation in ("install", "reboot"):
+            dev = self.device(fail_on=["request-package-add", "request-reboot"])
+            self.assertIsNotNone(dev.facts())
+            if operation == "install":
+                reply = dev.install_package("/var/tmp/jinstall.tgz", reboot=True)
+            else:
+                reply = dev.reboot()
+            self.assertFalse(reply.ok)
+            self.assertFalse(os.path.exists(self.facts_file))
+            dev.close()
+
+    def test_ensure_version(self):
+        dev = self.device(version="15.1X53-D60.4")
+        self.assertTrue(dev.ensure_version("15.1X53-D60.4", "/var/tmp/jinstall.tgz").skipped)
+        reply = dev.ensure_version("17.3R3", "/var/tmp/jinstall.tgz")
+        self.assertTrue(reply.ok)
+        self.assertFalse(reply.skipped)
+        dev.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf.fleet import Fleet
+
+PLAN = [("load_config", {"cfg_string": "set system host-name leaf", "action": "set"}), ("commit", {})]
+
+
+class FleetTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_run(self):
+        inventory = [{"name": "leaf%d" % number, "fake": {}} for number in range(3)]
+        result = Fleet(inventory, PLAN, workers=2, logdir=self.tmp).run()
+        self.assertEqual([device.ok for device in result.devices], [True, True, True])
+        self.assertEqual(result.summary()["operations"]["commit"]["count"], 3)
+
+    def test_failing_device_does_not_stop_the_fleet(self):
+        inventory = [{"name": "leaf1", "fake": {}}, {"name": "broken"}, {"name": "leaf2", "fake": {"fail_on": ["commit"]}}]
+        result = Fleet(inventory, PLAN, workers=2, logdir=self.tmp).run()
+        self.assertEqual([device.ok for device in result.devices], [True, False, False])
+        self.assertIn("needs a transport", result.devices[1].error)
+        self.assertIn("commit failed", result.devices[2].error)
+        self.assertIn("FAILED broken", result.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
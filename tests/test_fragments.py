@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from pyCliConf import CliConf
+from pyCliConf.exceptions import FetchError
+from pyCliConf.fragments import FragmentCache
+from pyCliConf.transport import FakeDeviceTransport
+
+
+class FragmentHandler(BaseHTTPRequestHandler):
+    """
+    Serves FragmentHandler.fragments by path, with ETags and 304 replies.
+    """
+    fragments = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        body = self.fragments.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"%d"' % hash(body)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FragmentCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), FragmentHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.base = "http://127.0.0.1:%d" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        FragmentHandler.fragments = {"/system.set": b"set system host-name leaf1\n"}
+        del FragmentHandler.requests[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def cache(self, directory="fragments", **kwargs):
+        return FragmentCache(directory=os.path.join(self.tmp, directory), **kwargs)
+
+    def test_fresh_copy_used_without_asking(self):
+        cache = self.cache(fresh_for=60)
+        url = self.base + "/system.set"
+        self.assertEqual(cache.fetch(url), "set system host-name leaf1\n")
+        FragmentHandler.fragments["/system.set"] = b"set system host-name leaf2\n"
+        self.assertEqual(cache.fetch(url), "set system host-name leaf1\n")
+        self.assertEqual(FragmentHandler.requests, ["/system.set"])
+        self.assertEqual((cache.stats["fetched"], cache.stats["fresh"]), (1, 1))
+
+    def test_expired_copy_revalidated(self):
+        cache = self.cache(fresh_for=0)
+        url = self.base + "/system.set"
+        cache.fetch(url)
+        self.assertEqual(cache.fetch(url), "set system host-name leaf1\n")
+        self.assertEqual(cache.stats["revalidated"], 1)
+
+        FragmentHandler.fragments["/system.set"] = b"set system host-name leaf2\n"
+        self.assertEqual(cache.fetch(url), "set system host-name leaf2\n")
+        self.assertEqual(cache.stats["fetched"], 2)
+        self.assertEqual(len(FragmentHandler.requests), 3)
+
+    def test_expiry_after_fresh_for(self):
+        cache = self.cache(fresh_for=0.2)
+        url = self.base + "/system.set"
+        cache.fetch(url)
+        cache.fetch(url)
+        time.sleep(0.3)
+        cache.fetch(url)
+        self.assertEqual((cache.stats["fetched"], cache.stats["fresh"], cache.stats["revalidated"]), (1, 1, 1))
+
+    def test_stale_copy_when_server_fails(self):
+        cache = self.cache(fresh_for=0)
+        url = self.base + "/system.set"
+        cache.fetch(url)
+        del FragmentHandler.fragments["/system.set"]
+        self.assertEqual(cache.fetch(url), "set system host-name leaf1\n")
+        self.assertEqual(cache.stats["stale"], 1)
+        self.assertRaises(FetchError, cache.fetch, self.base + "/missing.set")
+
+    def test_fetch_all(self):
+        FragmentHandler.fragments["/ntp.set"] = b"set system ntp server 10.0.0.3\n"
+        cache = self.cache()
+        self.assertEqual(cache.fetch_all([self.base + "/ntp.set", self.base + "/system.set"]),
+                         ["set system ntp server 10.0.0.3\n", "set system host-name leaf1\n"])
+        self.assertRaises(FetchError, cache.fetch_all, [self.base + "/system.set", self.base + "/missing.set"])
+
+    def test_load_config_fetch(self):
+        cache = self.cache()
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(), fragment_cache=cache)
+        try:
+            self.assertTrue(dev.prefetch([self.base + "/system.set"]))
+            self.assertTrue(dev.load_config(url=self.base + "/system.set", action="set", fetch="inline").ok)
+            self.assertEqual(dev.get_config_set(database="candidate"), ["set system host-name leaf1"])
+            self.assertFalse(dev.prefetch([self.base + "/missing.set"]))
+        finally:
+            dev.close()
+        self.assertEqual(FragmentHandler.requests, ["/system.set", "/missing.set"])
+
+    def test_cache_directory_private(self):
+        cache = self.cache()
+        self.assertEqual(cache.fetch(self.base + "/system.set"), "set system host-name leaf1\n")
+        self.assertEqual(stat.S_IMODE(os.stat(cache.directory).st_mode) & 0o077, 0)
+
+    def test_planted_fragment_in_shared_directory_refused(self):
+        directory = os.path.join(self.tmp, "shared")
+        os.mkdir(directory)
+        cache = FragmentCache(directory=directory)
+        url = self.base + "/system.set"
+        with open(cache.path(url), "w") as handle:
+            handle.write("set system root-authentication plain-text-password-value planted\n")
+        with open(cache.path(url) + ".meta", "w") as handle:
+            json.dump({"url": url, "validated": time.time() + 3600}, handle)
+        os.chmod(directory, 0o777)
+
+        self.assertRaises(FetchError, cache.fetch, url)
+        self.assertEqual(FragmentHandler.requests, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
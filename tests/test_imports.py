@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_after(statement, modules):
+    """
+    Returns which of modules a fresh interpreter has loaded after running statement.
+    """
+    script = "import sys\n%s\nprint(' '.join(name for name in %r if name in sys.modules))" % (statement, modules)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]))
+    output = subprocess.check_output([sys.executable, "-c", script], env=env)
+    return output.decode("ascii").split()
+
+
+class LazyImportTest(unittest.TestCase):
+    @unittest.skipIf(sys.version_info < (3, 7), "AsyncCliConf is imported eagerly before Python 3.7")
+    def test_asyncio_not_imported(self):
+        self.assertEqual(imported_after("import pyCliConf", ["asyncio", "pyCliConf.aio"]), [])
+        self.assertEqual(imported_after("from pyCliConf import AsyncCliConf", ["asyncio"]), ["asyncio"])
+
+    def test_error_reply_escaped_without_saxutils(self):
+        self.assertEqual(imported_after("import pyCliConf.netconf", ["xml.sax.saxutils"]), [])
+        from pyCliConf.netconf import error_reply
+        self.assertEqual(error_reply("RPC Error: <a & b>").errors, ["RPC Error: <a & b>"])
+
+    def test_fragments_fetch_modules_not_imported(self):
+        self.assertEqual(imported_after("import pyCliConf.fragments", ["httplib", "http.client", "ftplib"]), [])
+        from pyCliConf.fragments import http_client
+        self.assertTrue(hasattr(http_client(), "HTTPConnection"))
+
+    def test_download_modules_not_imported(self):
+        modules = ["httplib", "http.client", "ftplib", "urllib2", "urllib.request"]
+        self.assertEqual(imported_after("import pyCliConf.packagecache", modules), [])
+        self.assertEqual(imported_after("from pyCliConf import CliConf", modules), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.transport import FakeDeviceTransport
+
+
+class LoadConfigStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport())
+
+    def tearDown(self):
+        self.dev.close()
+        shutil.rmtree(self.tmp)
+
+    def test_file(self):
+        path = os.path.join(self.tmp, "set.cfg")
+        with open(path, "w") as handle:
+            handle.write("".join("set vlans v%d vlan-id %d\n" % (vlan, vlan) for vlan in range(1, 200)))
+        self.assertTrue(self.dev.load_config_stream(path, action="set", chunk_size=100).ok)
+        self.assertTrue(self.dev.commit().ok)
+        self.assertEqual(len(self.dev.get_config_set()), 199)
+
+    def test_missing_file_sends_nothing(self):
+        reply = self.dev.load_config_stream(os.path.join(self.tmp, "missing.cfg"), action="set")
+        self.assertFalse(reply.ok)
+        self.assertIn("RPC Load Stream Error", reply.errors[0])
+        self.assertTrue(self.dev.load_config(cfg_string="set system host-name a", action="set").ok)
+
+    def test_failing_generator_loads_nothing(self):
+        def lines():
+            yield "set system ntp server 10.0.0.1"
+            raise ValueError("template variable missing")
+
+        reply = self.dev.load_config_stream(lines(), action="set", chunk_size=1)
+        self.assertFalse(reply.ok)
+        self.assertIn("template variable missing", reply.errors[0])
+        self.assertTrue(self.dev.load_config(cfg_string="set system host-name a", action="set").ok)
+        self.assertTrue(self.dev.commit().ok)
+        self.assertEqual(self.dev.get_config_set(), ["set system host-name a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
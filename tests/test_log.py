@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.transport import FakeDeviceTransport
+
+
+class JsonLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tmp, "ztp.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def records(self):
+        with open(self.logfile) as handle:
+            return [json.loads(line) for line in handle if line.startswith("{")]
+
+    def levels(self):
+        return dict((record["msg"], record["level"]) for record in self.records() if "msg" in record)
+
+    def test_level_is_explicit(self):
+        dev = CliConf(logfile=self.logfile, log_format="json", transport=FakeDeviceTransport(fail_on=["commit"]))
+        dev.log("Error budget: 0 failures so far")
+        dev.log("interface xe-0/0/0 is down", level="warning")
+        self.assertTrue(dev.load_config(cfg_string="set system host-name leaf1", action="set").ok)
+        self.assertFalse(dev.commit().ok)
+        dev.close()
+
+        levels = self.levels()
+        self.assertEqual(levels["Error budget: 0 failures so far"], "info")
+        self.assertEqual(levels["interface xe-0/0/0 is down"], "warning")
+        commit_errors = [msg for msg in levels if msg.startswith("RPC Commit Error")]
+        self.assertEqual([levels[msg] for msg in commit_errors], ["error"])
+
+    def test_validation_levels(self):
+        dev = CliConf(logfile=self.logfile, log_format="json", transport=FakeDeviceTransport())
+        self.assertIsNone(dev.load_config(cfg_string='set system host-name "leaf1', action="set"))
+        dev.close()
+
+        levels = self.levels()
+        validation = [levels[msg] for msg in levels if msg.startswith("Config Validation: line 1: error")]
+        self.assertEqual(validation, ["error"])
+        self.assertIn("error", [levels[msg] for msg in levels if msg.startswith("RPC Load Error")])
+
+
+class TextLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tmp, "ztp.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_loaded_configuration_logged(self):
+        dev = CliConf(logfile=self.logfile, transport=FakeDeviceTransport())
+        self.assertTrue(dev.load_config(cfg_string="set system host-name leaf1", action="set").ok)
+        self.assertTrue(dev.load_config_stream(["set system ntp server 10.0.0.1"], action="set").ok)
+        dev.close()
+        with open(self.logfile) as handle:
+            log = handle.read()
+        self.assertIn("set system host-name leaf1", log)
+        self.assertIn("set system ntp server 10.0.0.1", log)
+        self.assertIn("bytes streamed", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
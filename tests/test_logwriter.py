@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.logwriter import LogWriter
+from pyCliConf.transport import FakeDeviceTransport
+
+LINES = ["line %02d %s\n" % (number, "x" * 20) for number in range(20)]
+
+
+class LogWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "ztp.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, suffix=""):
+        with open(self.path + suffix) as handle:
+            return handle.read()
+
+    def test_lines_written_on_flush_and_close(self):
+        writer = LogWriter(self.path, flush_interval=60)
+        writer.write(LINES[0])
+        writer.flush()
+        self.assertEqual(self.read(), LINES[0])
+        writer.write(LINES[1])
+        writer.close()
+        self.assertEqual(self.read(), LINES[0] + LINES[1])
+        self.assertRaises(ValueError, writer.write, LINES[2])
+
+    def test_rotation(self):
+        writer = LogWriter(self.path, max_bytes=100, backups=2)
+        for line in LINES:
+            writer.write(line)
+        writer.close()
+
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["ztp.log", "ztp.log.1", "ztp.log.2"])
+        kept = [self.read(".2"), self.read(".1"), self.read()]
+        for text in kept:
+            self.assertTrue(0 < len(text) <= 100)
+            self.assertTrue(text.endswith("\n"))
+        # Whole lines only, oldest copy first, ending with the last line written.
+        self.assertTrue("".join(LINES).endswith("".join(kept)))
+        self.assertTrue(self.read().endswith(LINES[-1]))
+
+    def test_rotation_counts_existing_file(self):
+        with open(self.path, "w") as handle:
+            handle.write("x" * 90 + "\n")
+        writer = LogWriter(self.path, max_bytes=100)
+        writer.write(LINES[0])
+        writer.close()
+        self.assertEqual(self.read(".1"), "x" * 90 + "\n")
+        self.assertEqual(self.read(), LINES[0])
+
+    def test_without_backups(self):
+        writer = LogWriter(self.path, max_bytes=100, backups=0)
+        for line in LINES:
+            writer.write(line)
+        writer.close()
+        self.assertEqual(os.listdir(self.tmp), ["ztp.log"])
+        self.assertTrue("".join(LINES).endswith(self.read()))
+
+    def test_long_line_not_split(self):
+        writer = LogWriter(self.path, max_bytes=10)
+        writer.write(LINES[0])
+        writer.write(LINES[1])
+        writer.close()
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["ztp.log", "ztp.log.1"])
+        self.assertEqual(self.read(".1"), LINES[0])
+        self.assertEqual(self.read(), LINES[1])
+
+    def test_cliconf_log_rotation(self):
+        dev = CliConf(logfile=self.path, transport=FakeDeviceTransport(), log_max_bytes=2000, log_backups=1)
+        for line in LINES * 10:
+            dev.log(line.strip())
+        dev.close()
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["ztp.log", "ztp.log.1"])
+        self.assertTrue(os.path.getsize(self.path) <= 2000)
+        self.assertTrue(os.path.getsize(self.path + ".1") <= 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.metrics import Histogram, Metrics, profile_methods, rpc_name
+from pyCliConf.transport import FakeDeviceTransport
+
+
+class Export(object):
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def records(self):
+        return [json.loads(line) for line in self.lines]
+
+
+class MetricsTest(unittest.TestCase):
+    def test_rpc_name(self):
+        self.assertEqual(rpc_name('<rpc><load-configuration action="set">'), "load")
+        self.assertEqual(rpc_name('<rpc message-id="4">\n  <commit-configuration/></rpc>'), "commit")
+        self.assertEqual(rpc_name("<rpc><junos:request-package-add/></rpc>"), "package-add")
+        self.assertEqual(rpc_name("<rpc><get-chassis-inventory/></rpc>"), "get-chassis-inventory")
+        self.assertEqual(rpc_name("<hello/>"), "other")
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for seconds in [0.001] * 50 + [0.2] * 45 + [7.0] * 5:
+            histogram.observe(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual((snapshot["count"], snapshot["min"], snapshot["max"]), (100, 0.001, 7.0))
+        self.assertAlmostEqual(snapshot["mean"], (0.05 + 9.0 + 35.0) / 100)
+        self.assertEqual((snapshot["p50"], snapshot["p90"], snapshot["p99"]), (0.001, 0.25, 7.0))
+        self.assertEqual(snapshot["buckets"], {"le_0.001": 50, "le_0.25": 45, "le_10": 5})
+        self.assertEqual(Histogram().snapshot()["p99"], 0.0)
+
+    def test_threads(self):
+        metrics = Metrics()
+
+        def record():
+            for attempt in range(1000):
+                metrics.add("events")
+                metrics.observe("work", 0.01)
+
+        threads = [threading.Thread(target=record) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["events"], 8000)
+        self.assertEqual(snapshot["histograms"]["work"]["count"], 8000)
+
+    def test_export(self):
+        export = Export()
+        metrics = Metrics(export=export)
+        metrics.record_rpc("commit", 1.5, 120, 300, False)
+        with metrics.timer("template_render"):
+            pass
+        record = export.records()[0]
+        self.assertEqual((record["event"], record["rpc"], record["seconds"], record["bytes_written"], record["bytes_read"], record["ok"]),
+                         ("rpc", "commit", 1.5, 120, 300, False))
+        self.assertEqual(len(export.lines), 1)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["counters"], {"rpcs": 1, "bytes_read": 300, "rpc_errors": 1})
+        self.assertEqual(sorted(snapshot["histograms"]), ["rpc.commit", "template_render"])
+
+    def test_profile_methods(self):
+        class Device(object):
+            def __init__(self):
+                self._metrics = Metrics()
+
+            def commit(self):
+                return "ok"
+
+            def _private(self):
+                return "private"
+
+        profile_methods(Device)
+        dev = Device()
+        self.assertEqual((dev.commit(), dev._private()), ("ok", "private"))
+        self.assertEqual(sorted(dev._metrics.snapshot()["histograms"]), ["call.commit"])
+
+
+class CliConfMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.export = os.path.join(self.tmp, "metrics.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_rpcs_counted_and_exported(self):
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(fail_on=["commit"]),
+                      metrics_file=self.export)
+        self.assertTrue(dev.load_config(cfg_string="set system host-name leaf1", action="set").ok)
+        self.assertFalse(dev.commit().ok)
+        metrics = dev.metrics()
+        dev.close()
+
+        self.assertEqual(metrics["counters"]["rpcs"], 2)
+        self.assertEqual(metrics["counters"]["rpc_errors"], 1)
+        self.assertTrue(metrics["counters"]["bytes_written"] > len("set system host-name leaf1"))
+        self.assertTrue(metrics["counters"]["bytes_read"] > 0)
+        self.assertEqual(metrics["histograms"]["rpc.load"]["count"], 1)
+        self.assertEqual(metrics["histograms"]["rpc.commit"]["count"], 1)
+        self.assertTrue(metrics["histograms"]["log"]["count"] > 0)
+
+        with open(self.export) as handle:
+            records = [json.loads(line) for line in handle]
+        self.assertEqual([(record["rpc"], record["ok"]) for record in records], [("load", True), ("commit", False), ("close", True)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from pyCliConf import CliConf
+from pyCliConf.exceptions import PackageError
+from pyCliConf.packagecache import PackageCache
+from pyCliConf.transport import FakeDeviceTransport
+
+PACKAGE = b"".join(b"jinstall block %06d\n" % block for block in range(20000))
+SHA256 = hashlib.sha256(PACKAGE).hexdigest()
+
+
+class PackageHandler(BaseHTTPRequestHandler):
+    """
+    Serves PACKAGE at any path, honouring "Range: bytes=N-" unless ranges is False.
+    """
+    requests = []
+    ranges = True
+
+    def do_GET(self):
+        self.requests.append(self.headers.get("Range"))
+        body = PACKAGE
+        offset = 0
+        if self.headers.get("Range") and self.ranges:
+            offset = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            if offset >= len(PACKAGE):
+                self.send_response(416)
+                self.end_headers()
+                return
+            body = PACKAGE[offset:]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PackageCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), PackageHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.url = "http://127.0.0.1:%d/jinstall.tgz" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = PackageCache(directory=os.path.join(self.tmp, "packages"), retries=1)
+        del PackageHandler.requests[:]
+        PackageHandler.ranges = True
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, path):
+        with open(path, "rb") as handle:
+            return handle.read()
+
+    def partial(self, data):
+        path = self.cache.path(self.url, sha256=SHA256)
+        os.makedirs(os.path.dirname(path))
+        with open(path + ".part", "wb") as handle:
+            handle.write(data)
+        return path
+
+    def test_download_then_cached(self):
+        path = self.cache.fetch(self.url, sha256=SHA256)
+        self.assertEqual(self.read(path), PACKAGE)
+        self.assertFalse(os.path.exists(path + ".part"))
+        self.assertEqual(self.cache.fetch(self.url, sha256=SHA256), path)
+        self.assertEqual(PackageHandler.requests, [None])
+
+    def test_resume_partial_download(self):
+        path = self.partial(PACKAGE[:100000])
+        self.assertEqual(self.cache.fetch(self.url, sha256=SHA256), path)
+        self.assertEqual(self.read(path), PACKAGE)
+        self.assertEqual(PackageHandler.requests, ["bytes=100000-"])
+
+    def test_complete_partial_download(self):
+        path = self.partial(PACKAGE)
+        self.assertEqual(self.read(self.cache.fetch(self.url, sha256=SHA256)), PACKAGE)
+        self.assertEqual(PackageHandler.requests, ["bytes=%d-" % len(PACKAGE)])
+
+    def test_server_ignoring_range(self):
+        PackageHandler.ranges = False
+        path = self.partial(b"stale bytes from another file")
+        self.assertEqual(self.read(self.cache.fetch(self.url, sha256=SHA256)), PACKAGE)
+
+    def test_checksum_mismatch(self):
+        wrong = hashlib.sha256(b"another package").hexdigest()
+        with self.assertRaises(PackageError):
+            self.cache.fetch(self.url, sha256=wrong)
+        self.assertFalse(os.path.exists(self.cache.path(self.url, sha256=wrong) + ".part"))
+        self.assertFalse(os.path.exists(self.cache.path(self.url, sha256=wrong)))
+
+    def test_md5_and_no_checksum(self):
+        md5 = hashlib.md5(PACKAGE).hexdigest()
+        self.assertEqual(self.read(self.cache.fetch(self.url, md5=md5)), PACKAGE)
+        path = self.cache.fetch(self.url)
+        self.assertEqual(self.read(path), PACKAGE)
+        self.assertEqual(self.cache.fetch(self.url), path)
+        self.assertEqual(len(PackageHandler.requests), 2)
+
+    def test_local_path(self):
+        path = os.path.join(self.tmp, "jinstall.tgz")
+        with open(path, "wb") as handle:
+            handle.write(PACKAGE)
+        self.assertEqual(self.cache.fetch(path, sha256=SHA256), path)
+        self.assertRaises(PackageError, self.cache.fetch, path, sha256=hashlib.sha256(b"x").hexdigest())
+
+    def test_install_package_stages_in_cache(self):
+        os.environ["PYCLICONF_CACHE_DIR"] = self.tmp
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport())
+        try:
+            reply = dev.install_package(self.url, sha256=SHA256)
+            self.assertTrue(reply.ok)
+            staged = PackageCache().path(self.url, sha256=SHA256)
+            self.assertIn(staged, reply.raw)
+            self.assertEqual(self.read(staged), PACKAGE)
+            self.assertIsNone(dev.install_package(self.url, sha256=hashlib.sha256(b"x").hexdigest()))
+        finally:
+            dev.close()
+            del os.environ["PYCLICONF_CACHE_DIR"]
+
+    def test_planted_copy_with_marker_is_hashed(self):
+        path = self.cache.path(self.url, sha256=SHA256)
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as handle:
+            handle.write(b"not the package")
+        self.cache.mark_verified(path)
+
+        self.assertEqual(self.read(self.cache.fetch(self.url, sha256=SHA256)), PACKAGE)
+        self.assertEqual(len(PackageHandler.requests), 1)
+
+    def test_untrusted_directory_refused(self):
+        directory = os.path.join(self.tmp, "shared")
+        os.mkdir(directory)
+        os.chmod(directory, 0o777)
+        cache = PackageCache(directory=directory, retries=1)
+        self.assertRaises(PackageError, cache.fetch, self.url, sha256=SHA256)
+        self.assertEqual(PackageHandler.requests, [])
+
+    def test_cache_directory_private(self):
+        self.cache.fetch(self.url, sha256=SHA256)
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache.directory).st_mode) & 0o077, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf.pipeline import Pipeline
+from pyCliConf.transport import FakeDeviceTransport
+
+PACKAGE = "/var/tmp/jinstall-qfx-5-flex-15.1X53-D60.4-domestic-signed.tgz"
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def pipeline(self, version):
+        pipe = Pipeline(checkpoint=os.path.join(self.tmp, "pipeline.json"), logfile=os.path.join(self.tmp, "ztp.log"),
+                        transport=FakeDeviceTransport(version=version))
+        pipe.add("base", lambda dev: dev.load_config(cfg_string="set system host-name leaf1", action="set"))
+        pipe.add("upgrade", lambda dev: dev.ensure_version("15.1X53-D60.4", PACKAGE), reboots=True)
+        pipe.add("final", lambda dev: dev.commit())
+        return pipe
+
+    def test_upgrade_stops_for_reboot_then_resumes(self):
+        result = self.pipeline("14.1X53-D15.2").run()
+        self.assertEqual(result.completed, ["base", "upgrade"])
+        self.assertTrue(result.rebooting)
+
+        result = self.pipeline("15.1X53-D60.4").run()
+        self.assertEqual(result.skipped, ["base", "upgrade"])
+        self.assertEqual(result.completed, ["final"])
+
+    def test_version_already_running_continues(self):
+        result = self.pipeline("15.1X53-D60.4").run()
+        self.assertTrue(result.ok)
+        self.assertFalse(result.rebooting)
+        self.assertEqual(result.completed, ["base", "upgrade", "final"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.scheduler import Scheduler
+from pyCliConf.transport import FakeDeviceTransport
+
+
+def sleeper(seconds, value=True):
+    def step(*args):
+        time.sleep(seconds)
+        return value
+    return step
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_dependencies_run_first_with_results_in_order(self):
+        order = []
+        lock = threading.Lock()
+
+        def step(name, value):
+            def run(*args):
+                with lock:
+                    order.append((name, args))
+                return value
+            return run
+
+        sched = Scheduler()
+        sched.add("a", step("a", "A"))
+        sched.add("b", step("b", "B"))
+        sched.add("c", step("c", "C"), after=["b", "a"])
+        sched.add("d", step("d", "D"), after=["c"])
+        result = sched.run()
+        self.assertTrue(result.ok)
+        self.assertEqual(order[2:], [("c", ("B", "A")), ("d", ("C",))])
+        self.assertEqual(result["d"].value, "D")
+        self.assertTrue(result["c"].started >= max(result["a"].finished, result["b"].finished))
+
+    def test_independent_steps_overlap(self):
+        sched = Scheduler()
+        for name in ("stage-image", "render", "fetch"):
+            sched.add(name, sleeper(0.2))
+        result = sched.run()
+        self.assertTrue(result.seconds < 0.5)
+
+        sched = Scheduler(workers=1)
+        for name in ("stage-image", "render"):
+            sched.add(name, sleeper(0.1))
+        self.assertTrue(sched.run().seconds >= 0.2)
+
+    def test_rpc_steps_never_overlap(self):
+        sched = Scheduler()
+        sched.add("facts", sleeper(0.1), rpc=True)
+        sched.add("load", sleeper(0.1), rpc=True)
+        sched.add("render", sleeper(0.1))
+        result = sched.run()
+        first, second = sorted([result["facts"], result["load"]], key=lambda step: step.started)
+        self.assertTrue(second.started >= first.finished)
+        self.assertTrue(second.waited > 0)
+        self.assertTrue(result["render"].started < first.finished)
+
+    def test_failure_skips_dependents(self):
+        sched = Scheduler()
+        sched.add("render", lambda: None)
+        sched.add("load", sleeper(0), after=["render"], rpc=True)
+        sched.add("commit", sleeper(0), after=["load"], rpc=True)
+        sched.add("stage-image", lambda: 1 // 0)
+        sched.add("facts", lambda: {"version": "14.1X53-D15.2"}, rpc=True)
+        result = sched.run()
+        self.assertFalse(result.ok)
+        self.assertEqual([(step.name, step.status) for step in result.steps],
+                         [("render", "failed"), ("load", "skipped"), ("commit", "skipped"),
+                          ("stage-image", "failed"), ("facts", "ok")])
+        self.assertEqual(result["commit"].error, "dependency load did not succeed")
+        self.assertIn("ZeroDivisionError", result["stage-image"].error)
+        self.assertTrue(result.report().startswith("5 steps in"))
+        self.assertIn("2 failed, 2 skipped", result.report())
+
+    def test_critical_path(self):
+        sched = Scheduler()
+        sched.add("stage-image", sleeper(0.3))
+        sched.add("render", sleeper(0.05))
+        sched.add("load", sleeper(0.05), after=["render"], rpc=True)
+        sched.add("commit", sleeper(0.05), after=["load"], rpc=True)
+        sched.add("install", sleeper(0.05), after=["stage-image", "commit"], rpc=True)
+        result = sched.run()
+        self.assertEqual(result.critical_path, ["stage-image", "install"])
+        self.assertIn("critical path: stage-image -> install", result.report())
+
+        sched = Scheduler()
+        sched.add("stage-image", sleeper(0.05))
+        sched.add("render", sleeper(0.1))
+        sched.add("load", sleeper(0.1), after=["render"], rpc=True)
+        sched.add("commit", sleeper(0.1), after=["load"], rpc=True)
+        sched.add("install", sleeper(0.05), after=["stage-image", "commit"], rpc=True)
+        self.assertEqual(sched.run().critical_path, ["render", "load", "commit", "install"])
+
+    def test_critical_path_through_session_wait(self):
+        sched = Scheduler()
+        sched.add("load", sleeper(0.2), rpc=True)
+        sched.add("render", sleeper(0.05))
+        sched.add("facts", sleeper(0.05), after=["render"], rpc=True)
+        result = sched.run()
+        self.assertTrue(result["facts"].waited > 0.1)
+        self.assertEqual(result.critical_path, ["load", "facts"])
+
+    def test_add_checks_names(self):
+        sched = Scheduler()
+
+        @sched.step("render")
+        def render():
+            return "set system host-name leaf1"
+
+        self.assertRaises(ValueError, sched.add, "render", render)
+        self.assertRaises(ValueError, sched.add, "load", render, after=["commit"])
+        self.assertEqual(sched.run()["render"].value, "set system host-name leaf1")
+
+    def test_device_steps(self):
+        tmp = tempfile.mkdtemp()
+        dev = CliConf(logfile=os.path.join(tmp, "ztp.log"), transport=FakeDeviceTransport())
+        try:
+            sched = Scheduler()
+            sched.add("render", lambda: "set system host-name leaf1")
+            sched.add("load", lambda config: dev.load_config(cfg_string=config, action="set"), after=["render"], rpc=True)
+            sched.add("commit", lambda loaded: dev.commit(), after=["load"], rpc=True)
+            sched.add("facts", lambda: dev.facts(), rpc=True)
+            result = sched.run()
+            self.assertTrue(result.ok)
+            self.assertEqual(result["facts"].value["version"], "14.1X53-D15.2")
+            self.assertEqual(dev.get_config_set(), ["set system host-name leaf1"])
+        finally:
+            dev.close()
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.state import AppliedState, payload_hash
+from pyCliConf.transport import FakeDeviceTransport
+
+BASE = "set system host-name leaf1\nset system time-zone UTC"
+VLANS = "set vlans v100 vlan-id 100"
+
+
+class AppliedStateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "state", "pycliconf-state.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_missing_or_corrupt_file_is_empty(self):
+        self.assertEqual(AppliedState(self.path).committed, {})
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as handle:
+            handle.write('{"committed": ')
+        self.assertEqual(AppliedState(self.path).committed, {})
+
+    def test_record_replaces_and_persists(self):
+        first = payload_hash(BASE, "text", "set")
+        second = payload_hash(VLANS, "text", "set")
+        state = AppliedState(self.path)
+        state.record([(first, "text", "set")])
+        state.record([(second, "text", "set")])
+        reloaded = AppliedState(self.path)
+        self.assertIn(second, reloaded)
+        self.assertNotIn(first, reloaded)
+        self.assertEqual(reloaded.committed[second]["action"], "set")
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_hash_covers_format_and_action(self):
+        self.assertNotEqual(payload_hash(BASE, "text", "set"), payload_hash(BASE, "text", "merge"))
+        self.assertNotEqual(payload_hash(BASE, "text", "merge"), payload_hash(BASE, "xml", "merge"))
+        self.assertEqual(payload_hash(BASE, "text", "set"), payload_hash(BASE, "text", "set"))
+
+
+class StateFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.state = os.path.join(self.tmp, "pycliconf-state.json")
+        self.devices = []
+
+    def tearDown(self):
+        for dev in self.devices:
+            dev.close()
+        shutil.rmtree(self.tmp)
+
+    def boot(self, **kwargs):
+        """
+        A new ZTP attempt: a fresh session sharing the state file with earlier ones.
+        """
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(**kwargs), state_file=self.state)
+        self.devices.append(dev)
+        return dev
+
+    def rpcs(self, dev):
+        return dev.metrics()["counters"].get("rpcs", 0)
+
+    def test_rerun_skips_load_and_commit(self):
+        dev = self.boot()
+        self.assertFalse(dev.load_config(cfg_string=BASE, action="set").skipped)
+        self.assertFalse(dev.commit().skipped)
+        self.assertEqual(self.rpcs(dev), 2)
+
+        dev = self.boot()
+        self.assertTrue(dev.load_config(cfg_string=BASE, action="set").skipped)
+        reply = dev.commit()
+        self.assertTrue(reply.ok and reply.skipped)
+        self.assertEqual(self.rpcs(dev), 0)
+
+    def test_changed_payload_is_sent_and_committed(self):
+        dev = self.boot()
+        dev.load_config(cfg_string=BASE, action="set")
+        dev.commit()
+
+        dev = self.boot()
+        self.assertTrue(dev.load_config(cfg_string=BASE, action="set").skipped)
+        self.assertFalse(dev.load_config(cfg_string=VLANS, action="set").skipped)
+        self.assertFalse(dev.commit().skipped)
+        self.assertEqual(self.rpcs(dev), 2)
+        # The skipped payload stays recorded next to the new one.
+        state = AppliedState(self.state)
+        self.assertIn(payload_hash(BASE, "text", "set"), state)
+        self.assertIn(payload_hash(VLANS, "text", "set"), state)
+
+    def test_force(self):
+        dev = self.boot()
+        dev.load_config(cfg_string=BASE, action="set")
+        dev.commit()
+
+        dev = self.boot()
+        self.assertFalse(dev.load_config(cfg_string=BASE, action="set", force=True).skipped)
+        self.assertFalse(dev.commit().skipped)
+        dev.load_config(cfg_string=BASE, action="set")
+        self.assertFalse(dev.commit(force=True).skipped)
+        self.assertEqual(self.rpcs(dev), 3)
+
+    def test_failed_commit_not_recorded(self):
+        dev = self.boot(fail_on=["commit"])
+        dev.load_config(cfg_string=BASE, action="set")
+        self.assertFalse(dev.commit().ok)
+        self.assertFalse(os.path.exists(self.state))
+
+        dev = self.boot()
+        self.assertFalse(dev.load_config(cfg_string=BASE, action="set").skipped)
+
+    def test_unreadable_state_file(self):
+        with open(self.state, "w") as handle:
+            handle.write("not json")
+        dev = self.boot()
+        self.assertFalse(dev.load_config(cfg_string=BASE, action="set").skipped)
+        self.assertTrue(dev.commit().ok)
+        with open(self.state) as handle:
+            self.assertEqual(list(json.load(handle)["committed"]), [payload_hash(BASE, "text", "set")])
+
+
+if __name__ == "__main__":
+    unittest.main()
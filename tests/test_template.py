@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf import pyCliConf as cliconf
+from pyCliConf.template import JINJA_SUPPORT, TemplateCache, get_template_cache
+from pyCliConf.transport import FakeDeviceTransport
+
+
+@unittest.skipUnless(JINJA_SUPPORT, "Jinja2 is not installed")
+class TemplateCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.bytecode = os.path.join(self.tmp, "bytecode")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text, mtime=None):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w") as handle:
+            handle.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_lru(self):
+        templates = TemplateCache(cache_size=2, bytecode_dir=False)
+        for source in ("a {{ x }}", "b {{ x }}", "a {{ x }}", "c {{ x }}", "b {{ x }}"):
+            templates.get(source)
+        # "b" was the least recently used when "c" came in, so it had to be compiled again.
+        self.assertEqual(templates.stats(), {"hits": 1, "misses": 4, "bytecode_hits": 0, "bytecode_misses": 0, "size": 2})
+        self.assertEqual(list(templates.compiled.values())[-1].render(x=1), "b 1")
+        self.assertEqual(templates.render("c {{ x }}", {"x": 2}), "c 2")
+        self.assertEqual(templates.stats()["hits"], 2)
+
+    def test_bytecode_cache_survives_restart(self):
+        source = "set system host-name {{ hostname }}"
+        first = TemplateCache(bytecode_dir=self.bytecode)
+        self.assertEqual(first.render(source, {"hostname": "leaf1"}), "set system host-name leaf1")
+        self.assertEqual((first.stats()["bytecode_hits"], first.stats()["bytecode_misses"]), (0, 1))
+        self.assertEqual(len(os.listdir(self.bytecode)), 1)
+
+        second = TemplateCache(bytecode_dir=self.bytecode)
+        self.assertEqual(second.render(source, {"hostname": "leaf2"}), "set system host-name leaf2")
+        self.assertEqual((second.stats()["bytecode_hits"], second.stats()["bytecode_misses"]), (1, 0))
+
+    def test_include_and_changed_file(self):
+        self.write("system.j2", "set system host-name {{ hostname }}", mtime=1000000000)
+        templates = TemplateCache(search_path=self.tmp, bytecode_dir=False)
+        self.assertEqual(templates.render("{% include 'system.j2' %}", {"hostname": "leaf1"}), "set system host-name leaf1")
+        self.assertEqual(templates.get_file("system.j2").render(hostname="leaf1"), "set system host-name leaf1")
+        self.assertIs(templates.get_file("system.j2"), templates.get_file("system.j2"))
+
+        self.write("system.j2", "set system host-name {{ hostname }}-new", mtime=1000000100)
+        self.assertEqual(templates.get_file("system.j2").render(hostname="leaf1"), "set system host-name leaf1-new")
+
+    def test_load_config_template(self):
+        os.environ["PYCLICONF_CACHE_DIR"] = self.tmp
+        self.write("system.j2", "set system host-name {{ hostname }}")
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(), template_path=self.tmp)
+        try:
+            reply = dev.load_config_template("{% include 'system.j2' %}\nset system time-zone {{ zone }}",
+                                             {"hostname": "leaf1", "zone": "UTC"}, action="set")
+            self.assertTrue(reply.ok)
+            self.assertEqual(dev.get_config_set(database="candidate"), ["set system host-name leaf1", "set system time-zone UTC"])
+            self.assertIs(dev.templates, get_template_cache(self.tmp))
+        finally:
+            dev.close()
+            del os.environ["PYCLICONF_CACHE_DIR"]
+
+
+class TemplatesPropertyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = tempfile.mkdtemp()
+        os.environ["PYCLICONF_CACHE_DIR"] = self.cache
+        self.logfile = os.path.join(self.tmp, "ztp.log")
+        self.dev = CliConf(logfile=self.logfile, transport=FakeDeviceTransport())
+
+    def tearDown(self):
+        self.dev.close()
+        cliconf.JINJA_SUPPORT = JINJA_SUPPORT
+        del os.environ["PYCLICONF_CACHE_DIR"]
+        shutil.rmtree(self.tmp)
+        shutil.rmtree(self.cache)
+
+    def test_without_jinja(self):
+        cliconf.JINJA_SUPPORT = False
+        self.assertIsNone(self.dev.templates)
+        self.dev.logfile.flush()
+        with open(self.logfile) as handle:
+            self.assertIn("Jinja2 Template supported on this software version", handle.read())
+
+    @unittest.skipUnless(JINJA_SUPPORT, "Jinja2 is not installed")
+    def test_shared_per_search_path(self):
+        self.assertIs(self.dev.templates, get_template_cache())
+        self.assertIs(get_template_cache(u"%s" % self.tmp), get_template_cache([self.tmp]))
+
+
+if __name__ == "__main__":
+    unittest.main()
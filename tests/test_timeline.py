@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from pyCliConf import CliConf
+from pyCliConf.timeline import group_logs, load_timelines, main, summary
+from pyCliConf.transport import FakeDeviceTransport
+
+
+def rpc(name, started, seconds, ok=True):
+    return {"event": "rpc", "rpc": name, "started": started, "seconds": seconds, "ts": started + seconds,
+            "ok": ok, "sent": 100, "received": 200, "level": "info" if ok else "error"}
+
+
+class TimelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, records):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w") as handle:
+            for record in records:
+                handle.write(record if isinstance(record, str) else json.dumps(record) + "\n")
+        return path
+
+    def leaf1(self):
+        # The rotated copy holds the start of the session.
+        older = self.write("leaf1.log.1", [{"ts": 100.0, "level": "info", "msg": "ZTP started"},
+                                           rpc("load", 100.5, 1.0), rpc("commit", 102.0, 2.0)])
+        newer = self.write("leaf1.log", ["stderr: not a JSON line\n", {"ts": 104.5, "level": "error", "msg": "NTP unreachable"},
+                                         rpc("get-config", 105.0, 0.5), rpc("get-config", 105.2, 0.5, ok=False), "{broken\n"])
+        return [newer, older]
+
+    def test_group_logs(self):
+        self.assertEqual(group_logs(["a.log", "b.log.1", "a.log.2", "a.log.1", "b.log"]),
+                         [("a.log", ["a.log.2", "a.log.1", "a.log"]), ("b.log", ["b.log.1", "b.log"])])
+
+    def test_timeline(self):
+        timeline, = load_timelines(self.leaf1())
+        self.assertEqual(timeline.name, "leaf1")
+        self.assertEqual([record["rpc"] for record in timeline.rpcs], ["load", "commit", "get-config", "get-config"])
+        self.assertEqual(timeline.errors, ["NTP unreachable"])
+        self.assertAlmostEqual(timeline.seconds, 5.7)
+        # The two get-config RPCs overlap: 0.7s of RPC time, not 1.0s.
+        self.assertAlmostEqual(timeline.rpc_seconds, 3.7)
+        self.assertAlmostEqual(timeline.script_seconds, 2.0)
+        steps = timeline.steps()
+        self.assertEqual([round(step["offset"], 3) for step in steps], [0.5, 2.0, 5.0, 5.2])
+        self.assertEqual([round(step["gap"], 3) for step in steps], [0.5, 0.5, 1.0, 0.0])
+        self.assertEqual([step["ok"] for step in steps], [True, True, True, False])
+
+        report = timeline.report().splitlines()
+        self.assertEqual(report[0], "leaf1: 4 RPCs in 5.70s (3.70s RPC, 2.00s script)")
+        self.assertIn("FAILED", report[-2])
+        self.assertEqual(report[-1], "ERROR NTP unreachable")
+
+    def test_summary(self):
+        leaf2 = self.write("leaf2.log", [rpc("load", 200.0, 3.0), rpc("commit", 203.0, 4.0, ok=False)])
+        stats = summary(load_timelines(self.leaf1() + [leaf2]))
+        self.assertEqual(stats["devices"], 2)
+        self.assertEqual(stats["rpc"]["load"]["count"], 2)
+        self.assertEqual(stats["rpc"]["load"]["max"], 3.0)
+        self.assertEqual((stats["rpc"]["commit"]["failed"], stats["rpc"]["get-config"]["failed"]), (1, 1))
+        self.assertEqual(stats["session"]["max"], 7.0)
+        self.assertAlmostEqual(stats["script_time"]["max"], 2.0)
+
+    def test_main(self):
+        paths = self.leaf1()
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            self.assertEqual(main(paths), 0)
+            text = sys.stdout.getvalue()
+            sys.stdout.seek(0)
+            sys.stdout.truncate()
+            self.assertEqual(main(["--json"] + paths), 0)
+            report = json.loads(sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+        self.assertTrue(text.startswith("leaf1: 4 RPCs"))
+        self.assertIn("1 devices", text)
+        self.assertEqual(len(report["devices"]["leaf1"]["steps"]), 4)
+        self.assertEqual(report["summary"]["rpc"]["commit"]["count"], 1)
+        self.assertEqual(main([os.path.join(self.tmp, "missing.log")]), 2)
+
+    def test_cliconf_json_log(self):
+        path = os.path.join(self.tmp, "spine1.log")
+        dev = CliConf(logfile=path, log_format="json", transport=FakeDeviceTransport(fail_on=["commit"]))
+        dev.load_config(cfg_string="set system host-name spine1", action="set")
+        dev.commit()
+        dev.close()
+        timeline, = load_timelines([path])
+        self.assertEqual([(step["rpc"], step["ok"]) for step in timeline.steps()], [("load", True), ("commit", False), ("close", True)])
+        self.assertTrue(any(error.startswith("RPC Commit Error") for error in timeline.errors))
+        self.assertTrue(0 < timeline.rpc_seconds <= timeline.seconds)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.pool import SessionPool
+from pyCliConf.transport import FakeDeviceTransport, ProcessTransport
+
+SOFTWARE = "<rpc><get-software-information/></rpc>]]>]]>"
+INVENTORY = "<rpc><get-chassis-inventory/></rpc>]]>]]>"
+
+# Says hello, then never answers anything.
+SILENT_DEVICE = [sys.executable, "-c", "import sys; "
+                 "sys.stdout.write('<hello xmlns=\"urn:ietf:params:xml:ns:netconf:base:1.0\"><capabilities/></hello>]]>]]>'); "
+                 "sys.stdout.flush(); sys.stdin.read()"]
+
+
+class RpcTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tmp, "ztp.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def log(self):
+        with open(self.logfile) as handle:
+            return handle.read()
+
+    def test_silent_device(self):
+        dev = CliConf(logfile=self.logfile, transport=ProcessTransport(SILENT_DEVICE), rpc_timeout=0.2)
+        started = time.time()
+        self.assertIsNone(dev.rpc(SOFTWARE))
+        self.assertIsNone(dev.get_config())
+        self.assertEqual(dev.rpc_pipeline([SOFTWARE, INVENTORY]), [None, None])
+        self.assertLess(time.time() - started, 5)
+        dev.close()
+        self.assertIn("RPC Timeout Error", self.log())
+
+    def test_late_reply_dropped(self):
+        dev = CliConf(logfile=self.logfile, transport=FakeDeviceTransport(latency=0.5))
+        self.assertIsNone(dev.rpc(SOFTWARE, timeout=0.1))
+        reply = dev.rpc(INVENTORY)
+        self.assertIn("<chassis-inventory>", reply.raw)
+        dev.close()
+
+    def test_pool_sessions_inherit_timeout(self):
+        with SessionPool(size=2, transport=lambda: ProcessTransport(SILENT_DEVICE), logfile=self.logfile, rpc_timeout=0.2) as pool:
+            self.assertIsNone(pool.rpc(SOFTWARE))
+            self.assertEqual(pool.sessions[0].rpc_timeout, 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
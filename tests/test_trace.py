@@ -0,0 +1,150 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from pyCliConf import CliConf
+from pyCliConf.trace import TraceWriter, main, read_trace, replay
+from pyCliConf.transport import FakeDeviceTransport
+
+SOFTWARE = "<rpc><get-software-information/></rpc>]]>]]>"
+INVENTORY = "<rpc><get-chassis-inventory/></rpc>]]>]]>"
+
+
+class TraceWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.trace = os.path.join(self.tmp, "trace.jsonl.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_threads_write_whole_records(self):
+        writer = TraceWriter(self.trace)
+
+        def record(name):
+            for attempt in range(1000):
+                writer.record("<rpc><%s/></rpc>" % name, None, writer.started, 0.1)
+
+        threads = [threading.Thread(target=record, args=("rpc-%d" % index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        writer.close()
+
+        records = list(read_trace(self.trace))
+        self.assertEqual(len(records), 8000)
+        self.assertEqual(len(set(record["rpc"] for record in records)), 8)
+
+    def test_bytes_rpc_traced_as_text(self):
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(), trace_file=self.trace)
+        self.assertTrue(dev.rpc(SOFTWARE.encode("utf-8")).ok)
+        dev.close()
+        record = next(read_trace(self.trace))
+        self.assertEqual(record["rpc"], "get-software-information")
+        self.assertIn("<get-software-information/>", record["request"])
+
+    def test_concurrent_rpcs_write_whole_records(self):
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(), trace_file=self.trace)
+
+        def send(rpc):
+            for attempt in range(25):
+                dev.rpc(rpc)
+
+        threads = [threading.Thread(target=send, args=(rpc,)) for rpc in (SOFTWARE, INVENTORY, SOFTWARE, INVENTORY)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        dev.close()
+
+        records = [record for record in read_trace(self.trace) if record["rpc"] != "close"]
+        self.assertEqual(len(records), 100)
+        self.assertEqual(sorted(set(record["rpc"] for record in records)), ["get-chassis-inventory", "get-software-information"])
+        self.assertTrue(all(record["ok"] for record in records))
+
+
+class TraceReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tmp, "ztp.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def record(self, path):
+        dev = CliConf(logfile=self.logfile, transport=FakeDeviceTransport(), trace_file=path)
+        dev.load_config(cfg_string="set system host-name leaf1", action="set")
+        dev.load_config_stream(iter(["set system time-zone UTC\n", "set vlans v100 vlan-id 100\n"]), action="set")
+        dev.commit()
+        self.assertEqual(dev.get_config().find("system/host-name").text, "leaf1")
+        dev.close()
+
+    def test_session_recorded(self):
+        for name in ("trace.jsonl", "trace.jsonl.gz"):
+            path = os.path.join(self.tmp, name)
+            self.record(path)
+            records = list(read_trace(path))
+            self.assertEqual([record["rpc"] for record in records], ["load", "load", "commit", "get-config", "close"])
+            self.assertTrue(all(record["ok"] for record in records))
+            self.assertEqual(sorted(record["at"] for record in records), [record["at"] for record in records])
+            self.assertIn("set system host-name leaf1", records[0]["request"])
+            self.assertIn("set vlans v100 vlan-id 100", records[1]["request"])
+            self.assertIn("<host-name>leaf1</host-name>", records[3]["reply"])
+        with open(os.path.join(self.tmp, "trace.jsonl.gz"), "rb") as handle:
+            self.assertEqual(handle.read(2), b"\x1f\x8b")
+
+    def test_replay(self):
+        path = os.path.join(self.tmp, "trace.jsonl.gz")
+        self.record(path)
+        result = replay(path, speed=0, logfile=self.logfile)
+        self.assertEqual([rpc[0] for rpc in result.rpcs], ["load", "load", "commit", "get-config", "close"])
+        self.assertEqual(result.failed, 0)
+        self.assertEqual(result.summary()["load"]["recorded"]["count"], 2)
+        self.assertIn("5 RPCs replayed", result.report())
+
+        result = replay(path, transport=FakeDeviceTransport(fail_on=["commit"]), speed=0, logfile=self.logfile)
+        self.assertEqual(result.failed, 1)
+
+    def test_replay_keeps_gaps(self):
+        path = os.path.join(self.tmp, "trace.jsonl")
+        writer = TraceWriter(path)
+        for at in (0.0, 0.4):
+            writer.record(SOFTWARE, None, writer.started + at, 0.01)
+        writer.close()
+
+        started = time.time()
+        replay(path, speed=1, logfile=self.logfile)
+        self.assertTrue(time.time() - started >= 0.4)
+        started = time.time()
+        result = replay(path, speed=10, logfile=self.logfile)
+        self.assertTrue(time.time() - started < 0.4)
+        self.assertAlmostEqual(result.recorded, 0.41)
+
+    def test_main(self):
+        path = os.path.join(self.tmp, "trace.jsonl")
+        self.record(path)
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            self.assertEqual(main(["show", path]), 0)
+            shown = sys.stdout.getvalue()
+            self.assertEqual(main(["replay", path, "--speed", "0", "--logfile", self.logfile]), 0)
+            replayed = sys.stdout.getvalue()[len(shown):]
+        finally:
+            sys.stdout = stdout
+        self.assertTrue(shown.startswith("5 RPCs\n"))
+        self.assertIn("load", shown)
+        self.assertIn("5 RPCs replayed", replayed)
+
+
+if __name__ == "__main__":
+    unittest.main()
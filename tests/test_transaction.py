@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pyCliConf import CliConf
+from pyCliConf.exceptions import TransactionError
+from pyCliConf.transport import FakeDeviceTransport
+
+HOSTNAME = "set system host-name leaf1"
+
+
+class TransactionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.devices = []
+
+    def tearDown(self):
+        for dev in self.devices:
+            dev.close()
+        shutil.rmtree(self.tmp)
+
+    def device(self, **kwargs):
+        dev = CliConf(logfile=os.path.join(self.tmp, "ztp.log"), transport=FakeDeviceTransport(**kwargs))
+        self.devices.append(dev)
+        return dev
+
+    def count(self, dev, name):
+        return dev.metrics()["histograms"].get("rpc." + name, {}).get("count", 0)
+
+    def test_one_load_and_one_commit(self):
+        dev = self.device()
+        with dev.transaction(action="set") as tx:
+            tx.load_config(HOSTNAME)
+            tx.load_config("set system domain-name example.net")
+            tx.load_config("set system time-zone UTC")
+        self.assertEqual(self.count(dev, "load"), 1)
+        self.assertEqual(self.count(dev, "commit"), 1)
+        self.assertEqual([reply.ok for reply in tx.replies], [True, True])
+        self.assertEqual(dev.get_config_set(), [HOSTNAME, "set system domain-name example.net", "set system time-zone UTC"])
+
+    def test_one_load_per_format(self):
+        dev = self.device()
+        with dev.transaction() as tx:
+            tx.load_config(HOSTNAME, cfg_format="set")
+            tx.load_config("system { location rack-1; }")
+            tx.load_config("set system time-zone UTC", cfg_format="set")
+        self.assertEqual(tx.payloads(), [("set", HOSTNAME + "\nset system time-zone UTC"), ("text", "system { location rack-1; }")])
+        self.assertEqual(self.count(dev, "load"), 2)
+        self.assertEqual(self.count(dev, "commit"), 1)
+        self.assertEqual(dev.get_config_set(), [HOSTNAME, "set system time-zone UTC"])
+
+    def test_failed_load_rolls_back(self):
+        dev = self.device()
+        self.assertTrue(dev.load_config(cfg_string=HOSTNAME, action="set").ok)
+        self.assertTrue(dev.commit().ok)
+        with self.assertRaises(TransactionError):
+            with dev.transaction(action="set") as tx:
+                tx.load_config("set system domain-name example.net")
+                # Passes local validation, but the device rejects it after applying the line above.
+                tx.load_config("activate system services")
+        self.assertEqual(self.count(dev, "commit"), 1)
+        self.assertEqual(dev.get_config_set(database="candidate"), [HOSTNAME])
+        self.assertEqual(tx.payloads(), [])
+
+    def test_failed_commit_rolls_back(self):
+        dev = self.device(fail_on=["commit"])
+        with self.assertRaises(TransactionError) as raised:
+            with dev.transaction(action="set") as tx:
+                tx.load_config(HOSTNAME)
+        self.assertIn("commit failed", str(raised.exception))
+        self.assertFalse(raised.exception.reply.ok)
+        self.assertEqual(dev.get_config_set(database="candidate"), [])
+
+    def test_without_commit(self):
+        dev = self.device()
+        with dev.transaction(action="set", commit=False) as tx:
+            tx.load_config(HOSTNAME)
+        self.assertEqual(self.count(dev, "commit"), 0)
+        self.assertEqual(dev.get_config_set(database="candidate"), [HOSTNAME])
+        self.assertEqual(dev.get_config_set(), [])
+
+    def test_block_raises_sends_nothing(self):
+        dev = self.device()
+        with self.assertRaises(KeyError):
+            with dev.transaction(action="set") as tx:
+                tx.load_config(HOSTNAME)
+                raise KeyError("hostname")
+        self.assertEqual(dev.metrics()["counters"].get("rpcs", 0), 0)
+        with self.assertRaises(TransactionError):
+            dev.transaction().load_config('{"system": {"host-name": "leaf1"}}', cfg_format="json")
+
+
+if __name__ == "__main__":
+    unittest.main()
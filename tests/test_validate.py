@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from pyCliConf import CliConf
+from pyCliConf.command_line import main
+from pyCliConf.diff import normalize
+from pyCliConf.exceptions import TransactionError
+from pyCliConf.transport import FakeDeviceTransport
+from pyCliConf.validate import escape, validate
+
+UNTERMINATED = 'set system host-name "unterminated'
+
+
+class ValidateTest(unittest.TestCase):
+    def test_set(self):
+        result = validate('set system host-name a\nset interfaces ge-0/0/0 description "to spine 1"', "set")
+        self.assertTrue(result.ok)
+        self.assertEqual(result.lines, 2)
+
+    def test_unterminated_quote(self):
+        result = validate("set system host-name a\n" + UNTERMINATED, "set")
+        self.assertEqual(result.errors, [(2, "unterminated quoted string")])
+        self.assertFalse(validate('set system location "a \\" b', "set").ok)
+        self.assertTrue(validate('set system location "a \\" b"', "set").ok)
+
+    def test_set_problems(self):
+        result = validate("bogus system\nset system host-name a\nset system host-name b\nset system host-name a", "set")
+        self.assertEqual(result.errors, [(1, "unknown statement 'bogus', expected set, delete, ...")])
+        self.assertEqual(len(result.warnings), 2)
+
+    def test_quoted_single_valued_conflict(self):
+        result = validate('set interfaces ge-0/0/0 description "uplink to core"\n'
+                          'set interfaces ge-0/0/0 description "uplink to spine"\n'
+                          'set interfaces ge-0/0/1 description "uplink to core"', "set")
+        self.assertEqual(result.warnings, [(2, 'description conflicts with line 1 ("uplink to core")')])
+        result = validate('set system location "rack 1"\nset system location rack-2', "set")
+        self.assertEqual(result.warnings, [(2, 'location conflicts with line 1 ("rack 1")')])
+
+    def test_text(self):
+        self.assertTrue(validate('system {\n    host-name a;\n    location "rack 1";\n}').ok)
+        result = validate("system {\n    host-name a\n}")
+        self.assertEqual(result.errors, [(2, "missing ';' after 'host-name a'")])
+        self.assertFalse(validate('system {\n    location "rack 1;\n}').ok)
+        self.assertFalse(validate("system {\n    host-name a;\n").ok)
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  set  system\tlocation  "a  b"  '), 'set system location "a  b"')
+        self.assertEqual(normalize('set system location "a \\"  b"   x'), 'set system location "a \\"  b" x')
+        self.assertIsNone(normalize("  # comment"))
+
+    def test_escape(self):
+        self.assertEqual(escape('a<b>&"c"'), 'a&lt;b&gt;&amp;"c"')
+        self.assertEqual(escape('http://h/a?x=1&y="2"', quote=True), "http://h/a?x=1&amp;y=&quot;2&quot;")
+
+
+class ValidatedLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.tmp, "ztp.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def manifest(self, steps):
+        path = os.path.join(self.tmp, "manifest.json")
+        with open(path, "w") as handle:
+            json.dump(steps, handle)
+        return path
+
+    def test_manifest_loads(self):
+        steps = [{"op": "load", "config": "set system host-name a", "action": "set"},
+                 {"op": "load", "config": UNTERMINATED, "action": "set"},
+                 {"op": "commit"}]
+        command = "%s %s" % tuple(FakeDeviceTransport().command[:2])
+        reports = []
+        for pipelined in ([], ["--no-pipeline"]):
+            stdout, sys.stdout = sys.stdout, StringIO()
+            try:
+                rc = main([self.manifest(steps), "--logfile", self.logfile, "--command", command, "--json"] + pipelined)
+                reports.append(json.loads(sys.stdout.getvalue()))
+            finally:
+                sys.stdout = stdout
+            self.assertEqual(rc, 1)
+        pipelined, one_by_one = reports
+        self.assertFalse(pipelined["ok"])
+        self.assertEqual([(step["step"], step["status"]) for step in pipelined["steps"]], [("load x2 (pipelined)", "FAILED")])
+        self.assertFalse(one_by_one["ok"])
+        self.assertEqual([step["status"] for step in one_by_one["steps"]], ["ok", "FAILED"])
+        with open(self.logfile) as handle:
+            self.assertIn("unterminated quoted string", handle.read())
+
+    def test_transaction(self):
+        dev = CliConf(logfile=self.logfile, transport=FakeDeviceTransport())
+        try:
+            with self.assertRaises(TransactionError):
+                with dev.transaction(action="set") as tx:
+                    tx.load_config("set system host-name a")
+                    tx.load_config(UNTERMINATED)
+            self.assertEqual(dev.metrics()["counters"].get("rpcs", 0), 0)
+            with dev.transaction(action="set") as tx:
+                tx.load_config("set system host-name a")
+            self.assertEqual(dev.get_config_set(), ["set system host-name a"])
+        finally:
+            dev.close()
+
+
+if __name__ == "__main__":
+    unittest.main()